@@ -17,29 +17,56 @@ def analyze_data_flow():
         
         # 1. STATISTIQUES GÉNÉRALES
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM city_music_trends")
+        cursor.execute("SELECT COUNT(*) FROM trend_facts")
         total_records = cursor.fetchone()[0]
         
-        cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM city_music_trends")
+        cursor.execute("""
+            SELECT datetime(MIN(ts_epoch), 'unixepoch'), datetime(MAX(ts_epoch), 'unixepoch')
+            FROM trend_facts
+        """)
         time_range = cursor.fetchone()
         
         print(f"📊 TOTAL DES ENREGISTREMENTS: {total_records}")
         print(f"⏰ PÉRIODE: {time_range[0]} à {time_range[1]}")
         print()
         
+        # Sections 2 à 4 : agrégats horaires + journaliers (historique replié par la rétention)
+
         # 2. RÉPARTITION PAR VILLE
         print("🏙️  RÉPARTITION PAR VILLE:")
-        df_cities = pd.read_sql("SELECT city, COUNT(*) as count FROM city_music_trends GROUP BY city ORDER BY count DESC", conn)
+        df_cities = pd.read_sql("""
+            SELECT c.city, x.count
+            FROM (
+                SELECT city_id, SUM(track_count) as count
+                FROM (
+                    SELECT city_id, track_count FROM rollup_weather_mood_hourly
+                    UNION ALL
+                    SELECT city_id, track_count FROM rollup_weather_mood_daily
+                )
+                GROUP BY city_id
+            ) x
+            JOIN dim_city c ON c.id = x.city_id
+            ORDER BY x.count DESC
+        """, conn)
         print(df_cities.to_string(index=False))
         print()
         
         # 3. ANALYSE MÉTÉO vs HUMEUR
         print("🌤️  CORRÉLATION MÉTÉO-HUMEUR:")
         df_weather_mood = pd.read_sql("""
-            SELECT weather_main, mood_category, COUNT(*) as count 
-            FROM city_music_trends 
-            GROUP BY weather_main, mood_category 
-            ORDER BY weather_main, count DESC
+            SELECT w.main AS weather_main, x.mood_category, SUM(x.count) as count 
+            FROM (
+                SELECT weather_id, mood_category, SUM(track_count) as count
+                FROM (
+                    SELECT weather_id, mood_category, track_count FROM rollup_weather_mood_hourly
+                    UNION ALL
+                    SELECT weather_id, mood_category, track_count FROM rollup_weather_mood_daily
+                )
+                GROUP BY weather_id, mood_category
+            ) x
+            JOIN dim_weather w ON w.id = x.weather_id
+            GROUP BY w.main, x.mood_category 
+            ORDER BY w.main, count DESC
         """, conn)
         print(df_weather_mood.to_string(index=False))
         print()
@@ -47,30 +74,62 @@ def analyze_data_flow():
         # 4. TOP ARTISTES
         print("👑 TOP 10 ARTISTES:")
         df_artists = pd.read_sql("""
-            SELECT artist_name, COUNT(*) as count, AVG(listeners) as avg_listeners
-            FROM city_music_trends 
-            GROUP BY artist_name 
-            ORDER BY count DESC 
-            LIMIT 10
+            SELECT a.name AS artist_name, x.count, x.avg_listeners
+            FROM (
+                SELECT artist_id, SUM(appearances) as count,
+                       SUM(listeners_sum) * 1.0 / SUM(appearances) as avg_listeners
+                FROM (
+                    SELECT artist_id, appearances, listeners_sum FROM rollup_artist_hourly
+                    UNION ALL
+                    SELECT artist_id, appearances, listeners_sum FROM rollup_artist_daily
+                )
+                GROUP BY artist_id 
+                ORDER BY count DESC 
+                LIMIT 10
+            ) x
+            JOIN dim_artist a ON a.id = x.artist_id
+            ORDER BY x.count DESC
         """, conn)
         print(df_artists.to_string(index=False))
         print()
         
-        # 5. DONNÉES MÉTÉO COLLECTÉES
+        # 5. DONNÉES MÉTÉO COLLECTÉES (une ligne par relevé, pas par track)
         print("🌡️  DONNÉES MÉTÉO COLLECTÉES:")
         df_weather = pd.read_sql("""
             SELECT 
-                weather_main,
-                weather_description,
-                COUNT(*) as occurrences,
-                AVG(temperature) as avg_temp,
-                AVG(humidity) as avg_humidity
-            FROM city_music_trends 
-            GROUP BY weather_main, weather_description
-            ORDER BY occurrences DESC
+                w.main AS weather_main,
+                w.description AS weather_description,
+                x.occurrences,
+                x.avg_temp,
+                x.avg_humidity
+            FROM (
+                SELECT
+                    weather_id,
+                    COUNT(*) as occurrences,
+                    AVG(temperature) as avg_temp,
+                    AVG(humidity) as avg_humidity
+                FROM weather_observations 
+                GROUP BY weather_id
+            ) x
+            JOIN dim_weather w ON w.id = x.weather_id
+            ORDER BY x.occurrences DESC
         """, conn)
         print(df_weather.to_string(index=False))
         print()
+
+        print("🏙️  TEMPÉRATURE MOYENNE PAR VILLE:")
+        df_city_temp = pd.read_sql("""
+            SELECT c.city, x.observations, x.avg_temp
+            FROM (
+                SELECT city_id, COUNT(*) as observations, AVG(temperature) as avg_temp
+                FROM weather_observations
+                GROUP BY city_id
+            ) x
+            JOIN dim_city c ON c.id = x.city_id
+            ORDER BY x.avg_temp DESC
+        """, conn)
+        print(df_city_temp.to_string(index=False))
+        print()
         
         # 6. EXEMPLE DE DONNÉES RÉCENTES
         print("🎵 DERNIÈRES DONNÉES COLLECTÉES:")
@@ -84,8 +143,8 @@ def analyze_data_flow():
                 weather_main,
                 temperature
             FROM city_music_trends 
-            ORDER BY timestamp DESC 
-            LIMIT 5
+            WHERE id IN (SELECT id FROM trend_facts ORDER BY ts_epoch DESC LIMIT 5)
+            ORDER BY timestamp DESC
         """, conn)
         print(df_recent.to_string(index=False))
         conn = sqlite3.connect(db_path2)
@@ -114,8 +173,8 @@ def check_data_quality():
         checks1 = [
             ("Artistes manquants", "SELECT COUNT(*) FROM city_music_trends WHERE artist_name = 'Unknown'"),
             ("Titres manquants", "SELECT COUNT(*) FROM city_music_trends WHERE track_name = 'Unknown'"),
-            ("Météo manquante", "SELECT COUNT(*) FROM city_music_trends WHERE weather_main IS NULL"),
-            ("Humeur manquante", "SELECT COUNT(*) FROM city_music_trends WHERE mood_category IS NULL OR mood_category = 'neutral'"),
+            ("Météo manquante", "SELECT COUNT(*) FROM trend_facts WHERE weather_id IS NULL"),
+            ("Humeur manquante", "SELECT COUNT(*) FROM trend_facts WHERE mood_category IS NULL OR mood_category = 'neutral'"),
         ]
 
         checks2=[("Infos manquantes ","select count(*) from soundcharts_tracks where release_date is null or release_date='None'")]
@@ -0,0 +1,44 @@
+# src/analytics/__init__.py
+from .snapshot import Snapshot, snapshots_from_points, snapshot_from_records
+from .hub import StreamingEngine, StreamingAnalytics, read_engine, replay_snapshots
+from .correlation import WeatherMoodStats, chi_square, parse_windows
+from .heavy_hitters import HeavyHitters, SpaceSaving
+from .distinct import DistinctCounts, HyperLogLog, distinct_counts, distinct_counts_by
+from .movers import RankMovements, biggest_movers
+from .quantiles import KLLSketch, PopularityPercentiles
+from .audio_index import AudioFeatureIndex
+from .recommendations import (WeatherRecommendations, latest_weather, recommend, recommend_for_city,
+                              recommendation_lists, weather_buckets)
+from .registry import trend_analytics, processed_analytics
+
+__all__ = [
+    'Snapshot',
+    'snapshots_from_points',
+    'snapshot_from_records',
+    'StreamingEngine',
+    'StreamingAnalytics',
+    'read_engine',
+    'replay_snapshots',
+    'WeatherMoodStats',
+    'chi_square',
+    'parse_windows',
+    'HeavyHitters',
+    'SpaceSaving',
+    'DistinctCounts',
+    'HyperLogLog',
+    'distinct_counts',
+    'distinct_counts_by',
+    'RankMovements',
+    'biggest_movers',
+    'KLLSketch',
+    'PopularityPercentiles',
+    'AudioFeatureIndex',
+    'WeatherRecommendations',
+    'latest_weather',
+    'recommend',
+    'recommend_for_city',
+    'recommendation_lists',
+    'weather_buckets',
+    'trend_analytics',
+    'processed_analytics'
+]
@@ -0,0 +1,366 @@
+# src/analytics/audio_index.py
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from storage import Database
+
+# Caractéristiques audio indexées et leur plage (ramenée à [0, 1]) ; key, mode et
+# time_signature sont catégorielles et restent hors de la distance
+FEATURES = {
+    'acousticness': (0.0, 1.0),
+    'danceability': (0.0, 1.0),
+    'energy': (0.0, 1.0),
+    'instrumentalness': (0.0, 1.0),
+    'liveness': (0.0, 1.0),
+    'speechiness': (0.0, 1.0),
+    'valence': (0.0, 1.0),
+    'tempo': (40.0, 220.0),
+    'loudness': (-60.0, 0.0)
+}
+_NAMES = list(FEATURES)
+_LOW = np.array([low for low, _ in FEATURES.values()], dtype=np.float32)
+_SPAN = np.array([high - low for low, high in FEATURES.values()], dtype=np.float32)
+# Une valeur absente est placée au milieu de sa plage
+_MISSING = 0.5
+_ANY_FEATURE = ' OR '.join(f'{name} IS NOT NULL' for name in _NAMES)
+# Libellés : une ligne « titre␟artiste » par morceau (bien plus rapide à relire que du JSON)
+_LABEL_SEPARATOR = '\x1f'
+INDEX_VERSION = 1
+
+
+def _label(name: str) -> str:
+    return name.replace('\n', ' ').replace(_LABEL_SEPARATOR, ' ')
+
+
+def normalize(rows: np.ndarray) -> np.ndarray:
+    """Valeurs brutes (NaN si absentes) → matrice float32 dans [0, 1]"""
+    matrix = (rows.astype(np.float32) - _LOW) / _SPAN
+    matrix = np.clip(matrix, 0.0, 1.0)
+    matrix[np.isnan(matrix)] = _MISSING
+    return matrix
+
+
+def denormalize(vector: np.ndarray) -> Dict[str, float]:
+    """Ligne normalisée → caractéristiques dans leurs unités d'origine"""
+    return {name: round(float(value), 3) for name, value in zip(_NAMES, _LOW + vector * _SPAN)}
+
+
+class AudioFeatureIndex:
+    """
+    Index des caractéristiques audio de soundcharts_tracks : une matrice float32
+    (une ligne par morceau, valeurs ramenées à [0, 1]) projetée en mémoire depuis le
+    disque, avec les ids SQLite et les libellés. Les k plus proches voisins
+    (distance euclidienne) se calculent en une passe vectorisée sur la matrice.
+
+    L'ETL appelle `refresh` après l'enrichissement : les lignes d'id supérieur au
+    dernier indexé sont ajoutées, celles réenrichies depuis sont réécrites sur place,
+    et l'index n'est reconstruit en entier que si des lignes ont disparu. Les
+    lecteurs (API) rouvrent la projection quand meta.json change. Une reconstruction
+    écrit une nouvelle génération de fichiers : un lecteur ne voit jamais un index
+    à moitié écrit.
+    """
+
+    def __init__(self, directory: str):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self._meta: Optional[Dict] = None
+        self._meta_mtime = None
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: Optional[np.ndarray] = None
+        self._labels: List[Tuple[str, str]] = []
+        self._labels_bytes = 0
+        self._positions: Dict[Tuple[str, str], int] = {}
+        # Lectures concurrentes (threads de l'API) : rechargement sous verrou
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_database(cls, db_path: str) -> 'AudioFeatureIndex':
+        """Index de la base ETL (AUDIO_INDEX_DIR, sinon audio_index/ à côté de la base)"""
+        return cls(os.getenv('AUDIO_INDEX_DIR') or os.path.join(os.path.dirname(db_path) or '.', 'audio_index'))
+
+    def _path(self, kind: str, generation: int) -> str:
+        extension = {'features': 'f32', 'ids': 'i64', 'labels': 'txt'}[kind]
+        return os.path.join(self.directory, f'{kind}-{generation}.{extension}')
+
+    # ------------------------------------------------------------------
+    # Mise à jour (ETL)
+    # ------------------------------------------------------------------
+    def refresh(self, db: Database) -> Dict:
+        """
+        Met l'index à jour depuis soundcharts_tracks
+
+        Returns:
+            Lignes ajoutées, réécrites, total indexé et reconstruction complète ou non
+        """
+        started = time.perf_counter()
+        meta = self._read_meta()
+        with db.read() as conn:
+            # Horodatage pris avant la lecture : un enrichissement concurrent sera revu
+            synced_at = conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+            total = conn.execute(f"SELECT COUNT(*) FROM soundcharts_tracks WHERE {_ANY_FEATURE}").fetchone()[0]
+            rebuild = meta is None or meta['version'] != INDEX_VERSION or meta['features'] != _NAMES
+            added = conn.execute(f'''
+                SELECT id, track_name, artist_name, {', '.join(_NAMES)}
+                FROM soundcharts_tracks
+                WHERE id > ? AND ({_ANY_FEATURE})
+                ORDER BY id
+            ''', (0 if rebuild else meta['max_id'],)).fetchall()
+            updated = [] if rebuild else conn.execute(f'''
+                SELECT id, track_name, artist_name, {', '.join(_NAMES)}
+                FROM soundcharts_tracks
+                WHERE id <= ? AND enriched_at >= ? AND ({_ANY_FEATURE})
+            ''', (meta['max_id'], meta['synced_at'])).fetchall()
+
+        if not rebuild and (meta['count'] + len(added) != total
+                            or self._renamed(meta['generation'], meta['count'], updated)):
+            # Lignes supprimées (ou remplacées sous un nouvel id) : positions à refaire.
+            # Morceau renommé : les libellés (texte, longueur variable) ne se réécrivent
+            # pas sur place
+            with db.read() as conn:
+                added = conn.execute(f'''
+                    SELECT id, track_name, artist_name, {', '.join(_NAMES)}
+                    FROM soundcharts_tracks WHERE {_ANY_FEATURE} ORDER BY id
+                ''').fetchall()
+            rebuild, updated = True, []
+
+        os.makedirs(self.directory, exist_ok=True)
+        rewritten = 0
+        if rebuild:
+            generation = (meta['generation'] + 1) if meta else 1
+            count = self._write_rows(generation, added, mode='wb')
+            max_id = added[-1][0] if added else 0
+        else:
+            generation, count, max_id = meta['generation'], meta['count'], meta['max_id']
+            rewritten = self._rewrite_rows(generation, count, updated)
+            if added:
+                count += self._write_rows(generation, added, mode='ab')
+                max_id = added[-1][0]
+
+        if rebuild or added or updated:
+            # Les ajouts sont écrits avant meta.json : un lecteur ne voit que des lignes complètes
+            self._write_meta({'version': INDEX_VERSION, 'features': _NAMES, 'generation': generation,
+                              'count': count, 'max_id': max_id, 'synced_at': synced_at})
+            if rebuild:
+                self._remove_generations(keep=generation)
+        result = {'added': 0 if rebuild else len(added), 'updated': rewritten, 'count': count,
+                  'rebuilt': rebuild, 'seconds': round(time.perf_counter() - started, 3)}
+        if rebuild or added or rewritten:
+            self.logger.info(f"🎼 Index audio mis à jour: {result}")
+        return result
+
+    def _write_rows(self, generation: int, rows: List[tuple], mode: str) -> int:
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        raw = np.array([[np.nan if value is None else value for value in row[3:]] for row in rows],
+                       dtype=np.float64).reshape(len(rows), len(_NAMES))
+        with open(self._path('features', generation), mode) as f:
+            f.write(normalize(raw).tobytes())
+        with open(self._path('ids', generation), mode) as f:
+            f.write(ids.tobytes())
+        with open(self._path('labels', generation), mode) as f:
+            f.write(''.join(f"{_label(row[1])}{_LABEL_SEPARATOR}{_label(row[2])}\n" for row in rows).encode('utf-8'))
+        return len(rows)
+
+    def _positions_of(self, generation: int, count: int, rows: List[tuple]) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions dans l'index, masque des lignes indexées) des lignes (id, ...)"""
+        ids = np.fromfile(self._path('ids', generation), dtype=np.int64, count=count)
+        row_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        positions = np.searchsorted(ids, row_ids)
+        found = (positions < count) & (ids[np.minimum(positions, count - 1)] == row_ids)
+        return positions, found
+
+    def _renamed(self, generation: int, count: int, rows: List[tuple]) -> bool:
+        """Une ligne réenrichie (id, titre, artiste, ...) a-t-elle changé de titre ou d'artiste ?"""
+        if not rows or not count:
+            return False
+        positions, found = self._positions_of(generation, count, rows)
+        with open(self._path('labels', generation), 'rb') as f:
+            labels = f.read().decode('utf-8').split('\n')
+        for row, position, indexed in zip(rows, positions, found):
+            if indexed and labels[position] != f"{_label(row[1])}{_LABEL_SEPARATOR}{_label(row[2])}":
+                return True
+        return False
+
+    def _rewrite_rows(self, generation: int, count: int, rows: List[tuple]) -> int:
+        """
+        Réécrit sur place les lignes réenrichies dont les valeurs ont changé (enriched_at
+        est à la seconde près : une ligne déjà indexée peut revenir sans changement)
+
+        Returns:
+            Nombre de lignes réécrites
+        """
+        if not rows or not count:
+            return 0
+        positions, found = self._positions_of(generation, count, rows)
+        raw = np.array([[np.nan if value is None else value for value in row[3:]] for row in rows],
+                       dtype=np.float64).reshape(len(rows), len(_NAMES))
+        positions, values = positions[found], normalize(raw[found])
+        matrix = np.memmap(self._path('features', generation), dtype=np.float32, mode='r+',
+                           shape=(count, len(_NAMES)))
+        changed = (matrix[positions] != values).any(axis=1)
+        if changed.any():
+            matrix[positions[changed]] = values[changed]
+            matrix.flush()
+        del matrix
+        return int(changed.sum())
+
+    def _write_meta(self, meta: Dict):
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    def _remove_generations(self, keep: int):
+        # Un lecteur qui projette encore une ancienne génération la garde jusqu'à sa réouverture
+        for name in os.listdir(self.directory):
+            stem, _, extension = name.rpartition('.')
+            kind, _, generation = stem.partition('-')
+            if extension in ('f32', 'i64', 'txt') and generation.isdigit() and int(generation) != keep:
+                os.remove(os.path.join(self.directory, name))
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def _load(self) -> bool:
+        """(Ré)ouvre la projection si meta.json a changé ; False s'il n'y a pas d'index"""
+        try:
+            mtime = os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._meta_mtime:
+            return self._matrix is not None
+        meta = self._read_meta()
+        if meta is None or meta['version'] != INDEX_VERSION:
+            return False
+        count, generation = meta['count'], meta['generation']
+        if self._meta is None or self._meta['generation'] != generation or count < len(self._labels):
+            self._labels, self._labels_bytes, self._positions = [], 0, {}
+        if count:
+            self._matrix = np.memmap(self._path('features', generation), dtype=np.float32, mode='r',
+                                     shape=(count, len(_NAMES)))
+            self._ids = np.memmap(self._path('ids', generation), dtype=np.int64, mode='r', shape=(count,))
+        else:
+            self._matrix, self._ids = np.empty((0, len(_NAMES)), dtype=np.float32), np.empty(0, dtype=np.int64)
+        self._meta, self._meta_mtime = meta, mtime
+        return True
+
+    def _load_labels(self):
+        """Libellés lus à la demande ; seules les lignes ajoutées depuis la dernière lecture sont lues"""
+        count = self._meta['count']
+        if len(self._labels) >= count:
+            return
+        with open(self._path('labels', self._meta['generation']), 'rb') as f:
+            f.seek(self._labels_bytes)
+            data = f.read()
+        # Lignes complètes seulement : un ajout peut être en cours d'écriture
+        lines = data[:data.rfind(b'\n')].split(b'\n')[:count - len(self._labels)]
+        self._labels_bytes += sum(map(len, lines)) + len(lines)
+        for line in lines:
+            track, _, artist = line.decode('utf-8').partition(_LABEL_SEPARATOR)
+            self._positions[(track.lower(), artist.lower())] = len(self._labels)
+            self._labels.append((track, artist))
+
+    def _snapshot(self) -> Optional[Tuple[np.ndarray, np.ndarray, List[Tuple[str, str]]]]:
+        """(matrice, ids, libellés) cohérents de l'index courant ; None s'il n'y a pas d'index"""
+        with self._lock:
+            if not self._load():
+                return None
+            self._load_labels()
+            return self._matrix, self._ids, self._labels
+
+    def __len__(self) -> int:
+        snapshot = self._snapshot()
+        return len(snapshot[1]) if snapshot else 0
+
+    def _neighbours(self, snapshot, query: np.ndarray, columns: Optional[np.ndarray], k: int,
+                    exclude: Optional[int] = None) -> List[Dict]:
+        matrix, ids, labels = snapshot
+        # Vue ndarray de la projection : les opérations sur np.memmap sont plus lentes
+        matrix = np.asarray(matrix)
+        if columns is not None:
+            matrix = matrix[:, columns]
+        # Carrés des distances (racine des seuls voisins retenus)
+        difference = matrix - query
+        distances = np.einsum('ij,ij->i', difference, difference)
+        if exclude is not None:
+            distances[exclude] = np.inf
+        k = min(k, distances.size - (exclude is not None))
+        if k <= 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        return [{
+            'id': int(ids[position]),
+            'track': labels[position][0],
+            'artist': labels[position][1],
+            'distance': round(float(np.sqrt(distances[position])), 4)
+        } for position in nearest]
+
+    def vectors(self, tracks: List[Tuple[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lignes normalisées de morceaux (titre, artiste)
+
+        Returns:
+            (matrice, masque des morceaux indexés) ; les lignes des morceaux absents sont à 0
+        """
+        vectors = np.zeros((len(tracks), len(_NAMES)), dtype=np.float32)
+        found = np.zeros(len(tracks), dtype=bool)
+        with self._lock:
+            snapshot = self._snapshot()
+            if snapshot is None:
+                return vectors, found
+            positions = [self._positions.get((track.lower(), artist.lower())) for track, artist in tracks]
+        for i, position in enumerate(positions):
+            if position is not None:
+                vectors[i] = snapshot[0][position]
+                found[i] = True
+        return vectors, found
+
+    def similar_to(self, track_name: str, artist_name: str, k: int = 10) -> Optional[List[Dict]]:
+        """
+        Morceaux les plus proches d'un morceau indexé (toutes les caractéristiques)
+
+        Returns:
+            Voisins du plus proche au plus lointain (id, track, artist, distance) ; None
+            si le morceau n'est pas indexé
+        """
+        with self._lock:
+            snapshot = self._snapshot()
+            position = self._positions.get((track_name.lower(), artist_name.lower())) if snapshot else None
+        if position is None:
+            return None
+        return self._neighbours(snapshot, np.asarray(snapshot[0][position]), None, k, exclude=position)
+
+    def matching(self, profile: Dict[str, float], k: int = 10) -> List[Dict]:
+        """
+        Morceaux les plus proches d'un profil de caractéristiques brutes, par exemple
+        {'valence': 0.8, 'energy': 0.7, 'tempo': 120} : seules les caractéristiques
+        données comptent dans la distance
+
+        Raises:
+            ValueError: Caractéristique inconnue ou profil vide
+        """
+        unknown = set(profile) - set(FEATURES)
+        if unknown or not profile:
+            raise ValueError(f"Caractéristiques attendues parmi: {', '.join(_NAMES)}"
+                             + (f" (inconnues: {', '.join(sorted(unknown))})" if unknown else ''))
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return []
+        columns = np.array([_NAMES.index(name) for name in profile])
+        raw = np.full(len(_NAMES), np.nan)
+        raw[columns] = list(profile.values())
+        return self._neighbours(snapshot, normalize(raw[None, :])[0, columns], columns, k)
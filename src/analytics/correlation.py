@@ -0,0 +1,348 @@
+# src/analytics/correlation.py
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from storage import hour_bucket
+from .hub import StreamingEngine
+from .snapshot import Snapshot
+
+HOUR = 3600
+_WINDOW_UNITS = {'h': 1, 'd': 24}
+
+
+def parse_windows(spec: str) -> Dict[str, int]:
+    """'1h,24h,7d' → {'1h': 1, '24h': 24, '7d': 168} (durées en heures)"""
+    windows = {}
+    for name in filter(None, (part.strip() for part in spec.split(','))):
+        unit = _WINDOW_UNITS.get(name[-1:])
+        if unit is None or not name[:-1].isdigit() or int(name[:-1]) <= 0:
+            raise ValueError(f"Fenêtre invalide: {name} (attendu <n>h ou <n>d)")
+        windows[name] = int(name[:-1]) * unit
+    return windows
+
+
+def merge_moments(target: List[float], other: List[float], sign: int = 1):
+    """
+    Combine deux moments de Welford [n, moyenne, M2] (formule parallèle de Chan) ;
+    sign=-1 retire `other` de `target` (sortie d'une tranche de la fenêtre)
+    """
+    n_a, mean_a, m2_a = target
+    n_b, mean_b, m2_b = other
+    if n_b == 0:
+        return
+    if sign > 0:
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        target[:] = [n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n]
+        return
+    n = n_a - n_b
+    if n <= 0:
+        target[:] = [0, 0.0, 0.0]
+        return
+    mean = (n_a * mean_a - n_b * mean_b) / n
+    delta = mean_b - mean
+    target[:] = [n, mean, max(m2_a - m2_b - delta * delta * n * n_b / n_a, 0.0)]
+
+
+def chi2_sf(x: float, dof: int) -> float:
+    """P(X² ≥ x) pour dof degrés de liberté : gamma incomplète régularisée Q(dof/2, x/2)"""
+    if x <= 0 or dof <= 0:
+        return 1.0
+    a, x = dof / 2.0, x / 2.0
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Série de P(a, x), Q = 1 - P
+        term = total = 1.0 / a
+        denominator = a
+        for _ in range(1000):
+            denominator += 1
+            term *= x / denominator
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return min(max(1.0 - total * math.exp(log_prefix), 0.0), 1.0)
+    # Fraction continue de Q(a, x) (méthode de Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = d if abs(d) > tiny else tiny
+        c = b + an / c
+        c = c if abs(c) > tiny else tiny
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(max(h * math.exp(log_prefix), 0.0), 1.0)
+
+
+def chi_square(table: np.ndarray) -> Tuple[float, int, float, float]:
+    """
+    Test d'indépendance sur un tableau de contingence (lignes/colonnes vides ignorées)
+
+    Returns:
+        (chi², degrés de liberté, p-value, V de Cramér)
+    """
+    table = table[table.sum(axis=1) > 0]
+    table = table[:, table.sum(axis=0) > 0]
+    n = float(table.sum())
+    rows, columns = table.shape
+    if n == 0 or rows < 2 or columns < 2:
+        return 0.0, 0, 1.0, 0.0
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+    chi2 = float(((table - expected) ** 2 / expected).sum())
+    dof = (rows - 1) * (columns - 1)
+    return chi2, dof, chi2_sf(chi2, dof), math.sqrt(chi2 / (n * (min(rows, columns) - 1)))
+
+
+class _Tally:
+    """Comptes (météo, humeur) et moments de température par humeur d'une tranche ou d'une fenêtre"""
+
+    __slots__ = ('counts', 'moments')
+
+    def __init__(self):
+        self.counts: Dict[Tuple[str, str], int] = {}
+        self.moments: Dict[str, List[float]] = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot) -> '_Tally':
+        tally = cls()
+        weather = snapshot.weather_main or ''
+        per_mood: Dict[str, int] = {}
+        for track in snapshot.tracks:
+            mood = track.get('mood_category') or ''
+            per_mood[mood] = per_mood.get(mood, 0) + 1
+        for mood, count in per_mood.items():
+            tally.counts[(weather, mood)] = count
+            if snapshot.temperature is not None:
+                # Même relevé pour tout le snapshot : `count` observations de la même valeur
+                tally.moments[mood] = [count, float(snapshot.temperature), 0.0]
+        return tally
+
+    def add(self, other: '_Tally', sign: int = 1):
+        for key, count in other.counts.items():
+            value = self.counts.get(key, 0) + sign * count
+            if value > 0:
+                self.counts[key] = value
+            else:
+                self.counts.pop(key, None)
+        for mood, moments in other.moments.items():
+            target = self.moments.setdefault(mood, [0, 0.0, 0.0])
+            merge_moments(target, moments, sign)
+            if target[0] <= 0:
+                del self.moments[mood]
+
+    def copy(self) -> '_Tally':
+        tally = _Tally()
+        tally.counts = dict(self.counts)
+        tally.moments = {mood: list(moments) for mood, moments in self.moments.items()}
+        return tally
+
+    def to_state(self) -> Dict:
+        return {
+            'counts': [[weather, mood, count] for (weather, mood), count in self.counts.items()],
+            'moments': self.moments
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> '_Tally':
+        tally = cls()
+        tally.counts = {(weather, mood): count for weather, mood, count in state['counts']}
+        tally.moments = {mood: list(moments) for mood, moments in state['moments'].items()}
+        return tally
+
+
+class WeatherMoodStats(StreamingEngine):
+    """
+    Corrélation météo × humeur maintenue en ligne : tableau de contingence, chi² et
+    V de Cramér, moyenne et variance de la température par humeur (Welford).
+
+    L'état est découpé en tranches horaires conservées sur la plus longue fenêtre ;
+    chaque fenêtre glissante ('1h', '24h', '7d'...) garde ses totaux courants, mis à
+    jour à l'arrivée d'un snapshot et quand une tranche en sort. Une requête coûte
+    O(météos × humeurs), quel que soit l'historique. La fenêtre 'all' couvre tout ce
+    que le moteur a vu, y compris le détail déjà purgé par la rétention.
+    """
+
+    name = 'weather_mood'
+    version = 1
+
+    def __init__(self, windows: Optional[str] = None):
+        """
+        Args:
+            windows: Fenêtres glissantes, alignées sur l'heure (ANALYTICS_WINDOWS, '1h,24h,7d')
+        """
+        self.windows = parse_windows(windows or os.getenv('ANALYTICS_WINDOWS', '1h,24h,7d'))
+        self.horizon = max(self.windows.values()) * HOUR
+        self.reset()
+
+    def reset(self):
+        self.head: Optional[int] = None
+        self.hours: Dict[int, _Tally] = {}
+        self.totals: Dict[str, _Tally] = {name: _Tally() for name in self.windows}
+        self.all = _Tally()
+        # Tranches à réécrire / à supprimer à la prochaine sauvegarde
+        self._dirty: set = set()
+        self._dropped: set = set()
+
+    def observe(self, cursor, snapshot: Snapshot):
+        delta = _Tally.from_snapshot(snapshot)
+        hour = hour_bucket(snapshot.ts_epoch)
+        if self.head is None or hour > self.head:
+            self._advance(hour)
+
+        self.all.add(delta)
+        if hour <= self.head - self.horizon:
+            # Snapshot en retard, plus ancien que toutes les fenêtres
+            return
+        self.hours.setdefault(hour, _Tally()).add(delta)
+        self._dirty.add(hour)
+        for name, hours in self.windows.items():
+            if hour > self.head - hours * HOUR:
+                self.totals[name].add(delta)
+
+    def _advance(self, hour: int):
+        """Avance la tête à `hour` : les tranches sorties de chaque fenêtre en sont retirées"""
+        previous, self.head = self.head, hour
+        if previous is not None:
+            for name, hours in self.windows.items():
+                for bucket, tally in self.hours.items():
+                    if previous - hours * HOUR < bucket <= hour - hours * HOUR:
+                        self.totals[name].add(tally, -1)
+        for bucket in [bucket for bucket in self.hours if bucket <= hour - self.horizon]:
+            del self.hours[bucket]
+            self._dirty.discard(bucket)
+            self._dropped.add(bucket)
+
+    def window(self, name: str = '24h', now: Optional[float] = None) -> _Tally:
+        """
+        Totaux d'une fenêtre à l'instant `now` (maintenant par défaut) : si aucune
+        donnée n'est arrivée depuis, les tranches expirées sont retirées d'une copie.
+        Une fenêtre absente d'ANALYTICS_WINDOWS est sommée depuis les tranches
+        horaires (O(heures de la fenêtre)), dans la limite de la plus longue.
+
+        Raises:
+            ValueError: Si la fenêtre dépasse la plus longue fenêtre configurée
+        """
+        if name == 'all':
+            return self.all
+        now_hour = hour_bucket(int(now if now is not None else time.time()))
+        if name not in self.windows:
+            return self._window_from_hours(name, now_hour)
+        hours = self.windows[name]
+        tally = self.totals[name]
+        if self.head is None or now_hour <= self.head:
+            return tally
+        expired = [bucket for hour, bucket in self.hours.items()
+                   if self.head - hours * HOUR < hour <= now_hour - hours * HOUR]
+        if not expired:
+            return tally
+        tally = tally.copy()
+        for bucket in expired:
+            tally.add(bucket, -1)
+        return tally
+
+    def _window_from_hours(self, name: str, now_hour: int) -> _Tally:
+        """Fenêtre non configurée : sommée depuis les tranches horaires (au plus la plus longue fenêtre)"""
+        hours = parse_windows(name)[name]
+        if hours * HOUR > self.horizon:
+            raise ValueError(f"Fenêtre {name} plus longue que l'historique conservé "
+                             f"({self.horizon // HOUR} h, voir ANALYTICS_WINDOWS)")
+        tally = _Tally()
+        for hour, bucket in self.hours.items():
+            if now_hour - hours * HOUR < hour <= now_hour:
+                tally.add(bucket)
+        return tally
+
+    def contingency(self, window: str = '24h', now: Optional[float] = None) -> Tuple[List[str], List[str], np.ndarray]:
+        """
+        Tableau de contingence de la fenêtre (météo ou humeur inconnue exclue)
+
+        Returns:
+            (météos, humeurs, comptes de forme len(météos) × len(humeurs))
+        """
+        counts = {key: count for key, count in self.window(window, now).counts.items() if key[0] and key[1]}
+        weathers = sorted({weather for weather, _ in counts})
+        moods = sorted({mood for _, mood in counts})
+        table = np.zeros((len(weathers), len(moods)), dtype=np.int64)
+        rows = {weather: i for i, weather in enumerate(weathers)}
+        columns = {mood: j for j, mood in enumerate(moods)}
+        for (weather, mood), count in counts.items():
+            table[rows[weather], columns[mood]] = count
+        return weathers, moods, table
+
+    def temperature_by_mood(self, window: str = '24h', now: Optional[float] = None) -> Dict[str, Dict]:
+        """Nombre de tracks, moyenne et écart-type (échantillon) de la température par humeur"""
+        stats = {}
+        for mood, (n, mean, m2) in sorted(self.window(window, now).moments.items()):
+            if not mood:
+                continue
+            stats[mood] = {
+                'count': int(n),
+                'mean': round(mean, 2),
+                'std': round(math.sqrt(m2 / (n - 1)), 2) if n > 1 else 0.0
+            }
+        return stats
+
+    def correlation(self, window: str = '24h', now: Optional[float] = None) -> Dict:
+        """
+        Résumé de la fenêtre : tableau de contingence, humeur dominante par météo,
+        test du chi² d'indépendance, V de Cramér et températures par humeur
+        """
+        weathers, moods, table = self.contingency(window, now)
+        chi2, dof, p_value, cramers_v = chi_square(table)
+        return {
+            'window': window,
+            'tracks': int(table.sum()),
+            'table': {
+                weather: {mood: int(count) for mood, count in zip(moods, row) if count}
+                for weather, row in zip(weathers, table)
+            },
+            'dominant_mood': {weather: moods[int(row.argmax())] for weather, row in zip(weathers, table)},
+            'chi2': round(chi2, 4),
+            'dof': dof,
+            'p_value': p_value,
+            'cramers_v': round(cramers_v, 4),
+            'temperature_by_mood': self.temperature_by_mood(window, now)
+        }
+
+    def to_state(self, full: bool = False) -> Dict[str, Optional[Dict]]:
+        # Une partie par tranche horaire + 'meta' (tête et fenêtre 'all') ; les totaux
+        # des fenêtres se recalculent depuis les tranches au chargement
+        hours = self.hours if full else self._dirty
+        parts: Dict[str, Optional[Dict]] = {f'hour:{hour}': self.hours[hour].to_state() for hour in hours}
+        if not full:
+            parts.update({f'hour:{hour}': None for hour in self._dropped})
+        parts['meta'] = {'head': self.head, 'all': self.all.to_state()}
+        self._dirty, self._dropped = set(), set()
+        return parts
+
+    def load_state(self, parts: Dict[str, Dict]):
+        self.reset()
+        meta = parts.get('meta')
+        if meta is None or meta['head'] is None:
+            return
+        self.all = _Tally.from_state(meta['all'])
+        self.head = meta['head']
+        for part, state in parts.items():
+            if not part.startswith('hour:'):
+                continue
+            hour = int(part[len('hour:'):])
+            if hour <= self.head - self.horizon:
+                self._dropped.add(hour)
+                continue
+            tally = _Tally.from_state(state)
+            self.hours[hour] = tally
+            for name, hours in self.windows.items():
+                if hour > self.head - hours * HOUR:
+                    self.totals[name].add(tally)
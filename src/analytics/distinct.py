@@ -0,0 +1,271 @@
+# src/analytics/distinct.py
+import hashlib
+import math
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from storage import Database, day_bucket
+from storage.rollups import SECONDS_PER_DAY
+from .hub import StreamingEngine
+from .snapshot import Snapshot
+
+# 2^12 registres d'un octet : 4 Kio par résumé (bien moins une fois compressé),
+# erreur type 1,04 / √4096 ≈ 1,6 %
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+_HASH_BITS = 64 - HLL_PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+HLL_TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS hll_city_day (
+        day_bucket INTEGER NOT NULL,
+        city_id INTEGER NOT NULL REFERENCES dim_city(id),
+        tracks BLOB NOT NULL,
+        artists BLOB NOT NULL,
+        PRIMARY KEY (day_bucket, city_id)
+    ) WITHOUT ROWID
+'''
+
+# Séparateur artiste / titre dans la clé d'un morceau
+_TRACK_SEPARATOR = '\x1f'
+
+
+class HyperLogLog:
+    """
+    Résumé HyperLogLog (Flajolet et al.) d'un ensemble : estimation du nombre
+    d'éléments distincts à ±1,6 % (erreur type) en 4 Kio. L'union de deux ensembles
+    est le maximum registre par registre : les résumés se fusionnent sans perte et
+    rajouter un élément déjà vu ne change rien.
+    """
+
+    __slots__ = ('registers',)
+
+    def __init__(self, registers: Optional[np.ndarray] = None):
+        self.registers = registers if registers is not None else np.zeros(HLL_REGISTERS, dtype=np.uint8)
+
+    def add_many(self, items: Iterable[str]) -> bool:
+        """
+        Ajoute des éléments (hachage et mise à jour vectorisés)
+
+        Returns:
+            True si un registre a changé (sinon, rien à réécrire)
+        """
+        items = list(items)
+        if not items:
+            return False
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little')
+             for item in items),
+            dtype=np.uint64, count=len(items)
+        )
+        index = (hashes >> np.uint64(_HASH_BITS)).astype(np.intp)
+        # Rang = position du premier bit à 1 dans les bits restants (< 2^52 : exacts en
+        # float64, frexp donne leur longueur en bits)
+        _, bit_length = np.frexp((hashes & np.uint64((1 << _HASH_BITS) - 1)).astype(np.float64))
+        rank = (_HASH_BITS + 1 - bit_length).astype(np.uint8)
+        if not (rank > self.registers[index]).any():
+            return False
+        np.maximum.at(self.registers, index, rank)
+        return True
+
+    def merge(self, other: 'HyperLogLog'):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        """Nombre d'éléments distincts estimé (comptage linéaire pour les petits ensembles)"""
+        registers = self.registers
+        estimate = _ALPHA * HLL_REGISTERS ** 2 / float(np.ldexp(1.0, -registers.astype(np.int32)).sum())
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * HLL_REGISTERS and zeros:
+            estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        # Niveau 1 : réécrit à chaque relevé, la compression rapide suffit (registres peu variés)
+        return zlib.compress(self.registers.tobytes(), 1)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'HyperLogLog':
+        return cls(np.frombuffer(zlib.decompress(blob), dtype=np.uint8).copy())
+
+
+class DistinctCounts(StreamingEngine):
+    """
+    Morceaux et artistes distincts par (ville, jour UTC), en résumés HyperLogLog
+    stockés dans la table hll_city_day (mis à jour dans la transaction qui écrit les
+    faits). Le nombre de distincts d'une plage de jours ou de villes est l'estimation
+    de l'union de leurs résumés : quelques Kio à fusionner au lieu d'un
+    COUNT(DISTINCT) sur les faits, et les jours purgés par la rétention restent
+    comptés. Lecture : `distinct_counts` et `distinct_counts_by`.
+    """
+
+    name = 'distinct_counts'
+    version = 1
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # (jour, ville) → (morceaux, artistes) des jours récents, évite de relire la table
+        self._sketches: Dict[Tuple[int, int], Tuple[HyperLogLog, HyperLogLog]] = {}
+        self._city_ids: Dict[Tuple[str, str], int] = {}
+        self._last_day: Optional[int] = None
+
+    def create_tables(self, cursor):
+        cursor.execute(HLL_TABLE_DDL)
+
+    def clear_tables(self, cursor):
+        """
+        Rien à vider : rejouer les faits dans les résumés existants ne change rien
+        (union idempotente), et les jours déjà purgés du détail restent comptés
+        """
+
+    def observe(self, cursor, snapshot: Snapshot):
+        day = day_bucket(snapshot.ts_epoch)
+        city_id = self._city_id(cursor, snapshot.city, snapshot.country)
+        if city_id is None:
+            return
+        if self._last_day is None or day > self._last_day:
+            # Seuls la veille et le jour courant restent en mémoire
+            self._last_day = day
+            self._sketches = {key: pair for key, pair in self._sketches.items() if key[0] >= day - 1}
+
+        pair = self._sketches.get((day, city_id))
+        if pair is None:
+            row = cursor.execute(
+                "SELECT tracks, artists FROM hll_city_day WHERE day_bucket = ? AND city_id = ?", (day, city_id)
+            ).fetchone()
+            pair = (HyperLogLog.from_bytes(row[0]), HyperLogLog.from_bytes(row[1])) if row else \
+                (HyperLogLog(), HyperLogLog())
+            if day >= self._last_day - 1:
+                self._sketches[(day, city_id)] = pair
+
+        tracks, artists = pair
+        changed = tracks.add_many(
+            f"{track['artist_name']}{_TRACK_SEPARATOR}{track['track_name']}" for track in snapshot.tracks
+        )
+        changed = artists.add_many({track['artist_name'] for track in snapshot.tracks}) or changed
+        if changed:
+            cursor.execute('''
+                INSERT INTO hll_city_day (day_bucket, city_id, tracks, artists) VALUES (?, ?, ?, ?)
+                ON CONFLICT (day_bucket, city_id) DO UPDATE SET
+                    tracks = excluded.tracks, artists = excluded.artists
+            ''', (day, city_id, tracks.to_bytes(), artists.to_bytes()))
+
+    def _city_id(self, cursor, city: str, country: str) -> Optional[int]:
+        key = (city, country)
+        if key not in self._city_ids:
+            row = cursor.execute("SELECT id FROM dim_city WHERE city = ? AND country = ?", key).fetchone()
+            if row is None:
+                return None
+            self._city_ids[key] = row[0]
+        return self._city_ids[key]
+
+    def to_state(self, full: bool = False) -> Dict[str, Optional[Dict]]:
+        # Les résumés sont dans hll_city_day : l'état ne marque que leur format
+        return {'meta': {'precision': HLL_PRECISION}} if full else {}
+
+    def load_state(self, parts):
+        self.reset()
+
+
+def _sketch_rows(db: Database, since: Optional[int], until: Optional[int],
+                 city: Optional[str], country: Optional[str]) -> Optional[List[tuple]]:
+    """Résumés (jour, ville, pays, morceaux, artistes) de la plage ; None sans table hll_city_day"""
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("h.day_bucket >= ?")
+        params.append(day_bucket(since))
+    if until is not None:
+        clauses.append("h.day_bucket < ?")
+        params.append(-(-until // SECONDS_PER_DAY))
+    if city is not None:
+        clauses.append("c.city = ?")
+        params.append(city)
+    if country is not None:
+        clauses.append("c.country = ?")
+        params.append(country)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    with db.read() as conn:
+        try:
+            return conn.execute(f'''
+                SELECT h.day_bucket, c.city, c.country, h.tracks, h.artists
+                FROM hll_city_day h
+                JOIN dim_city c ON c.id = h.city_id
+                {where}
+                ORDER BY h.day_bucket, c.city
+            ''', params).fetchall()
+        except sqlite3.OperationalError:
+            # Base antérieure aux résumés de distincts
+            return None
+
+
+def distinct_counts(db: Database, since: Optional[int] = None, until: Optional[int] = None,
+                    city: Optional[str] = None, country: Optional[str] = None) -> Optional[Dict]:
+    """
+    Morceaux et artistes distincts sur une plage (union des résumés par ville et par
+    jour), gardé en cache jusqu'à la prochaine écriture
+
+    Args:
+        since: Début de la plage en secondes Unix (jour UTC entier inclus)
+        until: Fin exclue de la plage en secondes Unix (jour entamé inclus)
+        city, country: Restreint à une ville (ou un pays)
+
+    Returns:
+        tracks, artists (estimations à ±1,6 %), days et cities couverts ; None si la
+        base n'a pas de résumés
+    """
+    def compute():
+        rows = _sketch_rows(db, since, until, city, country)
+        if rows is None:
+            return None
+        tracks, artists = HyperLogLog(), HyperLogLog()
+        for _, _, _, track_blob, artist_blob in rows:
+            tracks.merge(HyperLogLog.from_bytes(track_blob))
+            artists.merge(HyperLogLog.from_bytes(artist_blob))
+        return {
+            'tracks': tracks.estimate(),
+            'artists': artists.estimate(),
+            'days': len({row[0] for row in rows}),
+            'cities': len({(row[1], row[2]) for row in rows})
+        }
+    return db.cache.get_or_compute(('hll', since, until, city, country), compute)
+
+
+def distinct_counts_by(db: Database, by: str, since: Optional[int] = None, until: Optional[int] = None,
+                       city: Optional[str] = None, country: Optional[str] = None) -> Optional[List[Dict]]:
+    """
+    Morceaux et artistes distincts par jour ('day', union des villes) ou par ville
+    ('city', union des jours de la plage) ; None si la base n'a pas de résumés
+    """
+    if by not in ('day', 'city'):
+        raise ValueError(f"Regroupement inconnu: {by} (attendu: day, city)")
+
+    def compute():
+        rows = _sketch_rows(db, since, until, city, country)
+        if rows is None:
+            return None
+        groups: Dict[tuple, Tuple[HyperLogLog, HyperLogLog]] = {}
+        for day, row_city, row_country, track_blob, artist_blob in rows:
+            key = (day,) if by == 'day' else (row_city, row_country)
+            tracks, artists = HyperLogLog.from_bytes(track_blob), HyperLogLog.from_bytes(artist_blob)
+            if key in groups:
+                groups[key][0].merge(tracks)
+                groups[key][1].merge(artists)
+            else:
+                groups[key] = (tracks, artists)
+        if by == 'day':
+            labels = {key: {'date': datetime.fromtimestamp(key[0] * SECONDS_PER_DAY, timezone.utc)
+                            .strftime('%Y-%m-%d')} for key in groups}
+        else:
+            labels = {key: {'city': key[0], 'country': key[1]} for key in groups}
+        result = [{**labels[key], 'tracks': tracks.estimate(), 'artists': artists.estimate()}
+                  for key, (tracks, artists) in groups.items()]
+        if by == 'city':
+            result.sort(key=lambda item: item['tracks'], reverse=True)
+        return result
+    return db.cache.get_or_compute(('hll_by', by, since, until, city, country), compute)
@@ -0,0 +1,473 @@
+# src/analytics/heavy_hitters.py
+import heapq
+import os
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from storage import day_bucket, hour_bucket
+from .correlation import HOUR, parse_windows
+from .hub import StreamingEngine
+from .snapshot import Snapshot
+
+KINDS = ('artist', 'track')
+GLOBAL_SCOPE = '*'
+# Fenêtres fixes maintenues : jour UTC en cours et tout ce que le moteur a vu
+# (l'heure en cours est la dernière tranche horaire)
+TUMBLING_WINDOWS = ('day', 'all')
+# Séparateur artiste / titre dans la clé d'un morceau
+_TRACK_SEPARATOR = '\x1f'
+
+
+class SpaceSaving:
+    """
+    Résumé Space-Saving (Metwally et al.) à `capacity` compteurs. Pour un flux de
+    poids total N :
+
+    - chaque compteur surestime : count - error ≤ vrai compte ≤ count ;
+    - error ≤ max_error() ≤ N / capacity, où max_error() est le plus petit compteur
+      d'un résumé plein (0 pour un flux qui n'a jamais rempli le résumé : les
+      comptes sont alors exacts) ;
+    - un élément absent a un vrai compte ≤ max_error() : tout élément plus fréquent
+      est présent.
+
+    Plusieurs résumés se fusionnent avec les mêmes garanties (Cafaro et al.) : c'est
+    ce qui permet de composer les fenêtres glissantes à partir des tranches horaires.
+    """
+
+    __slots__ = ('capacity', 'counts', 'errors', 'total', 'floor')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # élément → compte estimé, et élément → erreur maximale de ce compte
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+        # Borne du vrai compte d'un élément absent tant que le résumé n'est pas plein
+        # (non nulle après une fusion de résumés pleins)
+        self.floor = 0
+
+    def update(self, item: str, weight: int = 1):
+        self.update_many({item: weight})
+
+    def update_many(self, weights: Dict[str, int]):
+        """
+        Ajoute un lot d'éléments pondérés (les morceaux d'un snapshot). Les éléments
+        déjà suivis sont incrémentés d'abord ; les évictions passent ensuite par un
+        tas construit une fois pour le lot, plutôt qu'un parcours des compteurs par
+        élément nouveau.
+        """
+        counts, errors = self.counts, self.errors
+        entering = []
+        for item, weight in weights.items():
+            self.total += weight
+            if item in counts:
+                counts[item] += weight
+            elif len(counts) < self.capacity:
+                counts[item] = self.floor + weight
+                errors[item] = self.floor
+            else:
+                entering.append((item, weight))
+        if not entering:
+            return
+        heap = [(count, item) for item, count in counts.items()]
+        heapq.heapify(heap)
+        for item, weight in entering:
+            # Le plus petit compteur est réattribué : son compte devient l'erreur possible
+            floor, evicted = heapq.heappop(heap)
+            del counts[evicted], errors[evicted]
+            counts[item] = floor + weight
+            errors[item] = floor
+            heapq.heappush(heap, (floor + weight, item))
+
+    def max_error(self) -> int:
+        if len(self.counts) < self.capacity:
+            return self.floor
+        return min(self.counts.values())
+
+    @classmethod
+    def combine(cls, capacity: int, sketches: Iterable['SpaceSaving']) -> 'SpaceSaving':
+        """
+        Fusion de résumés en une passe : un élément absent d'un résumé y compte pour
+        le max_error() de ce résumé, puis seuls les `capacity` plus gros compteurs
+        sont gardés
+        """
+        combined = cls(capacity)
+        sketches = [sketch for sketch in sketches if sketch.total]
+        floors = [sketch.max_error() for sketch in sketches]
+        combined.total = sum(sketch.total for sketch in sketches)
+        combined.floor = sum(floors)
+        if len(sketches) == 1:
+            counts, errors = dict(sketches[0].counts), dict(sketches[0].errors)
+        elif len(sketches) == 2:
+            # Cas courant (glissement d'une fenêtre, requête) : compréhensions sur l'union
+            # des clés, erreurs calculées pour les seuls compteurs gardés
+            (left, right), (left_floor, right_floor) = sketches, floors
+            counts = {item: left.counts.get(item, left_floor) + right.counts.get(item, right_floor)
+                      for item in left.counts.keys() | right.counts.keys()}
+            counts = cls._truncate(counts, capacity)
+            errors = {item: left.errors.get(item, left_floor) + right.errors.get(item, right_floor)
+                      for item in counts}
+        else:
+            # Sommes des écarts au plancher de chaque résumé, plancher total ajouté ensuite
+            counts, errors = {}, {}
+            for sketch, floor in zip(sketches, floors):
+                for item, count in sketch.counts.items():
+                    counts[item] = counts.get(item, 0) + count - floor
+                for item, error in sketch.errors.items():
+                    errors[item] = errors.get(item, 0) + error - floor
+            counts = cls._truncate(counts, capacity)
+            errors = {item: errors[item] + combined.floor for item in counts}
+            if combined.floor:
+                counts = {item: count + combined.floor for item, count in counts.items()}
+        combined.counts, combined.errors = counts, errors
+        return combined
+
+    @staticmethod
+    def _truncate(counts: Dict[str, int], capacity: int) -> Dict[str, int]:
+        """Les `capacity` plus gros compteurs"""
+        if len(counts) <= capacity:
+            return counts
+        # sorted (Timsort en C) est bien plus rapide que heapq.nlargest pour k ≈ n / 2
+        return {item: counts[item] for item in sorted(counts, key=counts.get, reverse=True)[:capacity]}
+
+    def merge(self, other: 'SpaceSaving'):
+        """Ajoute `other` à ce résumé"""
+        merged = SpaceSaving.combine(self.capacity, (self, other))
+        self.counts, self.errors = merged.counts, merged.errors
+        self.total, self.floor = merged.total, merged.floor
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """k éléments de plus grand compte estimé : (élément, compte, erreur)"""
+        errors = self.errors
+        entries = heapq.nlargest(k, self.counts.items(), key=lambda entry: (entry[1], -errors[entry[0]]))
+        return [(item, count, errors[item]) for item, count in entries]
+
+    def to_state(self) -> List:
+        errors = self.errors
+        return [self.total, self.floor, [[item, count, errors[item]] for item, count in self.counts.items()]]
+
+    @classmethod
+    def from_state(cls, capacity: int, state: List) -> 'SpaceSaving':
+        sketch = cls(capacity)
+        sketch.total, sketch.floor = state[0], state[1]
+        entries = state[2]
+        if len(entries) > capacity:
+            # Capacité réduite depuis la sauvegarde : on garde les plus gros compteurs
+            entries = heapq.nlargest(capacity, entries, key=lambda entry: entry[1])
+        sketch.counts = {item: count for item, count, _ in entries}
+        sketch.errors = {item: error for item, _, error in entries}
+        return sketch
+
+
+class _Panes:
+    """
+    Agrégation « deux piles » d'une fenêtre glissante pour un périmètre : `front`
+    garde, pour chaque heure de la partie ancienne de la fenêtre, la fusion de cette
+    heure jusqu'à `front_end` ; `back` la fusion des heures closes suivantes, jusqu'à
+    `back_end`. Quand l'heure avance, la fenêtre est la fusion de deux résumés ; la
+    partie ancienne n'est reconstruite qu'une fois épuisée (coût amorti constant,
+    au lieu d'une fusion de toutes les tranches à chaque heure).
+    """
+
+    __slots__ = ('front', 'back', 'back_end')
+
+    def __init__(self, front: List[Tuple[int, Dict[str, SpaceSaving]]], back_end: int):
+        self.front = front
+        self.back: Optional[Dict[str, SpaceSaving]] = None
+        self.back_end = back_end
+
+
+def scope_key(city: Optional[str] = None, country: Optional[str] = None) -> str:
+    """Clé d'une ville ('Paris|France'), ou du périmètre global"""
+    return GLOBAL_SCOPE if city is None else f"{city}|{country}"
+
+
+class HeavyHitters(StreamingEngine):
+    """
+    Artistes et morceaux les plus fréquents (top-K) par ville et au global, en
+    résumés Space-Saving de taille bornée.
+
+    Un snapshot ne met à jour que la tranche de son heure (une par heure et par
+    ville, gardées sur la plus longue fenêtre). Les fenêtres glissantes
+    (ANALYTICS_WINDOWS), le jour UTC en cours ('day') et 'all' ont chacun un résumé
+    des heures closes, avancé une fois par heure : 'all' et 'day' absorbent la
+    tranche qui se ferme, les fenêtres glissantes sont recalculées par agrégation
+    « deux piles » (deux fusions par heure). Une requête fusionne ce résumé avec la
+    tranche de l'heure en cours et trie au plus 2 × `capacity` compteurs : son coût
+    ne dépend pas de l'historique. 'hour' (et une fenêtre d'une heure) est la
+    tranche en cours. Mémoire bornée par capacity × 2 × villes × (heures + fenêtres).
+    """
+
+    name = 'heavy_hitters'
+    version = 1
+
+    def __init__(self, capacity: Optional[int] = None, windows: Optional[str] = None):
+        """
+        Args:
+            capacity: Compteurs par résumé (HEAVY_HITTERS_CAPACITY, 100)
+            windows: Fenêtres glissantes, alignées sur l'heure (ANALYTICS_WINDOWS, '1h,24h,7d')
+        """
+        self.capacity = capacity or int(os.getenv('HEAVY_HITTERS_CAPACITY', 100))
+        self.windows = parse_windows(windows or os.getenv('ANALYTICS_WINDOWS', '1h,24h,7d'))
+        self.horizon = max(self.windows.values()) * HOUR
+        # Fenêtres à résumé propre (celles d'une heure lisent la tranche en cours)
+        self.maintained = {name: hours for name, hours in self.windows.items() if hours > 1}
+        self.reset()
+
+    def reset(self):
+        self.head: Optional[int] = None
+        # heure → périmètre → type → résumé (ou nom de la partie pas encore décodée)
+        self.slices: Dict[int, Dict[str, Union[str, Dict[str, SpaceSaving]]]] = {}
+        # État chargé : les tranches ne sont décodées qu'au besoin (glissement d'une
+        # fenêtre, nouvelle donnée), la plupart des lectures n'en ont pas besoin
+        self._parts: Mapping[str, Dict] = {}
+        # fenêtre → périmètre → type → résumé des heures closes (avant la tête)
+        self.sketches: Dict[str, Dict[str, Dict[str, SpaceSaving]]] = {
+            name: {} for name in (*self.maintained, *TUMBLING_WINDOWS)
+        }
+        self._dirty: set = set()
+        self._dropped: set = set()
+        # Résumés de requête (heures closes + heure en cours, fenêtres recomposées)
+        self._composed: Dict[tuple, Optional[SpaceSaving]] = {}
+        # (fenêtre, périmètre) → agrégats de glissement (mémoire seulement)
+        self._panes: Dict[Tuple[str, str], _Panes] = {}
+
+    def observe(self, cursor, snapshot: Snapshot):
+        weights: Dict[str, Dict[str, int]] = {kind: {} for kind in KINDS}
+        for track in snapshot.tracks:
+            artist = track['artist_name']
+            weights['artist'][artist] = weights['artist'].get(artist, 0) + 1
+            key = f"{artist}{_TRACK_SEPARATOR}{track['track_name']}"
+            weights['track'][key] = weights['track'].get(key, 0) + 1
+
+        hour = hour_bucket(snapshot.ts_epoch)
+        if self.head is None or hour > self.head:
+            self._advance(hour)
+        self._composed.clear()
+
+        scopes = (GLOBAL_SCOPE, scope_key(snapshot.city, snapshot.country))
+        targets = []
+        if hour < self.head:
+            # Arrivée tardive dans une heure close : les résumés qui la couvrent sont
+            # mis à jour directement, les agrégats de glissement seront refaits
+            for key in [key for key in self._panes if key[1] in scopes]:
+                del self._panes[key]
+            targets.append('all')
+            if day_bucket(hour) == day_bucket(self.head):
+                targets.append('day')
+            targets.extend(name for name, hours in self.maintained.items() if hour > self.head - hours * HOUR)
+
+        for scope in scopes:
+            if hour > self.head - self.horizon:
+                if scope in self.slices.setdefault(hour, {}):
+                    self._slice(hour, scope)
+                self._feed(self.slices[hour], scope, weights)
+                self._dirty.add(('slice', hour, scope))
+            for name in targets:
+                self._feed(self.sketches[name], scope, weights)
+                self._dirty.add(('window', name, scope))
+
+    def _feed(self, sketches: Dict[str, Dict[str, SpaceSaving]], scope: str, weights: Dict[str, Dict[str, int]]):
+        pair = sketches.get(scope)
+        if pair is None:
+            pair = sketches[scope] = {kind: SpaceSaving(self.capacity) for kind in KINDS}
+        for kind, items in weights.items():
+            pair[kind].update_many(items)
+
+    def _slice(self, hour: int, scope: str) -> Dict[str, SpaceSaving]:
+        pair = self.slices[hour][scope]
+        if isinstance(pair, str):
+            pair = self.slices[hour][scope] = self._load_pair(self._parts[pair])
+        return pair
+
+    def _load_pair(self, state: Dict) -> Dict[str, SpaceSaving]:
+        return {kind: SpaceSaving.from_state(self.capacity, sketch) for kind, sketch in state.items()}
+
+    def _advance(self, hour: int):
+        """Avance la tête à `hour` : la tranche de l'ancienne tête est close, les fenêtres glissent"""
+        previous, self.head = self.head, hour
+        if previous is not None:
+            same_day = day_bucket(hour) == day_bucket(previous)
+            if not same_day:
+                self._replace_window('day', {})
+            for scope in self.slices.get(previous, {}):
+                pair = self._slice(previous, scope)
+                for name in ('all', 'day') if same_day else ('all',):
+                    self.sketches[name][scope] = self._merge_pairs(self.sketches[name].get(scope), pair)
+                    self._dirty.add(('window', name, scope))
+
+        for bucket in [bucket for bucket in self.slices if bucket <= hour - self.horizon]:
+            for scope in self.slices.pop(bucket):
+                self._dirty.discard(('slice', bucket, scope))
+                self._dropped.add(('slice', bucket, scope))
+        if previous is not None:
+            for name in self.maintained:
+                self._replace_window(name, self._slide(name, hour))
+
+    def _replace_window(self, name: str, sketches: Dict[str, Dict[str, SpaceSaving]]):
+        for scope in self.sketches[name]:
+            if scope not in sketches:
+                self._dirty.discard(('window', name, scope))
+                self._dropped.add(('window', name, scope))
+        self.sketches[name] = sketches
+        self._dirty.update(('window', name, scope) for scope in sketches)
+
+    def _slide(self, name: str, hour: int) -> Dict[str, Dict[str, SpaceSaving]]:
+        """Heures closes de la fenêtre `name` quand la tête passe à `hour`, par périmètre"""
+        first, last = hour - (self.maintained[name] - 1) * HOUR, hour - HOUR
+        buckets = sorted(bucket for bucket in self.slices if first <= bucket <= last)
+        scopes = {scope for bucket in buckets for scope in self.slices[bucket]}
+        for key in [key for key in self._panes if key[0] == name and key[1] not in scopes]:
+            del self._panes[key]
+
+        window = {}
+        for scope in scopes:
+            panes = self._panes.get((name, scope))
+            if panes is not None:
+                # Heures closes depuis le dernier glissement ajoutées à la partie récente
+                for bucket in buckets:
+                    if bucket > panes.back_end and scope in self.slices[bucket]:
+                        panes.back = self._merge_pairs(panes.back, self._slice(bucket, scope))
+                panes.back_end = last
+                panes.front = [(bucket, pair) for bucket, pair in panes.front if bucket >= first]
+            if panes is None or not panes.front:
+                # Partie ancienne épuisée : suffixes recalculés sur toute la fenêtre
+                front, suffix = [], None
+                for bucket in reversed(buckets):
+                    if scope in self.slices[bucket]:
+                        suffix = self._merge_pairs(suffix, self._slice(bucket, scope))
+                        front.append((bucket, suffix))
+                front.reverse()
+                panes = self._panes[(name, scope)] = _Panes(front, last)
+            window[scope] = self._merge_pairs(panes.front[0][1], panes.back)
+        return window
+
+    def _merge_pairs(self, left: Optional[Dict[str, SpaceSaving]],
+                     right: Optional[Dict[str, SpaceSaving]]) -> Dict[str, SpaceSaving]:
+        """Fusion de deux paires (artistes, morceaux) en une nouvelle ; None = vide"""
+        pairs = [pair for pair in (left, right) if pair is not None]
+        return {kind: SpaceSaving.combine(self.capacity, (pair[kind] for pair in pairs)) for kind in KINDS}
+
+    def _compose(self, end_hour: int, hours: int, scope: Optional[str] = None) -> Dict[str, Dict[str, SpaceSaving]]:
+        """Fusion des tranches de (end_hour - hours, end_hour], pour un périmètre ou tous"""
+        grouped: Dict[str, Dict[str, List[SpaceSaving]]] = {}
+        for bucket, scopes in self.slices.items():
+            if not end_hour - hours * HOUR < bucket <= end_hour:
+                continue
+            for key in scopes:
+                if scope is not None and key != scope:
+                    continue
+                target = grouped.setdefault(key, {kind: [] for kind in KINDS})
+                for kind, sketch in self._slice(bucket, key).items():
+                    target[kind].append(sketch)
+        return {
+            key: {kind: SpaceSaving.combine(self.capacity, sketches) for kind, sketches in pair.items()}
+            for key, pair in grouped.items()
+        }
+
+    def _window_sketch(self, window: str, scope: str, kind: str, now_hour: int) -> Optional[SpaceSaving]:
+        if self.head is None:
+            return None
+        current = self.slices.get(self.head, {})
+        if window == 'hour' or self.windows.get(window) == 1:
+            # Heure en cours : sa tranche (vide si aucune donnée depuis)
+            return self._slice(self.head, scope)[kind] if now_hour <= self.head and scope in current else None
+        if window == 'day' and day_bucket(now_hour) > day_bucket(self.head):
+            return None
+
+        key = (window, scope, kind, now_hour)
+        if key not in self._composed:
+            if window in ('all', 'day') or (window in self.maintained and now_hour <= self.head):
+                # Heures closes + heure en cours
+                closed = self.sketches[window].get(scope)
+                sketches = [pair[kind] for pair in (closed, self._slice(self.head, scope) if scope in current else None)
+                            if pair is not None]
+                self._composed[key] = SpaceSaving.combine(self.capacity, sketches) if sketches else None
+            else:
+                # Pas de donnée depuis la fin de la fenêtre, ou fenêtre non configurée
+                hours = parse_windows(window)[window]
+                if hours * HOUR > self.horizon:
+                    raise ValueError(f"Fenêtre {window} plus longue que l'historique conservé "
+                                     f"({self.horizon // HOUR} h, voir ANALYTICS_WINDOWS)")
+                pair = self._compose(now_hour, hours, scope).get(scope)
+                self._composed[key] = pair[kind] if pair else None
+        return self._composed[key]
+
+    def top(self, kind: str = 'artist', limit: int = 10, city: Optional[str] = None,
+            country: Optional[str] = None, window: str = '24h', now: Optional[float] = None) -> Dict:
+        """
+        Top-K d'une fenêtre, au global ou pour une ville
+
+        Args:
+            kind: 'artist' ou 'track'
+            window: Fenêtre glissante ('1h', '24h', '7d'...), 'hour', 'day' ou 'all'
+
+        Returns:
+            total (apparitions de la fenêtre), max_error (borne de surestimation,
+            0 = comptes exacts) et items : name (ou artist + track), count, error
+        """
+        now_hour = hour_bucket(int(now if now is not None else time.time()))
+        sketch = self._window_sketch(window, scope_key(city, country), kind, now_hour) or SpaceSaving(self.capacity)
+        items = []
+        for item, count, error in sketch.top(limit):
+            entry = {'count': count, 'error': error}
+            if kind == 'track':
+                entry['artist'], entry['track'] = item.split(_TRACK_SEPARATOR, 1)
+            else:
+                entry['name'] = item
+            items.append(entry)
+        return {
+            'kind': kind,
+            'window': window,
+            'scope': scope_key(city, country),
+            'total': sketch.total,
+            'max_error': sketch.max_error(),
+            'items': items
+        }
+
+    def scopes(self) -> List[Tuple[str, str]]:
+        """Villes (ville, pays) vues par le moteur"""
+        scopes = set(self.sketches['all']) | set(self.slices.get(self.head, {}))
+        return sorted(tuple(scope.split('|', 1)) for scope in scopes if scope != GLOBAL_SCOPE)
+
+    def to_state(self, full: bool = False) -> Dict[str, Optional[Dict]]:
+        keys: Iterable[tuple] = self._dirty
+        if full:
+            keys = [('slice', bucket, scope) for bucket, scopes in self.slices.items() for scope in scopes]
+            keys += [('window', name, scope) for name, scopes in self.sketches.items() for scope in scopes]
+        parts: Dict[str, Optional[Dict]] = {}
+        for kind, key, scope in keys:
+            pair = self._slice(key, scope) if kind == 'slice' else self.sketches[key][scope]
+            parts[f'{kind}:{key}:{scope}'] = {name: sketch.to_state() for name, sketch in pair.items()}
+        if not full:
+            # Une partie supprimée puis recréée depuis l'appel précédent est réécrite
+            parts.update({f'{kind}:{key}:{scope}': None for kind, key, scope in self._dropped - self._dirty})
+        parts['meta'] = {'head': self.head}
+        self._dirty, self._dropped = set(), set()
+        return parts
+
+    def load_state(self, parts: Mapping[str, Dict]):
+        self.reset()
+        meta = parts.get('meta')
+        if meta is None or meta['head'] is None:
+            return
+        self.head = meta['head']
+        self._parts = parts
+        for part in parts:
+            if part == 'meta':
+                continue
+            kind, key, scope = part.split(':', 2)
+            if kind == 'slice':
+                if int(key) <= self.head - self.horizon:
+                    self._dropped.add((kind, int(key), scope))
+                    continue
+                self.slices.setdefault(int(key), {})[scope] = part
+            elif key in self.sketches:
+                self.sketches[key][scope] = self._load_pair(parts[part])
+            else:
+                # Fenêtre qui n'est plus configurée
+                self._dropped.add((kind, key, scope))
+        # Fenêtre configurée depuis la sauvegarde : heures closes recomposées depuis les tranches
+        for name, hours in self.maintained.items():
+            if not self.sketches[name] and self.slices:
+                self.sketches[name] = self._compose(self.head - HOUR, hours - 1)
@@ -0,0 +1,292 @@
+# src/analytics/hub.py
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Type
+
+from storage import Database
+from .snapshot import Snapshot
+
+# État des moteurs découpé en parties (une tranche horaire, une ville...) : une
+# écriture ne réécrit que les parties qu'elle a modifiées
+ANALYTICS_STATE_DDL = '''
+    CREATE TABLE IF NOT EXISTS analytics_state (
+        engine TEXT NOT NULL,
+        part TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        state BLOB NOT NULL,
+        PRIMARY KEY (engine, part)
+    ) WITHOUT ROWID
+'''
+
+# Colonne de rang de chaque table de faits
+_RANK_COLUMNS = {'trend_facts': 'rank', 'processed_track_facts': 'rank_position'}
+
+# Faits regroupés par relevé (un relevé = un snapshot d'une ville), dans l'ordre d'écriture
+_REPLAY_SQL = '''
+    SELECT f.city_id, f.observation_id, f.ts_epoch, c.city, c.country,
+           w.main, o.temperature, o.humidity,
+           t.name, a.name, f.{rank_column}, f.listeners, f.playcount, f.mood_category
+    FROM {facts_table} f
+    JOIN dim_city c ON c.id = f.city_id
+    JOIN dim_artist a ON a.id = f.artist_id
+    JOIN dim_track t ON t.id = f.track_id
+    LEFT JOIN weather_observations o ON o.id = f.observation_id
+    LEFT JOIN dim_weather w ON w.id = o.weather_id
+    WHERE f.ts_epoch IS NOT NULL
+    ORDER BY f.observation_id IS NULL, f.observation_id, f.ts_epoch, f.city_id
+'''
+
+
+class StreamingEngine:
+    """
+    Moteur d'analyse en flux : mis à jour snapshot par snapshot dans la transaction
+    qui écrit les faits, interrogé sans relire l'historique. Son état est un ensemble
+    de parties nommées, chacune sérialisable en JSON (une ligne d'analytics_state).
+    """
+
+    name = ''
+    version = 1
+
+    def reset(self):
+        """Remet l'état en mémoire à vide"""
+        raise NotImplementedError
+
+    def observe(self, cursor, snapshot: Snapshot):
+        """Intègre un snapshot (uniquement des lignes nouvellement insérées)"""
+        raise NotImplementedError
+
+    def to_state(self, full: bool = False) -> Dict[str, Optional[Dict]]:
+        """
+        Parties modifiées depuis l'appel précédent (toutes si `full`) ; une partie
+        à None est supprimée
+        """
+        raise NotImplementedError
+
+    def load_state(self, parts: Mapping[str, Dict]):
+        """
+        Charge un état commité. Chaque partie n'est décodée qu'à sa première lecture :
+        un moteur peut garder `parts` et ne lire ses parties volumineuses qu'au besoin
+        """
+        raise NotImplementedError
+
+    def create_tables(self, cursor):
+        """Crée les tables propres au moteur (aucune par défaut)"""
+
+    def clear_tables(self, cursor):
+        """Vide les tables propres au moteur avant une reconstruction (aucune par défaut)"""
+
+    def finish(self, cursor, force: bool = False):
+        """
+        Appelé une fois par lot de snapshots (et en fin de reconstruction), avant la
+        sauvegarde : travail regroupé sur ce que le lot a modifié (rien par défaut).
+        `force` (fin d'une série de chargements, `StreamingAnalytics.flush`) : plus
+        rien ne doit rester différé.
+        """
+
+
+def encode_state(state: Dict) -> bytes:
+    return zlib.compress(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_state(blob: bytes) -> Dict:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class StateParts(Mapping):
+    """Parties d'un état sauvegardé, décodées à la première lecture"""
+
+    def __init__(self, blobs: Dict[str, bytes]):
+        self._blobs = blobs
+        self._decoded: Dict[str, Dict] = {}
+
+    def __getitem__(self, part: str) -> Dict:
+        state = self._decoded.get(part)
+        if state is None:
+            state = self._decoded[part] = decode_state(self._blobs[part])
+        return state
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._blobs)
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+
+def replay_snapshots(conn: sqlite3.Connection, facts_table: str) -> Iterator[Snapshot]:
+    """
+    Rejoue une table de faits sous forme de snapshots (un par relevé météo) : sert à
+    initialiser les moteurs sur une base existante. Seul le détail encore conservé
+    par la rétention est rejoué.
+    """
+    sql = _REPLAY_SQL.format(facts_table=facts_table, rank_column=_RANK_COLUMNS[facts_table])
+    snapshot, current = None, None
+    for (city_id, observation_id, ts_epoch, city, country, weather_main, temperature, humidity,
+         track_name, artist_name, rank, listeners, playcount, mood) in conn.execute(sql):
+        key = (city_id, observation_id if observation_id is not None else ts_epoch)
+        if key != current:
+            if snapshot is not None:
+                yield snapshot
+            snapshot, current = Snapshot(city, country, ts_epoch, weather_main, temperature, humidity), key
+        snapshot.ts_epoch = min(snapshot.ts_epoch, ts_epoch)
+        snapshot.tracks.append({
+            'track_name': track_name,
+            'artist_name': artist_name,
+            'rank': rank or 0,
+            'listeners': listeners or 0,
+            'playcount': playcount or 0,
+            'mood_category': mood
+        })
+    if snapshot is not None:
+        yield snapshot
+
+
+class StreamingAnalytics:
+    """
+    Moteurs d'analyse en flux d'une base (collecteur ou ETL). Les écrivains appellent
+    `observe` dans la transaction qui insère les faits : l'état persisté des moteurs
+    suit exactement les faits commités. Après un rollback, `discard` recharge le
+    dernier état commité. Un moteur sans état sauvegardé (première exécution, version
+    changée) est reconstruit une fois en rejouant la table de faits.
+    """
+
+    def __init__(self, db: Database, facts_table: str, engines: List[StreamingEngine]):
+        """
+        Args:
+            db: Base des faits (l'état des moteurs est stocké dans sa table analytics_state)
+            facts_table: 'trend_facts' ou 'processed_track_facts' (rejouée à l'initialisation)
+            engines: Moteurs alimentés par cette base
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db = db
+        self.facts_table = facts_table
+        self.engines: Dict[str, StreamingEngine] = {engine.name: engine for engine in engines}
+
+        with self.db.write() as conn:
+            conn.execute(ANALYTICS_STATE_DDL)
+            cursor = conn.cursor()
+            for engine in self.engines.values():
+                engine.create_tables(cursor)
+        missing = self._load()
+        if missing:
+            self.rebuild(missing)
+
+    def get(self, name: str) -> Optional[StreamingEngine]:
+        return self.engines.get(name)
+
+    def observe(self, cursor, snapshots: Iterable[Snapshot]):
+        """
+        Intègre des snapshots fraîchement insérés et sauvegarde l'état des moteurs,
+        dans la transaction d'écriture de l'appelant
+        """
+        observed = False
+        for snapshot in snapshots:
+            if snapshot is None or not snapshot.tracks:
+                continue
+            for engine in self.engines.values():
+                engine.observe(cursor, snapshot)
+            observed = True
+        if observed:
+            for engine in self.engines.values():
+                engine.finish(cursor)
+            self.save(cursor)
+
+    def save(self, cursor, engines: Optional[Iterable[StreamingEngine]] = None, full: bool = False):
+        """Écrit les parties modifiées de l'état des moteurs (toutes si `full`)"""
+        upserts, deletes = [], []
+        for engine in (engines or self.engines.values()):
+            if full:
+                cursor.execute("DELETE FROM analytics_state WHERE engine = ?", (engine.name,))
+            for part, state in engine.to_state(full).items():
+                if state is None:
+                    deletes.append((engine.name, part))
+                else:
+                    upserts.append((engine.name, part, engine.version, encode_state(state)))
+        cursor.executemany("DELETE FROM analytics_state WHERE engine = ? AND part = ?", deletes)
+        cursor.executemany('''
+            INSERT INTO analytics_state (engine, part, version, updated_at, state)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)
+            ON CONFLICT (engine, part) DO UPDATE SET
+                version = excluded.version, updated_at = excluded.updated_at, state = excluded.state
+        ''', upserts)
+
+    def flush(self):
+        """
+        Fin d'une série de chargements (batch ETL) : chaque moteur termine le travail
+        qu'il avait différé, dans sa propre transaction
+        """
+        with self.db.write() as conn:
+            cursor = conn.cursor()
+            for engine in self.engines.values():
+                engine.finish(cursor, force=True)
+            self.save(cursor)
+
+    def discard(self):
+        """À appeler après un rollback : l'état en mémoire revient au dernier état commité"""
+        self._load()
+
+    def rebuild(self, engines: Optional[List[StreamingEngine]] = None):
+        """Reconstruit des moteurs (tous par défaut) en rejouant la table de faits"""
+        engines = engines or list(self.engines.values())
+        started = time.perf_counter()
+        count = 0
+        with self.db.write() as conn:
+            cursor = conn.cursor()
+            for engine in engines:
+                engine.reset()
+                engine.clear_tables(cursor)
+            for snapshot in replay_snapshots(conn, self.facts_table):
+                for engine in engines:
+                    engine.observe(cursor, snapshot)
+                count += 1
+            for engine in engines:
+                engine.finish(cursor)
+            self.save(cursor, engines, full=True)
+        self.logger.info(
+            f"🧮 Moteurs {', '.join(engine.name for engine in engines)} reconstruits depuis "
+            f"{self.facts_table}: {count} snapshots en {time.perf_counter() - started:.2f}s"
+        )
+
+    def _load(self) -> List[StreamingEngine]:
+        """Charge l'état commité de chaque moteur ; retourne ceux sans état utilisable"""
+        states: Dict[str, Dict[str, tuple]] = {}
+        with self.db.read() as conn:
+            for name, part, version, blob in conn.execute("SELECT engine, part, version, state FROM analytics_state"):
+                states.setdefault(name, {})[part] = (version, blob)
+        missing = []
+        for name, engine in self.engines.items():
+            engine.reset()
+            parts = states.get(name)
+            if parts and all(version == engine.version for version, _ in parts.values()):
+                engine.load_state(StateParts({part: blob for part, (_, blob) in parts.items()}))
+            else:
+                missing.append(engine)
+        return missing
+
+
+def read_engine(db: Database, engine_class: Type[StreamingEngine], **kwargs) -> Optional[StreamingEngine]:
+    """
+    Dernier état commité d'un moteur, pour les lecteurs (analyseur, visualiseur, API),
+    gardé en cache jusqu'à la prochaine écriture dans la base (à ne pas modifier)
+
+    Returns:
+        None si la base n'a pas (encore) d'état pour ce moteur
+    """
+    def compute():
+        with db.read() as conn:
+            try:
+                rows = conn.execute(
+                    "SELECT part, version, state FROM analytics_state WHERE engine = ?", (engine_class.name,)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                # Base antérieure aux moteurs d'analyse : pas de table analytics_state
+                return None
+        if not rows or any(version != engine_class.version for _, version, _ in rows):
+            return None
+        engine = engine_class(**kwargs)
+        engine.load_state(StateParts({part: blob for part, _, blob in rows}))
+        return engine
+    return db.cache.get_or_compute(('analytics', engine_class.name, tuple(sorted(kwargs.items()))), compute)
@@ -0,0 +1,229 @@
+# src/analytics/movers.py
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from storage import Database
+from .hub import StreamingEngine
+from .snapshot import Snapshot
+
+RANK_DELTAS_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS rank_deltas (
+        city_id INTEGER NOT NULL REFERENCES dim_city(id),
+        ts_epoch INTEGER NOT NULL,
+        track_id INTEGER NOT NULL REFERENCES dim_track(id),
+        prev_rank INTEGER,
+        rank INTEGER,
+        delta INTEGER,
+        velocity REAL,
+        PRIMARY KEY (city_id, ts_epoch, track_id)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_rank_deltas_ts ON rank_deltas(ts_epoch)"
+]
+
+# Mouvement → (filtre, tri) de la requête des plus forts mouvements
+DIRECTIONS = {
+    'up': ("d.delta > 0", "d.delta DESC, d.velocity DESC"),
+    'down': ("d.delta < 0", "d.delta ASC, d.velocity ASC"),
+    'new': ("d.prev_rank IS NULL", "d.rank ASC"),
+    'out': ("d.rank IS NULL", "d.prev_rank ASC")
+}
+
+_MAX_TRACK_IDS = 100000
+
+
+class RankMovements(StreamingEngine):
+    """
+    Évolution des classements de chaque ville d'un relevé au suivant : le relevé
+    précédent et le relevé courant sont gardés en mémoire (rang par morceau), si bien
+    qu'un nouveau relevé se compare en O(taille du classement). Seuls les changements
+    sont écrits dans rank_deltas : progression (delta > 0, places gagnées), recul,
+    entrée (prev_rank NULL) et sortie (rank NULL), avec la vitesse en places par heure.
+    Les points d'un même relevé écrits séparément (reprise point par point du
+    collecteur) complètent le relevé courant au lieu d'en ouvrir un nouveau.
+    Lecture : `biggest_movers`.
+    """
+
+    name = 'rank_movements'
+    version = 1
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # city_id → {'prev_ts', 'prev': {track_id: rang}, 'ts', 'cur': {track_id: rang}}
+        self.cities: Dict[int, Dict] = {}
+        self._city_ids: Dict[tuple, int] = {}
+        self._track_ids: Dict[tuple, int] = {}
+        self._dirty: set = set()
+
+    def create_tables(self, cursor):
+        for ddl in RANK_DELTAS_DDL:
+            cursor.execute(ddl)
+
+    def clear_tables(self, cursor):
+        cursor.execute("DELETE FROM rank_deltas")
+
+    def observe(self, cursor, snapshot: Snapshot):
+        city_id = self._city_id(cursor, snapshot.city, snapshot.country)
+        ranks = {}
+        for track in snapshot.tracks:
+            track_id = self._track_id(cursor, track['artist_name'], track['track_name'])
+            if track_id is not None:
+                ranks[track_id] = track['rank']
+        if city_id is None or not ranks:
+            return
+
+        state = self.cities.get(city_id)
+        if state is None:
+            # Premier relevé de la ville : référence des suivants, aucun mouvement
+            self.cities[city_id] = {'prev_ts': None, 'prev': {}, 'ts': snapshot.ts_epoch, 'cur': ranks}
+        elif snapshot.ts_epoch == state['ts']:
+            # Suite du relevé courant : seuls les morceaux pas encore vus comptent
+            added = {track_id: rank for track_id, rank in ranks.items() if track_id not in state['cur']}
+            state['cur'].update(added)
+            if state['prev_ts'] is not None and added:
+                cursor.execute(f'''
+                    DELETE FROM rank_deltas
+                    WHERE city_id = ? AND ts_epoch = ? AND rank IS NULL
+                      AND track_id IN ({', '.join('?' * len(added))})
+                ''', (city_id, state['ts'], *added))
+                self._write(cursor, city_id, state, added, exits=False)
+        elif snapshot.ts_epoch > state['ts']:
+            state.update(prev_ts=state['ts'], prev=state['cur'], ts=snapshot.ts_epoch, cur=ranks)
+            self._write(cursor, city_id, state, ranks, exits=True)
+        else:
+            # Relevé plus ancien que le courant (rattrapage) : pas de mouvement calculé
+            return
+        self._dirty.add(city_id)
+
+    def _write(self, cursor, city_id: int, state: Dict, ranks: Dict[int, int], exits: bool):
+        """Mouvements de `ranks` par rapport au relevé précédent (et sorties si `exits`)"""
+        hours = (state['ts'] - state['prev_ts']) / 3600 or None
+        prev = state['prev']
+        rows = []
+        for track_id, rank in ranks.items():
+            prev_rank = prev.get(track_id)
+            if prev_rank is None:
+                rows.append((city_id, state['ts'], track_id, None, rank, None, None))
+            elif prev_rank != rank:
+                delta = prev_rank - rank
+                rows.append((city_id, state['ts'], track_id, prev_rank, rank, delta,
+                             round(delta / hours, 3) if hours else None))
+        if exits:
+            rows.extend((city_id, state['ts'], track_id, prev_rank, None, None, None)
+                        for track_id, prev_rank in prev.items() if track_id not in ranks)
+        cursor.executemany('''
+            INSERT INTO rank_deltas (city_id, ts_epoch, track_id, prev_rank, rank, delta, velocity)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (city_id, ts_epoch, track_id) DO UPDATE SET
+                prev_rank = excluded.prev_rank, rank = excluded.rank,
+                delta = excluded.delta, velocity = excluded.velocity
+        ''', rows)
+
+    def _city_id(self, cursor, city: str, country: str) -> Optional[int]:
+        key = (city, country)
+        if key not in self._city_ids:
+            row = cursor.execute("SELECT id FROM dim_city WHERE city = ? AND country = ?", key).fetchone()
+            if row is None:
+                return None
+            self._city_ids[key] = row[0]
+        return self._city_ids[key]
+
+    def _track_id(self, cursor, artist: str, track: str) -> Optional[int]:
+        key = (artist, track)
+        track_id = self._track_ids.get(key)
+        if track_id is None:
+            row = cursor.execute('''
+                SELECT t.id FROM dim_track t JOIN dim_artist a ON a.id = t.artist_id
+                WHERE a.name = ? AND t.name = ?
+            ''', key).fetchone()
+            if row is None:
+                return None
+            if len(self._track_ids) >= _MAX_TRACK_IDS:
+                self._track_ids.clear()
+            track_id = self._track_ids[key] = row[0]
+        return track_id
+
+    def to_state(self, full: bool = False) -> Dict[str, Optional[Dict]]:
+        cities = self.cities if full else self._dirty
+        parts = {f'city:{city_id}': {
+            'prev_ts': self.cities[city_id]['prev_ts'],
+            'prev': list(self.cities[city_id]['prev'].items()),
+            'ts': self.cities[city_id]['ts'],
+            'cur': list(self.cities[city_id]['cur'].items())
+        } for city_id in cities}
+        self._dirty = set()
+        return parts
+
+    def load_state(self, parts):
+        self.reset()
+        for part in parts:
+            if part.startswith('city:'):
+                state = parts[part]
+                self.cities[int(part[len('city:'):])] = {
+                    'prev_ts': state['prev_ts'], 'prev': dict(state['prev']),
+                    'ts': state['ts'], 'cur': dict(state['cur'])
+                }
+
+
+def biggest_movers(db: Database, direction: str = 'up', limit: int = 10, city: Optional[str] = None,
+                   country: Optional[str] = None, since: Optional[int] = None) -> Optional[List[Dict]]:
+    """
+    Plus forts mouvements de classement, gardés en cache jusqu'à la prochaine écriture
+
+    Args:
+        direction: 'up' (progressions), 'down' (reculs), 'new' (entrées) ou 'out' (sorties)
+        limit: Nombre de mouvements
+        city, country: Restreint à une ville (ou un pays)
+        since: Mouvements depuis cet instant (secondes Unix) ; par défaut, ceux du
+            dernier relevé de chaque ville
+
+    Returns:
+        Mouvements (ville, artiste, morceau, rangs, delta, vitesse en places par heure,
+        instant) ; None si la base n'a pas de table rank_deltas
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Mouvement inconnu: {direction} (attendu: {', '.join(DIRECTIONS)})")
+    condition, order = DIRECTIONS[direction]
+    clauses, params = [condition], []
+    if since is None:
+        # Parcours des villes puis de leur dernier relevé (clé primaire) : la table
+        # n'est pas lue en entier
+        source = '''dim_city c CROSS JOIN rank_deltas d ON d.city_id = c.id
+            AND d.ts_epoch = (SELECT MAX(ts_epoch) FROM rank_deltas WHERE city_id = c.id)'''
+    else:
+        source = "rank_deltas d JOIN dim_city c ON c.id = d.city_id"
+        clauses.append("d.ts_epoch >= ?")
+        params.append(since)
+    if city is not None:
+        clauses.append("c.city = ?")
+        params.append(city)
+    if country is not None:
+        clauses.append("c.country = ?")
+        params.append(country)
+    sql = f'''
+        SELECT c.city, c.country, a.name, t.name, d.prev_rank, d.rank, d.delta, d.velocity, d.ts_epoch
+        FROM {source}
+        JOIN dim_track t ON t.id = d.track_id
+        JOIN dim_artist a ON a.id = t.artist_id
+        WHERE {' AND '.join(clauses)}
+        ORDER BY {order}, d.ts_epoch DESC
+        LIMIT ?
+    '''
+
+    def compute():
+        with db.read() as conn:
+            try:
+                rows = conn.execute(sql, (*params, limit)).fetchall()
+            except sqlite3.OperationalError:
+                # Base antérieure au suivi des classements
+                return None
+        return [{
+            'city': row_city, 'country': row_country, 'artist': artist, 'track': track,
+            'prev_rank': prev_rank, 'rank': rank, 'delta': delta, 'velocity': velocity,
+            'at': datetime.fromtimestamp(ts_epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        } for row_city, row_country, artist, track, prev_rank, rank, delta, velocity, ts_epoch in rows]
+    return db.cache.get_or_compute(('movers', direction, limit, city, country, since), compute)
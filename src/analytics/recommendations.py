@@ -0,0 +1,369 @@
+# src/analytics/recommendations.py
+import math
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from storage import Database
+from .audio_index import AudioFeatureIndex, denormalize
+from .hub import StreamingEngine
+from .snapshot import Snapshot
+
+# Largeur des tranches de température (°C) et d'humidité (%) des buckets météo
+TEMPERATURE_BAND = 5
+HUMIDITY_BAND = 20
+# Morceaux gardés par bucket dans la liste précalculée
+RECOMMENDATION_DEPTH = 50
+# Bucket des scores toutes météos confondues (référence de la surreprésentation)
+GLOBAL_BUCKET = '*'
+
+RECOMMENDATION_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS weather_bucket_stats (
+        bucket TEXT PRIMARY KEY,
+        mass REAL NOT NULL,
+        appearances INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS weather_track_scores (
+        bucket TEXT NOT NULL,
+        track_id INTEGER NOT NULL REFERENCES dim_track(id),
+        score REAL NOT NULL,
+        appearances INTEGER NOT NULL,
+        PRIMARY KEY (bucket, track_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS weather_recommendations (
+        bucket TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        track_id INTEGER NOT NULL REFERENCES dim_track(id),
+        score REAL NOT NULL,
+        PRIMARY KEY (bucket, position)
+    ) WITHOUT ROWID
+    '''
+]
+
+_MAX_TRACK_IDS = 100000
+
+
+def weather_buckets(weather_main: Optional[str], temperature: Optional[float],
+                    humidity: Optional[float]) -> List[str]:
+    """
+    Buckets d'un relevé, du plus précis au plus large : météo × tranche de température
+    × tranche d'humidité, météo × tranche de température, météo seule
+    (ex. ['Rain|10|80', 'Rain|10', 'Rain'] pour de la pluie à 12 °C et 85 %)
+    """
+    if not weather_main:
+        return []
+    if temperature is None:
+        return [weather_main]
+    temperature_band = int(math.floor(temperature / TEMPERATURE_BAND) * TEMPERATURE_BAND)
+    buckets = [f'{weather_main}|{temperature_band}', weather_main]
+    if humidity is not None:
+        humidity_band = min(int(humidity // HUMIDITY_BAND) * HUMIDITY_BAND, 100 - HUMIDITY_BAND)
+        buckets.insert(0, f'{weather_main}|{temperature_band}|{humidity_band}')
+    return buckets
+
+
+def describe_bucket(bucket: str) -> Dict:
+    """Clé de bucket → météo et tranches [min, max) de température et d'humidité"""
+    parts = bucket.split('|')
+    description = {'condition': parts[0], 'temperature': None, 'humidity': None}
+    if len(parts) > 1:
+        description['temperature'] = [int(parts[1]), int(parts[1]) + TEMPERATURE_BAND]
+    if len(parts) > 2:
+        description['humidity'] = [int(parts[2]), int(parts[2]) + HUMIDITY_BAND]
+    return description
+
+
+class WeatherRecommendations(StreamingEngine):
+    """
+    Morceaux qui se classent sous une météo donnée. Chaque relevé ajoute à ses trois
+    buckets (météo × température × humidité, météo × température, météo) et au bucket
+    global le score de chacun de ses morceaux, 1 / log2(rang + 1) (un premier rang
+    compte plus qu'un cinquantième). À la fin de chaque chargement, la liste des
+    buckets touchés est recalculée : les morceaux classés par part du score du bucket
+    multipliée par la racine de leur surreprésentation par rapport au global (un tube
+    présent par tous les temps ne monopolise pas chaque liste). Une liste est
+    recalculée au plus une fois toutes les `refresh_seconds` : une rafale de
+    chargements ne la recalcule pas à chaque fichier. Une recommandation lit une
+    liste précalculée, jamais l'historique. Lecture : `recommendation_lists`,
+    `recommend` et `recommend_for_city`.
+    """
+
+    name = 'weather_recommendations'
+    # v2 : weather_track_scores sans last_seen
+    version = 2
+
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else \
+            float(os.getenv('RECOMMENDATION_REFRESH_SECONDS', 30))
+        self.reset()
+
+    def reset(self):
+        self._track_ids: Dict[tuple, int] = {}
+        # Buckets touchés dont la liste reste à recalculer (ordre d'arrivée)
+        self._pending: Dict[str, None] = {}
+        # bucket → instant (monotonic) du dernier recalcul de sa liste
+        self._refreshed: Dict[str, float] = {}
+        # Dernier bucket recalculé à tour de rôle (ordre des clés) : la référence globale
+        # bouge à chaque chargement, les listes non touchées sont revues une par lot
+        self._rotation = ''
+        self._observed = False
+        self._refresh_all = False
+
+    def create_tables(self, cursor):
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(weather_track_scores)")]
+        if 'last_seen' in columns:
+            # Table de la v1 : recréée, puis remplie par la reconstruction (version changée)
+            cursor.execute("DROP TABLE weather_track_scores")
+        for ddl in RECOMMENDATION_DDL:
+            cursor.execute(ddl)
+
+    def clear_tables(self, cursor):
+        for table in ('weather_bucket_stats', 'weather_track_scores', 'weather_recommendations'):
+            cursor.execute(f"DELETE FROM {table}")
+        # Reconstruction : toutes les listes sont recalculées à la fin du rejeu
+        self._refresh_all = True
+
+    def observe(self, cursor, snapshot: Snapshot):
+        buckets = weather_buckets(snapshot.weather_main, snapshot.temperature, snapshot.humidity)
+        if not buckets:
+            return
+        # Scores additifs par ligne : un relevé chargé en plusieurs fois compte comme
+        # rejoué d'un bloc par une reconstruction
+        scores: Dict[int, List[float]] = {}
+        for track in snapshot.tracks:
+            track_id = self._track_id(cursor, track['artist_name'], track['track_name'])
+            if track_id is not None:
+                scores.setdefault(track_id, []).append(1 / math.log2(max(track['rank'] or 1, 1) + 1))
+        if not scores:
+            return
+
+        buckets.append(GLOBAL_BUCKET)
+        cursor.executemany('''
+            INSERT INTO weather_track_scores (bucket, track_id, score, appearances)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (bucket, track_id) DO UPDATE SET
+                score = score + excluded.score, appearances = appearances + excluded.appearances
+        ''', [(bucket, track_id, sum(values), len(values))
+              for bucket in buckets for track_id, values in scores.items()])
+        mass = sum(sum(values) for values in scores.values())
+        appearances = sum(len(values) for values in scores.values())
+        cursor.executemany('''
+            INSERT INTO weather_bucket_stats (bucket, mass, appearances) VALUES (?, ?, ?)
+            ON CONFLICT (bucket) DO UPDATE SET
+                mass = mass + excluded.mass, appearances = appearances + excluded.appearances
+        ''', [(bucket, mass, appearances) for bucket in buckets])
+        self._pending.update(dict.fromkeys(buckets[:-1]))
+        self._observed = True
+
+    def finish(self, cursor, force: bool = False):
+        """
+        Recalcule les listes en attente qui n'ont pas été recalculées depuis
+        `refresh_seconds`, plus un bucket à tour de rôle (toutes après une reconstruction).
+        `force` (fin du batch ETL) recalcule toutes les listes en attente.
+        """
+        now = time.monotonic()
+        if self._refresh_all:
+            buckets = [row[0] for row in cursor.execute(
+                "SELECT bucket FROM weather_bucket_stats WHERE bucket != ?", (GLOBAL_BUCKET,))]
+            self._refresh_all = False
+        elif force:
+            buckets = list(self._pending)
+        elif self._observed:
+            row = cursor.execute(
+                "SELECT bucket FROM weather_bucket_stats WHERE bucket > ? AND bucket != ? ORDER BY bucket LIMIT 1",
+                (self._rotation, GLOBAL_BUCKET)
+            ).fetchone()
+            # Fin des clés atteinte : le tour suivant repart du début
+            self._rotation = row[0] if row else ''
+            buckets = [bucket for bucket in (*self._pending, *([row[0]] if row else []))
+                       if now - self._refreshed.get(bucket, -math.inf) >= self.refresh_seconds]
+        else:
+            return
+        self._observed = False
+        if not buckets:
+            return
+
+        total = cursor.execute(
+            "SELECT mass FROM weather_bucket_stats WHERE bucket = ?", (GLOBAL_BUCKET,)
+        ).fetchone()[0]
+        for bucket in dict.fromkeys(buckets):
+            self._pending.pop(bucket, None)
+            self._refreshed[bucket] = now
+            mass = cursor.execute(
+                "SELECT mass FROM weather_bucket_stats WHERE bucket = ?", (bucket,)
+            ).fetchone()[0]
+            # Score ∝ s^1,5 / g^0,5 à bucket fixé : le tri sur s³ / g est le même, fait par SQLite
+            rows = cursor.execute('''
+                SELECT s.track_id, s.score, g.score
+                FROM weather_track_scores s
+                JOIN weather_track_scores g ON g.bucket = ? AND g.track_id = s.track_id
+                WHERE s.bucket = ?
+                ORDER BY s.score * s.score * s.score / g.score DESC, s.track_id
+                LIMIT ?
+            ''', (GLOBAL_BUCKET, bucket, RECOMMENDATION_DEPTH)).fetchall()
+            cursor.execute("DELETE FROM weather_recommendations WHERE bucket = ?", (bucket,))
+            cursor.executemany('''
+                INSERT INTO weather_recommendations (bucket, position, track_id, score) VALUES (?, ?, ?, ?)
+            ''', [(bucket, position, track_id,
+                   round(bucket_score / mass * math.sqrt(bucket_score / mass / (global_score / total)), 6))
+                  for position, (track_id, bucket_score, global_score) in enumerate(rows, 1)])
+
+    def _track_id(self, cursor, artist: str, track: str) -> Optional[int]:
+        key = (artist, track)
+        track_id = self._track_ids.get(key)
+        if track_id is None:
+            row = cursor.execute('''
+                SELECT t.id FROM dim_track t JOIN dim_artist a ON a.id = t.artist_id
+                WHERE a.name = ? AND t.name = ?
+            ''', key).fetchone()
+            if row is None:
+                return None
+            if len(self._track_ids) >= _MAX_TRACK_IDS:
+                self._track_ids.clear()
+            track_id = self._track_ids[key] = row[0]
+        return track_id
+
+    def to_state(self, full: bool = False) -> Dict[str, Optional[Dict]]:
+        # Les scores sont dans les tables weather_* : l'état ne marque que le découpage
+        return {'meta': {'temperature_band': TEMPERATURE_BAND, 'humidity_band': HUMIDITY_BAND}} if full else {}
+
+    def load_state(self, parts):
+        # Après un rollback, les listes en attente (lots déjà commités) le restent
+        pending, refreshed, rotation = self._pending, self._refreshed, self._rotation
+        self.reset()
+        self._pending, self._refreshed, self._rotation = pending, refreshed, rotation
+
+
+def recommendation_lists(db: Database) -> Optional[Dict[str, Dict]]:
+    """
+    Listes précalculées de tous les buckets, gardées en cache jusqu'à la prochaine écriture
+
+    Returns:
+        bucket → {'appearances', 'tracks': [{'track', 'artist', 'score'}]} ; None si la
+        base n'a pas de recommandations
+    """
+    def compute():
+        with db.read() as conn:
+            try:
+                rows = conn.execute('''
+                    SELECT r.bucket, b.appearances, t.name, a.name, r.score
+                    FROM weather_recommendations r
+                    JOIN weather_bucket_stats b ON b.bucket = r.bucket
+                    JOIN dim_track t ON t.id = r.track_id
+                    JOIN dim_artist a ON a.id = t.artist_id
+                    ORDER BY r.bucket, r.position
+                ''').fetchall()
+            except sqlite3.OperationalError:
+                # Base antérieure aux recommandations météo
+                return None
+        lists: Dict[str, Dict] = {}
+        for bucket, appearances, track, artist, score in rows:
+            entry = lists.setdefault(bucket, {'appearances': appearances, 'tracks': []})
+            entry['tracks'].append({'track': track, 'artist': artist, 'score': score})
+        return lists
+    return db.cache.get_or_compute(('weather_recommendations',), compute)
+
+
+def latest_weather(db: Database) -> List[Dict]:
+    """Dernier relevé météo de chaque ville (recherche par l'index (city_id, observed_at))"""
+    def compute():
+        with db.read() as conn:
+            try:
+                rows = conn.execute('''
+                    SELECT c.city, c.country, w.main, o.temperature, o.humidity, o.observed_at
+                    FROM dim_city c
+                    JOIN weather_observations o ON o.city_id = c.id
+                        AND o.observed_at = (SELECT MAX(observed_at) FROM weather_observations WHERE city_id = c.id)
+                    LEFT JOIN dim_weather w ON w.id = o.weather_id
+                    ORDER BY c.city, c.country
+                ''').fetchall()
+            except sqlite3.OperationalError:
+                # Base sans relevés météo normalisés
+                return []
+        return [{'city': city, 'country': country, 'weather_main': weather_main, 'temperature': temperature,
+                 'humidity': humidity, 'observed_at': observed_at}
+                for city, country, weather_main, temperature, humidity, observed_at in rows]
+    return db.cache.get_or_compute(('latest_weather',), compute)
+
+
+def recommend(lists: Dict[str, Dict], weather_main: Optional[str], temperature: Optional[float] = None,
+              humidity: Optional[float] = None, k: int = 10,
+              audio_index: Optional[AudioFeatureIndex] = None,
+              min_appearances: Optional[int] = None) -> Optional[Dict]:
+    """
+    Morceaux recommandés pour un relevé météo, lus dans les listes précalculées
+
+    Le bucket retenu est le plus précis ayant au moins `min_appearances` morceaux
+    classés (RECOMMENDATION_MIN_APPEARANCES, 100), sinon le mieux fourni. Avec un index audio, le
+    score mêle le score météo (ramené au meilleur du bucket) et la proximité de
+    chaque morceau au profil audio du bucket (moyenne des morceaux de la liste
+    pondérée par leur score), avec le poids RECOMMENDATION_AUDIO_WEIGHT (0,3).
+
+    Returns:
+        bucket retenu, morceaux classés, profil audio et morceaux (track, artist, score,
+        weather_score, audio_similarity) ; None si aucun bucket ne correspond
+    """
+    min_appearances = min_appearances or int(os.getenv('RECOMMENDATION_MIN_APPEARANCES', 100))
+    candidates = [bucket for bucket in weather_buckets(weather_main, temperature, humidity) if bucket in lists]
+    if not candidates:
+        return None
+    bucket = next((bucket for bucket in candidates if lists[bucket]['appearances'] >= min_appearances),
+                  max(candidates, key=lambda candidate: lists[candidate]['appearances']))
+    tracks = lists[bucket]['tracks']
+
+    weather_scores = np.array([track['score'] for track in tracks])
+    blended = weather_scores / weather_scores.max()
+    similarity, profile = None, None
+    if audio_index is not None:
+        vectors, found = audio_index.vectors([(track['track'], track['artist']) for track in tracks])
+        if found.any():
+            weight = float(os.getenv('RECOMMENDATION_AUDIO_WEIGHT', 0.3))
+            center = np.average(vectors[found], axis=0, weights=weather_scores[found])
+            # Distance rapportée à la diagonale du cube [0, 1]^d : proximité entre 0 et 1
+            distances = np.sqrt(np.square(vectors - center).sum(axis=1)) / math.sqrt(vectors.shape[1])
+            similarity = np.where(found, 1 - distances, np.nan)
+            # Morceau non enrichi : proximité moyenne, ni favorisé ni pénalisé
+            blended = (1 - weight) * blended + weight * np.where(found, similarity, np.nanmean(similarity))
+            profile = denormalize(center)
+
+    order = np.argsort(-blended, kind='stable')[:k]
+    return {
+        'bucket': describe_bucket(bucket),
+        'appearances': lists[bucket]['appearances'],
+        'profile': profile,
+        'tracks': [{
+            'track': tracks[i]['track'],
+            'artist': tracks[i]['artist'],
+            'score': round(float(blended[i]), 3),
+            'weather_score': tracks[i]['score'],
+            'audio_similarity': None if similarity is None or np.isnan(similarity[i])
+            else round(float(similarity[i]), 3)
+        } for i in order]
+    }
+
+
+def recommend_for_city(db: Database, city: str, country: Optional[str] = None, k: int = 10,
+                       audio_index: Optional[AudioFeatureIndex] = None) -> Optional[Dict]:
+    """
+    Recommandations pour la météo du dernier relevé d'une ville
+
+    Returns:
+        Comme `recommend`, avec le relevé utilisé (`weather`) ; None si la ville n'a
+        pas de relevé ou si la base n'a pas de recommandations
+    """
+    lists = recommendation_lists(db)
+    weather = next((observation for observation in latest_weather(db)
+                    if observation['city'] == city and (country is None or observation['country'] == country)),
+                   None)
+    if lists is None or weather is None:
+        return None
+    result = recommend(lists, weather['weather_main'], weather['temperature'], weather['humidity'], k, audio_index)
+    return result and {'weather': weather, **result}
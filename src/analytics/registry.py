@@ -0,0 +1,24 @@
+# src/analytics/registry.py
+from storage import Database
+from .correlation import WeatherMoodStats
+from .distinct import DistinctCounts
+from .heavy_hitters import HeavyHitters
+from .hub import StreamingAnalytics
+from .movers import RankMovements
+from .quantiles import PopularityPercentiles
+from .recommendations import WeatherRecommendations
+
+
+def trend_analytics(db: Database) -> StreamingAnalytics:
+    """Moteurs alimentés par le collecteur (trend_facts)"""
+    return StreamingAnalytics(db, 'trend_facts', [
+        WeatherMoodStats(), HeavyHitters(), DistinctCounts(), RankMovements()
+    ])
+
+
+def processed_analytics(db: Database) -> StreamingAnalytics:
+    """Moteurs alimentés par l'ETL (processed_track_facts)"""
+    return StreamingAnalytics(db, 'processed_track_facts', [
+        WeatherMoodStats(), HeavyHitters(), DistinctCounts(), RankMovements(), PopularityPercentiles(),
+        WeatherRecommendations()
+    ])
@@ -0,0 +1,66 @@
+# src/analytics/snapshot.py
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from storage import epoch_seconds, utc_timestamp
+
+
+@dataclass
+class Snapshot:
+    """
+    Un classement observé : les morceaux d'une ville à un instant donné, avec le
+    relevé météo qu'ils partagent. C'est l'unité reçue par les moteurs d'analyse.
+    """
+    city: str
+    country: str
+    ts_epoch: int
+    weather_main: Optional[str] = None
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    # Un dict par morceau : track_name, artist_name, rank, listeners, playcount, mood_category
+    tracks: List[Dict] = field(default_factory=list)
+
+
+def snapshots_from_points(points: Iterable[Dict]) -> List[Snapshot]:
+    """Points du collecteur (format de collect_city_data) regroupés par (ville, timestamp)"""
+    snapshots: Dict[tuple, Snapshot] = {}
+    for data in points:
+        timestamp = data.get('timestamp') or utc_timestamp()
+        key = (data['city'], data['country'], timestamp)
+        snapshot = snapshots.get(key)
+        if snapshot is None:
+            snapshot = snapshots[key] = Snapshot(
+                data['city'], data['country'], epoch_seconds(timestamp),
+                data.get('weather_main'), data.get('temperature'), data.get('humidity')
+            )
+        snapshot.tracks.append({
+            'track_name': data['track_name'],
+            'artist_name': data['artist_name'],
+            'rank': data.get('rank', 0),
+            'listeners': data.get('listeners', 0),
+            'playcount': data.get('playcount', 0),
+            'mood_category': data.get('mood_category')
+        })
+    return list(snapshots.values())
+
+
+def snapshot_from_records(records: List[Dict], observation: Optional[Dict] = None) -> Optional[Snapshot]:
+    """Enregistrements transformés d'un fichier brut (un snapshot) et leur relevé météo"""
+    if not records:
+        return None
+    observation = observation or {}
+    first = records[0]
+    # Même instant que les faits (processed_at) : les agrégats et les moteurs concordent
+    ts_epoch = min(epoch_seconds(record.get('processed_at') or utc_timestamp()) for record in records)
+    return Snapshot(
+        first['city'], first['country'], ts_epoch,
+        observation.get('main'), observation.get('temperature'), observation.get('humidity'),
+        [{
+            'track_name': record['track_name'],
+            'artist_name': record['artist_name'],
+            'rank': record.get('rank_position', 0),
+            'listeners': record.get('listeners', 0),
+            'playcount': record.get('playcount', 0),
+            'mood_category': record.get('mood_category')
+        } for record in records]
+    )
@@ -0,0 +1,139 @@
+# src/analyzer_queries.py
+import logging
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from storage import get_database
+from storage.rollups import SECONDS_PER_DAY
+
+
+class AnalyzerQueries:
+    """
+    Couche de requêtes des analyses : les regroupements sont faits par SQLite
+    (dans les agrégats horaires et journaliers quand c'est possible), seules les
+    colonnes utiles sont lues, et les lignes détaillées sont lues par morceaux.
+    La mémoire consommée est celle du résultat, pas celle de la table.
+
+    Les résultats agrégés passent par le cache de requêtes de la base : tant
+    qu'aucune écriture n'a eu lieu, un appel identique ne relit rien.
+    """
+
+    # Agrégats horaires + journaliers (repliés par la rétention) depuis un instant ;
+    # pour les jours repliés, la borne est arrondie au jour
+    _WEATHER_MOOD_ROLLUPS = '''
+        SELECT city_id, weather_id, mood_category, track_count, temperature_sum, temperature_count
+        FROM rollup_weather_mood_hourly WHERE hour_epoch >= :since
+        UNION ALL
+        SELECT city_id, weather_id, mood_category, track_count, temperature_sum, temperature_count
+        FROM rollup_weather_mood_daily WHERE day_bucket >= :since_day
+    '''
+
+    _ARTIST_ROLLUPS = '''
+        SELECT city_id, artist_id, appearances, listeners_sum
+        FROM rollup_artist_hourly WHERE hour_epoch >= :since
+        UNION ALL
+        SELECT city_id, artist_id, appearances, listeners_sum
+        FROM rollup_artist_daily WHERE day_bucket >= :since_day
+    '''
+
+    def __init__(self, db_path: str = '/data/lastfm_weather.db'):
+        self.logger = logging.getLogger(__name__)
+        self.db = get_database(db_path)
+
+    def weather_mood_counts(self, since: Optional[int] = None) -> pd.DataFrame:
+        """Nombre de tracks par (météo, humeur) : colonnes weather_main, mood_category, count"""
+        return self._query(f'''
+            SELECT w.main AS weather_main, r.mood_category, SUM(r.track_count) AS count
+            FROM ({self._WEATHER_MOOD_ROLLUPS}) r
+            JOIN dim_weather w ON w.id = r.weather_id
+            GROUP BY w.main, r.mood_category
+        ''', since)
+
+    def mood_distribution(self, since: Optional[int] = None) -> pd.Series:
+        """Nombre de tracks par humeur (météo inconnue comprise), du plus fréquent au moins fréquent"""
+        df = self._query(f'''
+            SELECT r.mood_category, SUM(r.track_count) AS count
+            FROM ({self._WEATHER_MOOD_ROLLUPS}) r
+            WHERE r.mood_category != ''
+            GROUP BY r.mood_category
+            ORDER BY count DESC
+        ''', since)
+        return df.set_index('mood_category')['count']
+
+    def top_artists(self, since: Optional[int] = None, limit: int = 5) -> pd.DataFrame:
+        """Artistes les plus présents : colonnes artist_name, count"""
+        return self._query(f'''
+            SELECT a.name AS artist_name, x.count
+            FROM (
+                SELECT artist_id, SUM(appearances) AS count
+                FROM ({self._ARTIST_ROLLUPS})
+                GROUP BY artist_id
+                ORDER BY count DESC
+                LIMIT :limit
+            ) x
+            JOIN dim_artist a ON a.id = x.artist_id
+            ORDER BY x.count DESC
+        ''', since, limit=limit)
+
+    def city_activity(self, since: Optional[int] = None, limit: int = 10) -> pd.Series:
+        """Nombre de tracks par ville, villes les plus actives d'abord"""
+        df = self._query(f'''
+            SELECT c.city, x.count
+            FROM (
+                SELECT city_id, SUM(track_count) AS count
+                FROM ({self._WEATHER_MOOD_ROLLUPS})
+                GROUP BY city_id
+                ORDER BY count DESC
+                LIMIT :limit
+            ) x
+            JOIN dim_city c ON c.id = x.city_id
+            ORDER BY x.count DESC
+        ''', since, limit=limit)
+        return df.set_index('city')['count']
+
+    def temperature_by_mood(self, since: Optional[int] = None) -> pd.DataFrame:
+        """
+        Distribution des températures par humeur, regroupée par valeur distincte :
+        colonnes mood_category, temperature, count. Lue dans le détail (fenêtre de
+        rétention), la taille du résultat dépend du nombre de températures distinctes.
+        """
+        return self._query('''
+            SELECT f.mood_category, o.temperature, COUNT(*) AS count
+            FROM trend_facts f
+            JOIN weather_observations o ON o.id = f.observation_id
+            WHERE f.ts_epoch >= :since AND o.temperature IS NOT NULL AND f.mood_category IS NOT NULL
+            GROUP BY f.mood_category, o.temperature
+        ''', since)
+
+    def iter_rows(self, columns: List[str], since: Optional[int] = None,
+                  chunksize: int = 50000) -> Iterator[pd.DataFrame]:
+        """
+        Lignes détaillées de city_music_trends, par morceaux de `chunksize` lignes,
+        limitées aux colonnes demandées
+
+        Raises:
+            ValueError: Si une colonne n'existe pas dans la vue
+        """
+        with self.db.read() as conn:
+            known = {row[1] for row in conn.execute("PRAGMA table_info(city_music_trends)")}
+            unknown = [column for column in columns if column not in known]
+            if unknown:
+                raise ValueError(f"Colonnes inconnues dans city_music_trends: {unknown}")
+
+            query = f'''
+                SELECT {', '.join(columns)} FROM city_music_trends
+                WHERE id IN (SELECT id FROM trend_facts WHERE ts_epoch >= ?)
+            '''
+            for chunk in pd.read_sql_query(query, conn, params=(since or 0,), chunksize=chunksize):
+                yield chunk
+
+    def _query(self, sql: str, since: Optional[int], **params) -> pd.DataFrame:
+        """Résultat mis en cache jusqu'à la prochaine écriture dans la base (à ne pas modifier)"""
+        since = since or 0
+        params.update(since=since, since_day=since // SECONDS_PER_DAY)
+
+        def compute():
+            with self.db.read() as conn:
+                return pd.read_sql_query(sql, conn, params=params)
+        return self.db.cache.get_or_compute(('frame', sql, tuple(sorted(params.items()))), compute)
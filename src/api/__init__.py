@@ -0,0 +1,5 @@
+# src/api/__init__.py
+from .views import InsightViews, MaterializedView
+from .app import create_app
+
+__all__ = ['InsightViews', 'MaterializedView', 'create_app']
@@ -0,0 +1,175 @@
+# src/api/app.py
+import json
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response
+
+from analytics import recommend
+from metrics import REGISTRY, CONTENT_TYPE
+
+from .views import InsightViews, MaterializedView
+
+MAX_PAGE_SIZE = 500
+MAX_NEIGHBOURS = 100
+
+
+def create_app(views: Optional[InsightViews] = None) -> FastAPI:
+    """
+    Application FastAPI des insights. Les réponses sont servies depuis les vues
+    matérialisées (`InsightViews`) : aucune requête HTTP ne lit SQLite. Chaque
+    réponse porte un ETag ; un client qui renvoie If-None-Match reçoit un 304
+    tant que la vue n'a pas changé. Les recherches de morceaux proches lisent la
+    projection en mémoire de l'index audio, les recommandations météo une vue des
+    listes précalculées.
+    """
+    views = views or InsightViews()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        views.start()
+        yield
+        views.stop()
+
+    app = FastAPI(title='Music Weather Insights', lifespan=lifespan)
+    app.state.views = views
+
+    @app.get('/insights/weather-mood')
+    def weather_mood(request: Request):
+        """Répartition des humeurs par type de météo et humeur dominante"""
+        return _whole(request, _view(views, 'weather-mood'))
+
+    @app.get('/insights/top-artists')
+    def top_artists(request: Request, limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                    offset: int = Query(0, ge=0)):
+        """Classement des artistes par nombre d'apparitions (paginé)"""
+        return _paged(request, _view(views, 'top-artists'), offset, limit)
+
+    @app.get('/insights/cities')
+    def cities(request: Request, limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+               offset: int = Query(0, ge=0)):
+        """Activité par ville en nombre de tracks (paginé)"""
+        return _paged(request, _view(views, 'cities'), offset, limit)
+
+    @app.get('/insights/heavy-hitters')
+    def heavy_hitters(request: Request):
+        """Top artistes et morceaux (global et par ville) avec leur borne d'erreur"""
+        return _whole(request, _view(views, 'heavy-hitters'))
+
+    @app.get('/insights/distinct')
+    def distinct(request: Request):
+        """Morceaux et artistes distincts (global, par jour, par ville) estimés par HyperLogLog"""
+        return _whole(request, _view(views, 'distinct-counts'))
+
+    @app.get('/insights/movers')
+    def movers(request: Request):
+        """Plus forts mouvements de classement (progressions, reculs, entrées, sorties)"""
+        return _whole(request, _view(views, 'movers'))
+
+    @app.get('/tracks/similar')
+    def similar_tracks(track: str, artist: str, k: int = Query(10, ge=1, le=MAX_NEIGHBOURS)):
+        """Morceaux aux caractéristiques audio les plus proches d'un morceau enrichi"""
+        neighbours = views.audio_index.similar_to(track, artist, k)
+        if neighbours is None:
+            raise HTTPException(status_code=404, detail=f"Morceau absent de l'index audio: {track} - {artist}")
+        return {'track': track, 'artist': artist, 'neighbours': neighbours}
+
+    @app.get('/tracks/by-features')
+    def tracks_by_features(request: Request, k: int = Query(10, ge=1, le=MAX_NEIGHBOURS)):
+        """
+        Morceaux les plus proches d'un profil audio passé en paramètres
+        (ex. ?valence=0.8&energy=0.7&tempo=120)
+        """
+        profile: Dict[str, float] = {}
+        for name, value in request.query_params.items():
+            if name == 'k':
+                continue
+            try:
+                profile[name] = float(value)
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"Valeur non numérique pour {name}: {value}")
+        try:
+            return {'profile': profile, 'neighbours': views.audio_index.matching(profile, k)}
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    @app.get('/recommendations/weather')
+    def weather_recommendations(city: Optional[str] = None, country: Optional[str] = None,
+                                condition: Optional[str] = None, temperature: Optional[float] = None,
+                                humidity: Optional[float] = None,
+                                k: int = Query(10, ge=1, le=MAX_NEIGHBOURS)):
+        """
+        Morceaux qui se classent sous une météo : celle du dernier relevé d'une ville
+        (?city=Paris) ou un relevé donné (?condition=Rain&temperature=12&humidity=85)
+        """
+        data = _view(views, 'weather-recommendations').data
+        weather = None
+        if city is not None:
+            weather = next((observation for observation in data['weather'] if observation['city'] == city
+                            and (country is None or observation['country'] == country)), None)
+            if weather is None:
+                raise HTTPException(status_code=404, detail=f"Aucun relevé météo pour {city}")
+            condition, temperature, humidity = weather['weather_main'], weather['temperature'], weather['humidity']
+        elif condition is None:
+            raise HTTPException(status_code=422, detail="Paramètre city ou condition requis")
+        result = recommend(data['buckets'], condition, temperature, humidity, k, views.audio_index)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"Aucun historique pour la météo {condition}")
+        return {'weather': weather, **result}
+
+    @app.get('/health/etl')
+    def health_etl(request: Request):
+        return _whole(request, _view(views, 'etl-health'))
+
+    @app.get('/health/ingestion')
+    def health_ingestion(request: Request):
+        return _whole(request, _view(views, 'ingestion-health'))
+
+    @app.get('/metrics')
+    def metrics():
+        """Métriques du processus au format texte Prometheus"""
+        return Response(content=REGISTRY.exposition(), media_type=CONTENT_TYPE)
+
+    @app.get('/views')
+    def views_status():
+        """ETag et date de dernier calcul de chaque vue"""
+        return views.status()
+
+    return app
+
+
+def _view(views: InsightViews, name: str) -> MaterializedView:
+    view = views.get(name)
+    if view is None:
+        raise HTTPException(status_code=503, detail=f"Vue '{name}' pas encore calculée")
+    if view.error is not None:
+        raise HTTPException(status_code=503, detail=view.error)
+    return view
+
+
+def _whole(request: Request, view: MaterializedView) -> Response:
+    return _conditional(request, view.etag, lambda: view.body)
+
+
+def _paged(request: Request, view: MaterializedView, offset: int, limit: int) -> Response:
+    # Une page est une représentation distincte : son ETag dépend aussi de la tranche
+    etag = f"{view.etag}-{offset}-{limit}"
+    return _conditional(
+        request, etag,
+        lambda: json.dumps(view.page(offset, limit), ensure_ascii=False, default=str).encode('utf-8')
+    )
+
+
+def _conditional(request: Request, etag: str, body) -> Response:
+    """304 si If-None-Match contient l'ETag courant, sinon le corps (construit à la demande)"""
+    tag = f'"{etag}"'
+    headers = {'ETag': tag, 'Cache-Control': 'no-cache'}
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        candidates = {candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')}
+        if tag in candidates or '*' in candidates:
+            return Response(status_code=304, headers=headers)
+
+    return Response(content=body(), media_type='application/json', headers=headers)
@@ -0,0 +1,294 @@
+# src/api/views.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from analytics import (AudioFeatureIndex, HeavyHitters, WeatherMoodStats, biggest_movers, distinct_counts,
+                       distinct_counts_by, latest_weather, read_engine, recommendation_lists)
+from analyzer_queries import AnalyzerQueries
+from etl.etl_orchestrator import etl_health
+from ingestion.batch_ingestor import ingestion_health, INGESTION_METADATA_DB
+from storage import day_bucket, get_database, hour_bucket
+from storage.rollups import SECONDS_PER_DAY
+
+# Taille des top-K de la vue heavy-hitters
+HEAVY_HITTERS_GLOBAL = 20
+HEAVY_HITTERS_PER_CITY = 5
+# Mouvements par catégorie de la vue movers
+MOVERS_LIMIT = 20
+
+
+class MaterializedView:
+    """
+    Résultat d'une requête gardé en mémoire, avec son ETag (empreinte du contenu) :
+    les requêtes HTTP lisent cet objet, jamais SQLite. Un calcul en échec laisse
+    `data` à None et garde le message dans `error`.
+    """
+
+    def __init__(self, name: str, data, refreshed_at: str, error: Optional[str] = None):
+        self.name = name
+        self.data = data
+        self.error = error
+        self.refreshed_at = refreshed_at
+        self.body = json.dumps(data if error is None else {'error': error},
+                               ensure_ascii=False, default=str).encode('utf-8')
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+
+    def page(self, offset: int, limit: int) -> Dict:
+        """Tranche [offset, offset + limit) d'une vue de type liste"""
+        items = self.data[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(self.data) else None
+        return {
+            'items': items,
+            'total': len(self.data),
+            'offset': offset,
+            'limit': limit,
+            'next_offset': next_offset,
+            'refreshed_at': self.refreshed_at
+        }
+
+
+class InsightViews:
+    """
+    Vues matérialisées de l'API d'insights. Chaque base source est surveillée par
+    `PRAGMA data_version` : ses vues sont recalculées après chaque écriture (et au
+    changement d'heure pour les fenêtres glissantes), sinon rien n'est relu.
+    """
+
+    def __init__(self, trends_db: Optional[str] = None, processed_db: Optional[str] = None,
+                 ingestion_db: Optional[str] = None, window_days: Optional[int] = None,
+                 refresh_interval: Optional[float] = None):
+        """
+        Args:
+            trends_db: Base du collecteur (API_TRENDS_DB, data/lastfm_weather.db)
+            processed_db: Base de l'ETL (API_PROCESSED_DB, /data/processed_music_weather.db)
+            ingestion_db: Métadonnées d'ingestion (API_INGESTION_DB, data/ingestion_metadata.db)
+            window_days: Fenêtre des insights musicaux en jours (API_WINDOW_DAYS, 7)
+            refresh_interval: Secondes entre deux vérifications de data_version
+                (API_REFRESH_INTERVAL, 1.0)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.trends_db = trends_db or os.getenv('API_TRENDS_DB', 'data/lastfm_weather.db')
+        self.processed_db = processed_db or os.getenv('API_PROCESSED_DB', '/data/processed_music_weather.db')
+        self.ingestion_db = ingestion_db or os.getenv('API_INGESTION_DB', INGESTION_METADATA_DB)
+        self.window_days = window_days or int(os.getenv('API_WINDOW_DAYS', 7))
+        self.refresh_interval = refresh_interval or float(os.getenv('API_REFRESH_INTERVAL', 1.0))
+
+        self.queries = AnalyzerQueries(self.trends_db)
+        # Plus proches voisins audio : projection en mémoire de l'index écrit par l'ETL
+        self.audio_index = AudioFeatureIndex.for_database(self.processed_db)
+
+        # Base source → (vues qu'elle alimente, fonction de calcul de ces vues)
+        self._sources: Dict[str, Tuple[Tuple[str, ...], Callable[[], Dict]]] = {
+            self.trends_db: (('weather-mood', 'top-artists', 'cities', 'heavy-hitters',
+                             'distinct-counts', 'movers'),
+                             self._build_music_views),
+            self.processed_db: (('etl-health', 'weather-recommendations'), lambda: {
+                'etl-health': etl_health(get_database(self.processed_db)),
+                'weather-recommendations': self._weather_recommendations()
+            }),
+            self.ingestion_db: (('ingestion-health',), lambda: {
+                'ingestion-health': ingestion_health(get_database(self.ingestion_db))
+            })
+        }
+        self._versions: Dict[str, tuple] = {}
+        self._views: Dict[str, MaterializedView] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, name: str) -> Optional[MaterializedView]:
+        return self._views.get(name)
+
+    def refresh(self, force: bool = False) -> List[str]:
+        """
+        Recalcule les vues des bases modifiées depuis le dernier passage
+
+        Returns:
+            Noms des vues recalculées
+        """
+        refreshed = []
+        with self._lock:
+            for path, (names, build) in self._sources.items():
+                try:
+                    version = (get_database(path).data_version(), hour_bucket(int(time.time())))
+                except Exception as e:
+                    # Base pas encore créée : la vue garde son dernier état (ou l'erreur)
+                    version = ('indisponible', str(e))
+
+                if not force and self._versions.get(path) == version:
+                    continue
+
+                refreshed_at = datetime.now().isoformat(timespec='seconds')
+                try:
+                    views = build()
+                except Exception as e:
+                    self.logger.warning(f"⚠️  Vues de {os.path.basename(path)} non recalculées: {e}")
+                    views = {name: MaterializedView(name, None, refreshed_at, error=str(e)) for name in names}
+
+                for name, data in views.items():
+                    # Chaque vue est remplacée d'un bloc : un lecteur voit l'ancienne
+                    # ou la nouvelle version, jamais un état intermédiaire
+                    self._views[name] = (data if isinstance(data, MaterializedView)
+                                         else MaterializedView(name, data, refreshed_at))
+                    refreshed.append(name)
+                self._versions[path] = version
+
+        if refreshed:
+            self.logger.debug(f"Vues recalculées: {', '.join(refreshed)}")
+        return refreshed
+
+    def start(self):
+        """Premier calcul puis surveillance des bases dans un thread d'arrière-plan"""
+        self.refresh(force=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='insight-views', daemon=True)
+        self._thread.start()
+        self.logger.info(f"🔄 Vues matérialisées actives (vérification toutes les {self.refresh_interval}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.refresh_interval * 2)
+            self._thread = None
+
+    def status(self) -> Dict:
+        """ETag et date de calcul de chaque vue"""
+        return {
+            name: {'etag': view.etag, 'refreshed_at': view.refreshed_at, 'error': view.error}
+            for name, view in sorted(self._views.items())
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f"❌ Erreur rafraîchissement des vues: {e}")
+
+    def _build_music_views(self) -> Dict:
+        since = hour_bucket(int(time.time()) - self.window_days * 86400)
+
+        correlation = self._weather_mood_correlation()
+        if correlation is not None:
+            counts = [(weather, mood, count)
+                      for weather, moods in correlation['table'].items() for mood, count in moods.items()]
+        else:
+            counts = [(weather, mood, int(count))
+                      for weather, mood, count in self.queries.weather_mood_counts(since).itertuples(index=False)]
+        totals: Dict[str, int] = {}
+        for weather, _, count in counts:
+            totals[weather] = totals.get(weather, 0) + count
+        rows = []
+        for weather, mood, count in sorted(counts, key=lambda row: (row[0], -row[2])):
+            rows.append({
+                'weather': weather,
+                'mood': mood,
+                'count': count,
+                'share': round(count / totals[weather], 4)
+            })
+        dominant = {}
+        for row in rows:
+            dominant.setdefault(row['weather'], row['mood'])
+        weather_mood = {'window_days': self.window_days, 'dominant_mood': dominant, 'rows': rows}
+        if correlation is not None:
+            weather_mood['statistics'] = {
+                key: correlation[key] for key in ('chi2', 'dof', 'p_value', 'cramers_v', 'temperature_by_mood')
+            }
+
+        top_artists = self.queries.top_artists(since, limit=-1)
+        cities = self.queries.city_activity(since, limit=-1)
+
+        return {
+            'weather-mood': weather_mood,
+            'top-artists': [
+                {'rank': rank, 'artist': artist, 'count': int(count)}
+                for rank, (artist, count) in enumerate(top_artists.itertuples(index=False), start=1)
+            ],
+            'cities': [
+                {'rank': rank, 'city': city, 'count': int(count)}
+                for rank, (city, count) in enumerate(cities.items(), start=1)
+            ],
+            'heavy-hitters': self._heavy_hitters(),
+            'distinct-counts': self._distinct_counts(),
+            'movers': self._movers()
+        }
+
+    def _weather_mood_correlation(self) -> Optional[Dict]:
+        """Fenêtre de l'API dans le moteur de corrélation du collecteur (None : repli sur les agrégats)"""
+        stats = read_engine(get_database(self.trends_db), WeatherMoodStats)
+        if stats is None:
+            return None
+        try:
+            return stats.correlation(f'{self.window_days}d')
+        except ValueError as e:
+            # Fenêtre plus longue que l'historique conservé par le moteur
+            self.logger.debug(f"Corrélation en ligne indisponible: {e}")
+            return None
+
+    def _heavy_hitters(self) -> Dict:
+        """
+        Top artistes et morceaux de la fenêtre de l'API, au global et par ville, lus
+        dans les résumés Space-Saving du collecteur (count surestime d'au plus error)
+        """
+        hitters = read_engine(get_database(self.trends_db), HeavyHitters)
+        if hitters is None:
+            return {'window_days': self.window_days, 'global': None, 'cities': []}
+        window = f'{self.window_days}d'
+        try:
+            hitters.top('artist', 1, window=window)
+        except ValueError as e:
+            # Fenêtre plus longue que l'historique conservé : fenêtre la plus longue configurée
+            self.logger.debug(f"Top-K en ligne sur la fenêtre la plus longue: {e}")
+            window = max(hitters.windows, key=hitters.windows.get)
+
+        def top(limit: int, city: Optional[str] = None, country: Optional[str] = None) -> Dict:
+            return {kind: hitters.top(kind, limit, city=city, country=country, window=window)
+                    for kind in ('artist', 'track')}
+
+        return {
+            'window_days': self.window_days,
+            'window': window,
+            'global': top(HEAVY_HITTERS_GLOBAL),
+            'cities': [
+                {'city': city, 'country': country, **top(HEAVY_HITTERS_PER_CITY, city, country)}
+                for city, country in hitters.scopes()
+            ]
+        }
+
+    def _distinct_counts(self) -> Dict:
+        """
+        Morceaux et artistes distincts des `window_days` derniers jours UTC (jour
+        courant inclus), au global, par jour et par ville : unions des résumés
+        HyperLogLog du collecteur (±1,6 %)
+        """
+        db = get_database(self.trends_db)
+        since = (day_bucket(int(time.time())) - self.window_days + 1) * SECONDS_PER_DAY
+        total = distinct_counts(db, since)
+        if total is None:
+            return {'window_days': self.window_days, 'total': None, 'days': [], 'cities': []}
+        return {
+            'window_days': self.window_days,
+            'total': total,
+            'days': distinct_counts_by(db, 'day', since),
+            'cities': distinct_counts_by(db, 'city', since)
+        }
+
+    def _movers(self) -> Dict:
+        """Progressions, reculs, entrées et sorties du dernier relevé de chaque ville (rank_deltas)"""
+        db = get_database(self.trends_db)
+        return {label: biggest_movers(db, direction, MOVERS_LIMIT)
+                for label, direction in (('rising', 'up'), ('falling', 'down'), ('entries', 'new'), ('exits', 'out'))}
+
+    def _weather_recommendations(self) -> Dict:
+        """
+        Listes précalculées par bucket météo et dernier relevé de chaque ville (base
+        ETL) : une recommandation de l'API est une recherche dans cette vue
+        """
+        db = get_database(self.processed_db)
+        return {'buckets': recommendation_lists(db) or {}, 'weather': latest_weather(db)}
@@ -0,0 +1,13 @@
+# src/bench/__init__.py
+from .synthetic import SyntheticWorkload
+from .suite import BenchmarkSuite, SCALES, compare
+from .startup import measure_startup, STARTUP_MODES
+
+__all__ = [
+    'SyntheticWorkload',
+    'BenchmarkSuite',
+    'SCALES',
+    'compare',
+    'measure_startup',
+    'STARTUP_MODES'
+]
@@ -0,0 +1,125 @@
+# src/bench/startup.py
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .suite import _git_commit, _summary
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+# Sous-commandes de main.py et arguments minimaux pour les sélectionner
+STARTUP_MODES = {
+    'help': [],
+    'test': ['--test'],
+    'backfill_stats': ['--backfill-stats', '2024-01-01'],
+    'ingest_batch': ['--ingest-batch'],
+    'monitor': ['--monitor'],
+    'etl': ['--run-etl'],
+    'export_parquet': ['--export-parquet'],
+    'retention': ['--retention'],
+    'backup': ['--backup'],
+    'restore_backup': ['--restore-backup', 'restored.db'],
+    'serve_api': ['--serve-api'],
+    'benchmark': ['--benchmark']
+}
+
+_IMPORTTIME = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+logger = logging.getLogger(__name__)
+
+
+def measure_startup(modes: Optional[List[str]] = None, repeat: Optional[int] = None,
+                    output_dir: Optional[str] = None) -> Dict:
+    """
+    Temps de démarrage de chaque sous-commande : `main.py <mode> --startup-only`
+    (imports + initialisation du mode, sans l'exécuter) lancé dans un processus
+    neuf, depuis un dossier de travail vide
+
+    Args:
+        modes: Sous-commandes de STARTUP_MODES (toutes par défaut)
+        repeat: Lancements par sous-commande (BENCH_STARTUP_REPEAT, 5)
+        output_dir: Dossier des résultats JSON (BENCH_OUTPUT_DIR, benchmarks/results)
+
+    Returns:
+        Temps de l'interpréteur seul, puis par mode : temps (ms), code de retour,
+        nombre de modules importés et imports les plus lourds (cumulés, -X importtime)
+    """
+    modes = modes or list(STARTUP_MODES)
+    repeat = repeat or int(os.getenv('BENCH_STARTUP_REPEAT', 5))
+    output_dir = os.path.abspath(output_dir or os.getenv('BENCH_OUTPUT_DIR', 'benchmarks/results'))
+
+    workspace = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ)
+    env.setdefault('LASTFM_API_KEY', 'benchmark')
+    env.setdefault('OPENWEATHER_API_KEY', 'benchmark')
+    env.setdefault('CITIES', 'Paris')
+    env.setdefault('COUNTRIES', 'France')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(MAIN_PATH), env.get('PYTHONPATH')]))
+
+    try:
+        results = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'repeat': repeat,
+            'interpreter': _time_command([sys.executable, '-c', 'pass'], repeat, workspace, env),
+            'modes': {}
+        }
+        for mode in modes:
+            command = [sys.executable, MAIN_PATH, *STARTUP_MODES[mode], '--startup-only']
+            timing = _time_command(command, repeat, workspace, env)
+            timing.update(_import_profile(command, workspace, env))
+            results['modes'][mode] = timing
+            logger.info(f"⏱️  Démarrage {mode}: {timing['median_ms']:.0f} ms, {timing['modules']} modules")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(output_dir, f"startup_{stamp}_{results['commit'] or 'nocommit'}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    results['output'] = path
+    return results
+
+
+def _time_command(command: List[str], repeat: int, cwd: str, env: Dict) -> Dict:
+    timings = []
+    returncode = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=cwd, env=env, capture_output=True)
+        timings.append(time.perf_counter() - started)
+        returncode = returncode or completed.returncode
+    timing = _summary(timings)
+    timing['returncode'] = returncode
+    return timing
+
+
+def _import_profile(command: List[str], cwd: str, env: Dict, top: int = 5) -> Dict:
+    """Modules importés et imports de premier niveau les plus coûteux (temps cumulé)"""
+    completed = subprocess.run([command[0], '-X', 'importtime', *command[1:]], cwd=cwd, env=env,
+                               capture_output=True, text=True)
+    modules = 0
+    top_level = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        modules += 1
+        # Indentation d'un espace : import direct du script (ou de son premier niveau)
+        if len(match.group(3)) <= 1:
+            top_level.append((int(match.group(2)), match.group(4)))
+    top_level.sort(reverse=True)
+    return {
+        'modules': modules,
+        'heaviest_imports': [f"{name} ({cumulative / 1000:.0f} ms)" for cumulative, name in top_level[:top]]
+    }
@@ -0,0 +1,389 @@
+# src/bench/suite.py
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from .synthetic import SyntheticWorkload
+
+# Échelles prédéfinies : paramètres de SyntheticWorkload + fichiers bruts par ville
+SCALES = {
+    'small': {'cities': 5, 'tracks': 20, 'days': 3, 'snapshots_per_day': 4, 'raw_files_per_city': 1},
+    'medium': {'cities': 20, 'tracks': 50, 'days': 14, 'snapshots_per_day': 8, 'raw_files_per_city': 2},
+    'large': {'cities': 50, 'tracks': 50, 'days': 30, 'snapshots_per_day': 12, 'raw_files_per_city': 4}
+}
+
+
+class BenchmarkSuite:
+    """
+    Benchmarks de bout en bout sur des données synthétiques, à plusieurs échelles.
+
+    Chaque échelle s'exécute dans un dossier de travail temporaire (bases et fichiers
+    bruts jetables) : les bases réelles ne sont jamais touchées. Les résultats (temps
+    min / médian / moyen / max par benchmark, débit par élément) sont écrits en JSON
+    avec le commit courant, pour comparer les runs d'un commit à l'autre (`compare`).
+    """
+
+    def __init__(self, scales: Optional[List[str]] = None, repeat: Optional[int] = None,
+                 output_dir: Optional[str] = None, keep_workspace: bool = False):
+        """
+        Args:
+            scales: Noms d'échelles de SCALES (BENCH_SCALES, small,medium)
+            repeat: Répétitions des benchmarks idempotents (BENCH_REPEAT, 5)
+            output_dir: Dossier des résultats JSON (BENCH_OUTPUT_DIR, benchmarks/results)
+            keep_workspace: Conserver les dossiers de travail pour inspection
+        """
+        self.logger = logging.getLogger(__name__)
+        self.scales = scales or os.getenv('BENCH_SCALES', 'small,medium').split(',')
+        unknown = [scale for scale in self.scales if scale not in SCALES]
+        if unknown:
+            raise ValueError(f"Échelles inconnues: {', '.join(unknown)} (disponibles: {', '.join(SCALES)})")
+        self.repeat = repeat or int(os.getenv('BENCH_REPEAT', 5))
+        self.output_dir = os.path.abspath(output_dir or os.getenv('BENCH_OUTPUT_DIR', 'benchmarks/results'))
+        self.keep_workspace = keep_workspace
+
+    def run(self) -> Dict:
+        """
+        Exécute toutes les échelles et écrit le fichier de résultats
+
+        Returns:
+            Résultats (dont 'output' : chemin du fichier JSON)
+        """
+        results = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'environment': {
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'repeat': self.repeat,
+            'scales': {}
+        }
+
+        for scale in self.scales:
+            self.logger.info(f"🏁 Benchmarks échelle '{scale}': {SCALES[scale]}")
+            results['scales'][scale] = self._run_scale(scale, dict(SCALES[scale]))
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.output_dir, f"{stamp}_{results['commit'] or 'nocommit'}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        results['output'] = path
+        self.logger.info(f"📄 Résultats des benchmarks: {path}")
+        return results
+
+    def _run_scale(self, scale: str, params: Dict) -> Dict:
+        raw_files_per_city = params.pop('raw_files_per_city')
+        workload = SyntheticWorkload(**params)
+        workspace = tempfile.mkdtemp(prefix=f'bench_{scale}_')
+        previous_cwd = os.getcwd()
+        previous_env = {name: os.environ.get(name) for name in _BENCH_ENV}
+        databases = []
+
+        try:
+            # Le collecteur et l'ETL écrivent sous ./data : tout reste dans le dossier de travail
+            os.chdir(workspace)
+            os.environ.update({
+                'LASTFM_API_KEY': os.environ.get('LASTFM_API_KEY') or 'benchmark',
+                'OPENWEATHER_API_KEY': os.environ.get('OPENWEATHER_API_KEY') or 'benchmark',
+                'CITIES': ','.join(city for city, _ in workload.cities),
+                'COUNTRIES': ','.join(country for _, country in workload.cities),
+                'AUDIO_INDEX_DIR': os.path.join(workspace, 'data', 'audio_index')
+            })
+            benchmarks = {}
+            setup = {}
+
+            # Imports différés : chaque module n'est chargé que si un benchmark tourne
+            from lastfm_weather_collector import LastFmWeatherCollector
+            from data_analyzer import DataAnalyzer
+            from etl.etl_pipeline import ETLPipeline
+            from etl.etl_orchestrator import ETLOrchestrator
+
+            collector = LastFmWeatherCollector()
+            processed_path = os.path.join(workspace, 'data', 'processed_music_weather.db')
+            pipeline = ETLPipeline(processed_path)
+            databases.extend([collector.db, pipeline.db])
+
+            # Données de départ (le débit d'écriture est lui-même une mesure)
+            setup['trend_points'] = self._timed_setup(
+                'populate_trends', lambda: workload.populate_trends(collector.db, collector.trend_writer, collector.analytics),
+                benchmarks)
+            setup['processed_records'] = self._timed_setup(
+                'populate_processed', lambda: workload.populate_processed(pipeline.db, pipeline.track_writer, pipeline.analytics),
+                benchmarks)
+            setup['soundcharts_tracks'] = self._timed_setup(
+                'populate_soundcharts', lambda: workload.populate_soundcharts(pipeline.db), benchmarks)
+
+            # Classification d'humeur (collecteur et ETL) sur tout le catalogue
+            titles = [(t['track_name'], t['artist_name']) for tracks in workload.catalogue.values() for t in tracks]
+            benchmarks['mood_collector'] = self._measure(
+                lambda: [collector.analyze_track_mood(name, artist) for name, artist in titles], items=len(titles))
+            benchmarks['mood_etl'] = self._measure(
+                lambda: [pipeline._analyze_mood(name, artist) for name, artist in titles], items=len(titles))
+
+            # Écriture d'un relevé complet de toutes les villes (flush groupé du collecteur)
+            benchmarks['collector_flush'] = self._bench_collector_flush(collector, workload)
+
+            # Statistiques journalières de tous les couples (ville, jour) de l'historique
+            touched = {(city, country, observed_at.strftime('%Y-%m-%d'))
+                       for observed_at in workload.snapshot_times() for city, country in workload.cities}
+            benchmarks['generate_daily_stats'] = self._measure(
+                lambda: collector.generate_daily_stats(touched), items=len(touched))
+
+            # Insights : à froid (cache vidé) puis servis depuis le cache
+            benchmarks['insights_cold'] = self._measure(
+                collector.display_current_insights, before=collector.db.cache.clear)
+            benchmarks['insights_warm'] = self._measure(collector.display_current_insights)
+
+            # Analyseur : regroupements SQL et rapport rapide
+            analyzer = DataAnalyzer(collector.db.path)
+            queries = analyzer.queries
+            benchmarks['analyzer_quick_insights_cold'] = self._measure(
+                analyzer.get_quick_insights, before=collector.db.cache.clear)
+            benchmarks['analyzer_quick_insights_warm'] = self._measure(analyzer.get_quick_insights)
+            benchmarks['analyzer_queries_cold'] = self._measure(
+                lambda: (queries.weather_mood_counts(), queries.mood_distribution(), queries.top_artists(),
+                         queries.city_activity(), queries.temperature_by_mood()),
+                before=collector.db.cache.clear)
+
+            # Moteur de corrélation en ligne : requête sur une fenêtre glissante
+            weather_mood = collector.analytics.get('weather_mood')
+            benchmarks['weather_mood_correlation'] = self._measure(
+                lambda: [weather_mood.correlation(window) for window in ('1h', '24h', '7d', 'all')], items=4)
+
+            # Top-K en ligne : artistes et morceaux, global puis première ville, fenêtre 24h
+            hitters = collector.analytics.get('heavy_hitters')
+            city, country = hitters.scopes()[0]
+            benchmarks['heavy_hitters_top'] = self._measure(
+                lambda: [hitters.top(kind, 10, city=scope_city, country=scope_country, window='24h')
+                         for kind in ('artist', 'track')
+                         for scope_city, scope_country in ((None, None), (city, country))], items=4)
+
+            # Distincts (HyperLogLog) : tout l'historique, au global puis par jour et par ville, à froid
+            from analytics import distinct_counts, distinct_counts_by
+            benchmarks['distinct_counts_cold'] = self._measure(
+                lambda: (distinct_counts(collector.db), distinct_counts_by(collector.db, 'day'),
+                         distinct_counts_by(collector.db, 'city')),
+                before=collector.db.cache.clear, items=3)
+
+            # Plus forts mouvements de classement : dernier relevé de chaque ville puis 24h, à froid
+            from analytics import biggest_movers
+            since = int(workload.end.replace(tzinfo=timezone.utc).timestamp()) - 86400
+            benchmarks['biggest_movers_cold'] = self._measure(
+                lambda: [biggest_movers(collector.db, direction, 20, since=window_start)
+                         for direction in ('up', 'down', 'new', 'out') for window_start in (None, since)],
+                before=collector.db.cache.clear, items=8)
+
+            # Index audio : reconstruction complète puis plus proches voisins (morceau, profil)
+            audio_index = pipeline.audio_index
+            benchmarks['audio_index_build'] = self._measure(
+                lambda: audio_index.refresh(pipeline.db), repeat=3,
+                before=lambda: shutil.rmtree(audio_index.directory, ignore_errors=True))
+            indexed = titles[:50]
+            benchmarks['audio_knn'] = self._measure(
+                lambda: [(audio_index.similar_to(name, artist, 10),
+                          audio_index.matching({'valence': 0.8, 'energy': 0.7, 'tempo': 120}, 10))
+                         for name, artist in indexed], items=2 * len(indexed))
+
+            # Recommandations météo : listes précalculées relues à froid, puis une par ville
+            from analytics import latest_weather, recommend, recommendation_lists
+            observations = latest_weather(pipeline.db)
+            benchmarks['weather_recommendations_cold'] = self._measure(
+                lambda: recommendation_lists(pipeline.db), before=pipeline.db.cache.clear)
+            benchmarks['weather_recommend'] = self._measure(
+                lambda: [recommend(recommendation_lists(pipeline.db), observation['weather_main'],
+                                   observation['temperature'], observation['humidity'], 10, audio_index)
+                         for observation in observations], items=len(observations))
+
+            # ETL fichier par fichier puis en batch (fichiers distincts : aucun n'est rejoué)
+            raw_files = workload.write_raw_files(os.path.join(workspace, 'data', 'raw_single'), raw_files_per_city)
+            benchmarks['etl_raw_file'] = self._measure_each(pipeline.run_etl_for_raw_file, raw_files)
+
+            batch_workload = SyntheticWorkload(**dict(params, seed=workload.seed + 1),
+                                               end=workload.end + timedelta(hours=1))
+            batch_dir = os.path.join(workspace, 'data', 'raw')
+            batch_files = batch_workload.write_raw_files(batch_dir, raw_files_per_city)
+            orchestrator = ETLOrchestrator(processed_path, batch_dir)
+            benchmarks['etl_batch'] = self._measure(
+                lambda: orchestrator.run_etl_batch(process_all=True, do_soundcharts=False, do_export=False),
+                repeat=1, items=len(batch_files))
+
+            # Coût du logging par track traité, un benchmark par configuration du logging
+            for config, timing in self._bench_logging(workspace).items():
+                benchmarks[f'logging_per_track_{config}'] = timing
+
+            return {
+                'params': dict(params, raw_files_per_city=raw_files_per_city),
+                'setup': setup,
+                'write_stats': dict(collector.write_stats),
+                'db_stats': {'trends': collector.db.stats(), 'processed': pipeline.db.stats()},
+                'benchmarks': benchmarks
+            }
+
+        finally:
+            os.chdir(previous_cwd)
+            for name, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            for db in databases:
+                db.close()
+            if self.keep_workspace:
+                self.logger.info(f"📁 Dossier de travail conservé: {workspace}")
+            else:
+                shutil.rmtree(workspace, ignore_errors=True)
+
+    def _bench_collector_flush(self, collector, workload: SyntheticWorkload) -> Dict:
+        """Un relevé par ville, horodaté après l'historique, écrit par flush groupé"""
+        timings = []
+        collector.write_stats = collector._empty_write_stats()
+        for i in range(self.repeat):
+            for point in workload.data_points([workload.end + timedelta(minutes=i + 1)]):
+                collector.buffer_data_point(point)
+            started = time.perf_counter()
+            collector.flush_write_buffer()
+            timings.append(time.perf_counter() - started)
+        rows = collector.write_stats['rows'] // max(1, self.repeat)
+        return _summary(timings, rows)
+
+    def _bench_logging(self, workspace: str, records: int = 10000) -> Dict:
+        """
+        Coût pour l'appelant d'un message de log par track traité, selon la configuration :
+        désactivé, handler fichier synchrone ou file d'attente + thread d'écriture, chaque
+        message émis (comportement historique, f-string) ou limité par RateLimitedLogger.
+        `drain_ms` est le temps d'écriture restant à la fermeture (hors chemin chaud).
+        """
+        from utils.logger import JsonFormatter, QueuedHandler, RateLimitedLogger
+
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        bench_logger = logging.getLogger('bench.logging')
+        tracks = [(f"Track {i}", f"Artist {i % 97}", 'happy') for i in range(records)]
+        results = {}
+        try:
+            for config in ('disabled', 'sync_unlimited', 'sync', 'queued_unlimited', 'queued'):
+                file_handler = logging.FileHandler(os.path.join(workspace, f'logging_{config}.log'))
+                file_handler.setFormatter(JsonFormatter())
+                handler = QueuedHandler([file_handler], maxsize=records + 1) \
+                    if config.startswith('queued') else file_handler
+                root.handlers = [handler]
+                root.setLevel(logging.INFO)
+                if config == 'disabled':
+                    logging.disable(logging.CRITICAL)
+
+                if config.endswith('unlimited') or config == 'disabled':
+                    def emit():
+                        for name, artist, mood in tracks:
+                            bench_logger.info(f"Mood analysis: '{name}' ({artist}) → {mood}")
+                else:
+                    hot_log = RateLimitedLogger(bench_logger)
+
+                    def emit():
+                        for name, artist, mood in tracks:
+                            hot_log.info("Mood analysis: '%s' (%s) → %s", name, artist, mood)
+
+                try:
+                    timing = self._measure(emit, repeat=1, items=records)
+                finally:
+                    logging.disable(logging.NOTSET)
+                    started = time.perf_counter()
+                    handler.close()
+                    file_handler.close()
+                    timing['drain_ms'] = round((time.perf_counter() - started) * 1000, 3)
+                results[config] = timing
+        finally:
+            root.handlers = saved_handlers
+            root.setLevel(saved_level)
+        return results
+
+    def _timed_setup(self, name: str, populate: Callable[[], int], benchmarks: Dict) -> int:
+        started = time.perf_counter()
+        count = populate()
+        benchmarks[name] = _summary([time.perf_counter() - started], count)
+        self.logger.info(f"🧪 {name}: {count} lignes en {benchmarks[name]['median_ms']:.0f} ms")
+        return count
+
+    def _measure(self, fn: Callable, repeat: Optional[int] = None, items: Optional[int] = None,
+                 before: Optional[Callable] = None) -> Dict:
+        """Temps de `repeat` appels de `fn` (`before` est appelé hors chronométrage)"""
+        timings = []
+        for _ in range(repeat or self.repeat):
+            if before:
+                before()
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return _summary(timings, items)
+
+    def _measure_each(self, fn: Callable, args: List) -> Dict:
+        """Un appel de `fn` par argument (benchmarks non idempotents : un fichier par mesure)"""
+        timings = []
+        for arg in args:
+            started = time.perf_counter()
+            fn(arg)
+            timings.append(time.perf_counter() - started)
+        return _summary(timings, 1)
+
+
+_BENCH_ENV = ('LASTFM_API_KEY', 'OPENWEATHER_API_KEY', 'CITIES', 'COUNTRIES', 'AUDIO_INDEX_DIR')
+
+
+def _summary(timings: List[float], items: Optional[int] = None) -> Dict:
+    summary = {
+        'runs': len(timings),
+        'min_ms': round(min(timings) * 1000, 3),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3)
+    }
+    if items:
+        summary['items'] = items
+        summary['per_item_us'] = round(statistics.median(timings) * 1e6 / items, 3)
+    return summary
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(baseline: Dict, current: Dict) -> List[Dict]:
+    """
+    Compare deux résultats (médianes) benchmark par benchmark
+
+    Returns:
+        Lignes (échelle, benchmark, médianes avant / après, ratio après / avant),
+        des plus fortes régressions aux plus fortes améliorations
+    """
+    rows = []
+    for scale, scale_results in current.get('scales', {}).items():
+        before_scale = baseline.get('scales', {}).get(scale, {}).get('benchmarks', {})
+        for name, after in scale_results.get('benchmarks', {}).items():
+            before = before_scale.get(name)
+            if not before or not before.get('median_ms'):
+                continue
+            rows.append({
+                'scale': scale,
+                'benchmark': name,
+                'baseline_ms': before['median_ms'],
+                'current_ms': after['median_ms'],
+                'ratio': round(after['median_ms'] / before['median_ms'], 3)
+            })
+    return sorted(rows, key=lambda row: row['ratio'], reverse=True)
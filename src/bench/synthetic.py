@@ -0,0 +1,362 @@
+# src/bench/synthetic.py
+import hashlib
+import json
+import logging
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from analytics import PopularityPercentiles, snapshots_from_points, snapshot_from_records
+from storage import TrendWriter, ProcessedTrackWriter
+
+# Villes réelles (météo plausible) ; au-delà, les noms sont suffixés (Paris-2, ...)
+BASE_CITIES = [
+    ('Paris', 'France'), ('London', 'United Kingdom'), ('Berlin', 'Germany'), ('Madrid', 'Spain'),
+    ('Rome', 'Italy'), ('Amsterdam', 'Netherlands'), ('Stockholm', 'Sweden'), ('Oslo', 'Norway'),
+    ('Lisbon', 'Portugal'), ('Dublin', 'Ireland'), ('Vienna', 'Austria'), ('Warsaw', 'Poland'),
+    ('New York', 'United States'), ('Toronto', 'Canada'), ('Mexico City', 'Mexico'),
+    ('Sao Paulo', 'Brazil'), ('Tokyo', 'Japan'), ('Seoul', 'South Korea'), ('Sydney', 'Australia'),
+    ('Cape Town', 'South Africa')
+]
+
+# (main, description, température moyenne °C, humidité moyenne %)
+WEATHER_TYPES = [
+    ('Clear', 'clear sky', 22.0, 45),
+    ('Clouds', 'broken clouds', 15.0, 65),
+    ('Rain', 'light rain', 11.0, 85),
+    ('Drizzle', 'light intensity drizzle', 12.0, 88),
+    ('Thunderstorm', 'thunderstorm with rain', 18.0, 80),
+    ('Snow', 'light snow', -2.0, 90),
+    ('Mist', 'mist', 8.0, 95)
+]
+
+# Mots-clés reconnus par l'analyse d'humeur (collecteur et ETL) ; None : titre neutre
+MOOD_WORDS = {
+    'happy': ['Sunshine', 'Party', 'Smile', 'Summer'],
+    'sad': ['Tears', 'Lonely', 'Goodbye', 'Broken'],
+    'energetic': ['Fire', 'Power', 'Wild', 'Storm'],
+    'calm': ['Dream', 'Quiet', 'Gentle', 'Slow'],
+    'romantic': ['Kiss', 'Darling', 'Moon', 'Together'],
+    None: ['Paper', 'Window', 'Echo', 'Station', 'Mirror']
+}
+FILLER_WORDS = ['Avenue', 'Letters', 'Signal', 'Motion', 'Canvas', 'Harbor', 'Velvet', 'Static']
+
+
+class SyntheticWorkload:
+    """
+    Jeu de données synthétique reproductible (graine fixe) pour les benchmarks :
+
+    - fichiers bruts au format de `RawDataIngestor._save_raw_data` (metadata, réponse
+      Last.fm geo.gettoptracks, réponse OpenWeather) ;
+    - base du collecteur (`trend_facts`, vue `city_music_trends`, agrégats) ;
+    - base traitée (`processed_track_facts`, vue `processed_tracks`) et `soundcharts_tracks`.
+
+    Volume : `cities` villes × `days` jours × `snapshots_per_day` relevés × `tracks` morceaux.
+    Le classement de chaque pays suit une loi de puissance et évolue d'un relevé à l'autre.
+    """
+
+    def __init__(self, cities: int = 5, tracks: int = 20, days: int = 3,
+                 snapshots_per_day: int = 4, seed: int = 42, end: Optional[datetime] = None):
+        """
+        Args:
+            cities: Nombre de villes
+            tracks: Morceaux par classement (Last.fm en renvoie 50 par défaut)
+            days: Jours d'historique, jusqu'à `end`
+            snapshots_per_day: Relevés par ville et par jour
+            seed: Graine du générateur (mêmes paramètres → mêmes données)
+            end: Instant du dernier relevé (UTC, par défaut l'heure courante)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.tracks = tracks
+        self.days = days
+        self.snapshots_per_day = snapshots_per_day
+        self.seed = seed
+        self.end = (end or datetime.now(timezone.utc).replace(tzinfo=None)).replace(minute=0, second=0, microsecond=0)
+
+        self.cities = self._city_list(cities)
+        rng = random.Random(seed)
+        # Catalogue par pays, trois fois plus large que le classement pour que des titres y entrent et en sortent
+        self.catalogue: Dict[str, List[Dict]] = {
+            country: self._catalogue(rng, country, tracks * 3)
+            for country in sorted({country for _, country in self.cities})
+        }
+
+    def params(self) -> Dict:
+        return {
+            'cities': len(self.cities),
+            'tracks': self.tracks,
+            'days': self.days,
+            'snapshots_per_day': self.snapshots_per_day,
+            'seed': self.seed
+        }
+
+    def snapshot_times(self) -> List[datetime]:
+        """Instants des relevés, du plus ancien au plus récent (le dernier vaut `end`)"""
+        step = timedelta(seconds=86400 // max(1, self.snapshots_per_day))
+        count = self.days * self.snapshots_per_day
+        return [self.end - step * (count - 1 - i) for i in range(count)]
+
+    def snapshot_days(self) -> List[List[datetime]]:
+        """Instants des relevés regroupés par jour de l'historique"""
+        times = self.snapshot_times()
+        return [times[i:i + self.snapshots_per_day] for i in range(0, len(times), self.snapshots_per_day)]
+
+    def snapshots(self, times: Optional[List[datetime]] = None) -> Iterator[Tuple[str, str, datetime, Dict, List[Dict]]]:
+        """
+        (ville, pays, instant, météo au format collecteur, classement) pour chaque relevé
+        de `times` (par défaut tout l'historique) ; un même instant donne toujours le même relevé
+        """
+        for observed_at in (self.snapshot_times() if times is None else times):
+            for city, country in self.cities:
+                rng = random.Random(f"{self.seed}:{city}:{observed_at.isoformat()}")
+                yield city, country, observed_at, self._weather(rng, city, observed_at), self._chart(rng, country)
+
+    def data_points(self, times: Optional[List[datetime]] = None) -> Iterator[Dict]:
+        """Points au format de `LastFmWeatherCollector.collect_city_data`"""
+        for city, country, observed_at, weather, chart in self.snapshots(times):
+            timestamp = observed_at.strftime('%Y-%m-%d %H:%M:%S')
+            for track in chart:
+                yield {
+                    'timestamp': timestamp,
+                    'city': city,
+                    'country': country,
+                    'track_name': track['track_name'],
+                    'artist_name': track['artist_name'],
+                    'listeners': track['listeners'],
+                    'playcount': track['playcount'],
+                    'rank': track['rank'],
+                    'weather_main': weather['main'],
+                    'weather_description': weather['description'],
+                    'temperature': weather['temperature'],
+                    'humidity': weather['humidity'],
+                    'pressure': weather['pressure'],
+                    'wind_speed': weather['wind_speed'],
+                    'clouds': weather['clouds'],
+                    'mood_category': track['mood']
+                }
+
+    def raw_payload(self, city: str, country: str, observed_at: datetime) -> Dict:
+        """Contenu d'un fichier brut, tel qu'écrit par l'ingestion"""
+        rng = random.Random(f"{self.seed}:raw:{city}:{observed_at.isoformat()}")
+        weather = self._weather(rng, city, observed_at)
+        chart = self._chart(rng, country)
+        return {
+            'metadata': {
+                'city': city,
+                'country': country,
+                'ingestion_timestamp': observed_at.isoformat(),
+                'data_source': 'synthetic_workload'
+            },
+            'lastfm_data': {
+                'tracks': {
+                    'track': [
+                        {
+                            'name': track['track_name'],
+                            'duration': str(rng.randint(120, 300)),
+                            'listeners': str(track['listeners']),
+                            'mbid': '',
+                            'url': f"https://www.last.fm/music/{track['artist_name'].replace(' ', '+')}",
+                            'artist': {'name': track['artist_name'], 'mbid': '', 'url': ''},
+                            '@attr': {'rank': str(track['rank'] - 1)}
+                        }
+                        for track in chart
+                    ],
+                    '@attr': {'country': country, 'page': '1', 'perPage': str(len(chart)),
+                              'totalPages': '1', 'total': str(len(chart))}
+                }
+            },
+            'weather_data': {
+                'weather': [{'id': 800, 'main': weather['main'], 'description': weather['description'], 'icon': '01d'}],
+                'main': {'temp': weather['temperature'], 'humidity': weather['humidity'],
+                         'pressure': weather['pressure']},
+                'wind': {'speed': weather['wind_speed']},
+                'clouds': {'all': weather['clouds']},
+                'dt': int(observed_at.replace(tzinfo=timezone.utc).timestamp()),
+                'name': city
+            }
+        }
+
+    def write_raw_files(self, raw_dir: str, files_per_city: int = 1) -> List[str]:
+        """
+        Écrit `files_per_city` fichiers bruts par ville (les relevés les plus récents)
+
+        Returns:
+            Chemins des fichiers écrits
+        """
+        os.makedirs(raw_dir, exist_ok=True)
+        times = self.snapshot_times()[-files_per_city:]
+        paths = []
+        for observed_at in times:
+            for city, country in self.cities:
+                filename = f"{city}_{country}_{observed_at.strftime('%Y%m%d_%H%M%S')}.json".replace(' ', '_')
+                path = os.path.join(raw_dir, filename)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(self.raw_payload(city, country, observed_at), f, indent=2, ensure_ascii=False)
+                paths.append(path)
+        self.logger.info(f"🧪 {len(paths)} fichiers bruts synthétiques écrits dans {raw_dir}")
+        return paths
+
+    def populate_trends(self, db, writer: Optional[TrendWriter] = None, analytics=None) -> int:
+        """
+        Remplit la base du collecteur (schéma déjà créé), une transaction par jour
+
+        Args:
+            db: Instance `storage.Database` de la base du collecteur
+            writer: Écrivain à utiliser (par défaut un nouveau `TrendWriter`)
+            analytics: `analytics.StreamingAnalytics` à alimenter comme le collecteur (optionnel)
+
+        Returns:
+            Nombre de points écrits
+        """
+        writer = writer or TrendWriter()
+        written = 0
+        for times in self.snapshot_days():
+            batch = list(self.data_points(times))
+            with db.write() as conn:
+                cursor = conn.cursor()
+                inserted = writer.write_many(cursor, batch)
+                if analytics is not None:
+                    analytics.observe(cursor, snapshots_from_points(
+                        data for data, new in zip(batch, inserted) if new
+                    ))
+            written += len(batch)
+        return written
+
+    def populate_processed(self, db, writer: Optional[ProcessedTrackWriter] = None, analytics=None) -> int:
+        """
+        Remplit la base traitée (déjà initialisée par `ETLPipeline`) comme si chaque
+        relevé avait été un fichier brut, une transaction par jour
+
+        Args:
+            analytics: `analytics.StreamingAnalytics` à alimenter comme l'ETL (optionnel)
+
+        Returns:
+            Nombre d'enregistrements écrits
+        """
+        writer = writer or ProcessedTrackWriter()
+        scorer = (analytics.get('popularity') if analytics is not None else None) or PopularityPercentiles()
+        written = 0
+        for times in self.snapshot_days():
+            with db.write() as conn:
+                cursor = conn.cursor()
+                snapshots = []
+                for city, country, observed_at, weather, chart in self.snapshots(times):
+                    timestamp = observed_at.strftime('%Y-%m-%d %H:%M:%S')
+                    observation_id = writer.write_observation(cursor, city, country, timestamp, weather)
+                    records = [{
+                        'city': city,
+                        'country': country,
+                        'track_name': track['track_name'],
+                        'artist_name': track['artist_name'],
+                        'listeners': track['listeners'],
+                        'playcount': track['playcount'],
+                        'rank_position': track['rank'],
+                        'mood_category': track['mood'],
+                        'raw_data_path': f"synthetic/{city}_{timestamp}.json",
+                        'processed_at': timestamp
+                    } for track in chart]
+                    # Scores par lot comme l'ETL (percentiles du pays)
+                    scores = scorer.score(country, [record['listeners'] for record in records],
+                                          [record['playcount'] for record in records])
+                    inserted = []
+                    for record, score in zip(records, scores.tolist()):
+                        record['popularity_score'] = score
+                        if writer.write(cursor, record, observation_id):
+                            inserted.append(record)
+                        written += 1
+                    snapshots.append(snapshot_from_records(inserted, weather))
+                if analytics is not None:
+                    analytics.observe(cursor, snapshots)
+        return written
+
+    def populate_soundcharts(self, db) -> int:
+        """
+        Remplit `soundcharts_tracks` avec des caractéristiques audio pour tout le catalogue
+
+        Returns:
+            Nombre de morceaux écrits
+        """
+        rows = []
+        for country, tracks in self.catalogue.items():
+            for track in tracks:
+                rng = random.Random(f"{self.seed}:audio:{track['track_name']}:{track['artist_name']}")
+                rows.append((
+                    track['track_name'], track['artist_name'],
+                    self._uuid(country, track),
+                    f"{rng.randint(1995, 2025)}-{rng.randint(1, 12):02d}-01", country,
+                    json.dumps([rng.choice(['pop', 'rock', 'hip-hop', 'electro', 'jazz', 'folk'])]),
+                    rng.random(), rng.random(), rng.random(), rng.random() * 0.3, rng.randint(0, 11),
+                    rng.random() * 0.5, -rng.uniform(3, 20), rng.randint(0, 1), rng.random() * 0.4,
+                    rng.uniform(60, 180), 4, rng.random()
+                ))
+        with db.write() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO soundcharts_tracks (
+                    track_name, artist_name, uuid, release_date, isrc_country_name, genres,
+                    acousticness, danceability, energy, instrumentalness, key, liveness,
+                    loudness, mode, speechiness, tempo, time_signature, valence
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+        return len(rows)
+
+    def _uuid(self, country: str, track: Dict) -> str:
+        key = f"{self.seed}:{country}:{track['track_name']}:{track['artist_name']}"
+        return 'synthetic-' + hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+    def _city_list(self, count: int) -> List[Tuple[str, str]]:
+        cities = []
+        for i in range(count):
+            city, country = BASE_CITIES[i % len(BASE_CITIES)]
+            suffix = i // len(BASE_CITIES)
+            cities.append((f"{city}-{suffix + 1}" if suffix else city, country))
+        return cities
+
+    def _catalogue(self, rng: random.Random, country: str, size: int) -> List[Dict]:
+        moods = list(MOOD_WORDS)
+        artists = [f"{rng.choice(FILLER_WORDS)} {rng.choice(['Club', 'Kids', 'Lines', 'Band', 'Collective'])} {i}"
+                   for i in range(max(1, size // 3))]
+        catalogue = []
+        for i in range(size):
+            mood = rng.choice(moods)
+            title = f"{rng.choice(MOOD_WORDS[mood])} {rng.choice(FILLER_WORDS)} {i}"
+            catalogue.append({
+                'track_name': title,
+                'artist_name': rng.choice(artists),
+                'mood': mood or 'neutral',
+                # Loi de puissance : quelques titres concentrent l'essentiel de l'écoute
+                'weight': 1.0 / (i + 1) ** 0.8
+            })
+        return catalogue
+
+    def _chart(self, rng: random.Random, country: str) -> List[Dict]:
+        """Classement d'un relevé : tirage pondéré sans remise dans le catalogue du pays"""
+        catalogue = self.catalogue[country]
+        keyed = sorted(catalogue, key=lambda t: rng.random() ** (1.0 / t['weight']), reverse=True)
+        chart = []
+        for rank, track in enumerate(keyed[:self.tracks], start=1):
+            listeners = int(2_000_000 / rank ** 0.9 * rng.uniform(0.8, 1.2))
+            chart.append({
+                'track_name': track['track_name'],
+                'artist_name': track['artist_name'],
+                'mood': track['mood'],
+                'listeners': listeners,
+                'playcount': int(listeners * rng.uniform(3, 12)),
+                'rank': rank
+            })
+        return chart
+
+    def _weather(self, rng: random.Random, city: str, observed_at: datetime) -> Dict:
+        main, description, temperature, humidity = rng.choice(WEATHER_TYPES)
+        # Cycle jour / nuit autour de la moyenne du type de temps
+        daily = 4.0 if 10 <= observed_at.hour <= 18 else -3.0
+        return {
+            'main': main,
+            'description': description,
+            'temperature': round(temperature + daily + rng.gauss(0, 3), 1),
+            'humidity': max(10, min(100, int(humidity + rng.gauss(0, 8)))),
+            'pressure': int(rng.gauss(1013, 8)),
+            'wind_speed': round(abs(rng.gauss(4, 2.5)), 1),
+            'clouds': rng.randint(0, 100)
+        }
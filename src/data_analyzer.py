@@ -1,70 +1,148 @@
 # src/data_analyzer.py
+import numpy as np
 import pandas as pd
-import sqlite3
+import time
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+from analytics import HeavyHitters, WeatherMoodStats, distinct_counts, read_engine
+from analyzer_queries import AnalyzerQueries
+from storage import day_bucket, hour_bucket
 
 class DataAnalyzer:
     def __init__(self, db_path='/data/lastfm_weather.db'):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        # Regroupements calculés par SQLite, lectures via le pool en lecture seule
+        self.queries = AnalyzerQueries(db_path)
+    
+    def weather_mood_correlation(self, window='7d'):
+        """
+        Corrélation météo-humeur de la fenêtre, maintenue en ligne par le collecteur
+        (contingence, chi², V de Cramér, températures par humeur) ; None si la base
+        n'a pas encore d'état d'analyse ou si la fenêtre dépasse l'historique du moteur
+        (ANALYTICS_WINDOWS)
+        """
+        stats = read_engine(self.queries.db, WeatherMoodStats)
+        if stats is None:
+            return None
+        try:
+            return stats.correlation(window)
+        except ValueError:
+            # Fenêtre plus longue que la plus longue fenêtre configurée
+            return None
+    
+    def top_artists(self, window='7d', limit=10, city=None, country=None):
+        """
+        Artistes les plus fréquents de la fenêtre (global ou par ville), lus dans les
+        résumés Space-Saving du collecteur : [(artiste, apparitions)], comptes exacts
+        à l'erreur près indiquée par le moteur ; None si la base n'a pas d'état ou si
+        la fenêtre dépasse l'historique du moteur (ANALYTICS_WINDOWS)
+        """
+        hitters = read_engine(self.queries.db, HeavyHitters)
+        if hitters is None:
+            return None
+        try:
+            top = hitters.top('artist', limit, city=city, country=country, window=window)
+        except ValueError:
+            return None
+        return [(item['name'], item['count']) for item in top['items']]
+    
+    def distinct_counts(self, days=7, city=None, country=None):
+        """
+        Morceaux et artistes distincts des `days` derniers jours UTC (jour courant
+        inclus), estimés à ±1,6 % par l'union des résumés HyperLogLog du collecteur ;
+        None si la base n'en a pas
+        """
+        since = (day_bucket(int(time.time())) - days + 1) * 86400
+        return distinct_counts(self.queries.db, since, city=city, country=country)
     
     def get_quick_insights(self):
-        """Retourne des insights rapides"""
-        df = pd.read_sql_query("""
-            SELECT * FROM city_music_trends 
-            WHERE timestamp >= datetime('now', '-7 days')
-        """, self.conn)
+        """Retourne des insights rapides (moteur de corrélation et agrégats, 7 derniers jours)"""
+        # Borne alignée sur l'heure : la clé du cache de requêtes ne change qu'à chaque heure
+        since = hour_bucket(int(time.time()) - 7 * 86400)
+        correlation = self.weather_mood_correlation('7d')
+        
+        if correlation is not None:
+            if not correlation['tracks']:
+                return "❌ Pas assez de données pour l'analyse"
+            dominant = correlation['dominant_mood']
+        else:
+            # Base sans état d'analyse (ou fenêtre 7d non conservée) : tableau croisé lu dans les agrégats
+            weather_mood = self.queries.weather_mood_counts(since)
+            if weather_mood.empty:
+                return "❌ Pas assez de données pour l'analyse"
+            weather_mood = weather_mood.pivot_table(
+                index='weather_main', columns='mood_category', values='count', fill_value=0
+            )
+            dominant = {weather: weather_mood.loc[weather].idxmax() for weather in weather_mood.index}
         
-        if df.empty:
-            return "❌ Pas assez de données pour l'analyse"
+        top_artists = self.top_artists('7d', limit=5)
+        if top_artists is None:
+            top_artists = list(self.queries.top_artists(since, limit=5).itertuples(index=False))
         
         insights = []
         
         # Corrélation météo-humeur
-        weather_mood = df.groupby(['weather_main', 'mood_category']).size().unstack(fill_value=0)
-        
         insights.append("🌤️  CORRÉLATION MÉTÉO-HUMEUR:")
-        for weather in weather_mood.index:
-            dominant_mood = weather_mood.loc[weather].idxmax()
+        for weather, dominant_mood in dominant.items():
             insights.append(f"   {weather}: {dominant_mood.upper()}")
+        if correlation is not None and correlation['dof']:
+            insights.append(
+                f"   χ² = {correlation['chi2']:.1f} (ddl {correlation['dof']}, p = {correlation['p_value']:.3g}), "
+                f"V de Cramér = {correlation['cramers_v']:.2f}"
+            )
+            for mood, temperature in correlation['temperature_by_mood'].items():
+                insights.append(f"   🌡️  {mood}: {temperature['mean']:.1f}°C ± {temperature['std']:.1f}")
+        
+        distinct = self.distinct_counts(7)
+        if distinct is not None:
+            insights.append(
+                f"\n🎶 DIVERSITÉ: ~{distinct['tracks']} morceaux et ~{distinct['artists']} artistes distincts "
+                f"({distinct['cities']} villes)"
+            )
         
-        # Top artistes
-        top_artists = df['artist_name'].value_counts().head(5)
         insights.append("/n👑 TOP 5 ARTISTES:")
-        for artist, count in top_artists.items():
+        for artist, count in top_artists:
             insights.append(f"   🎵 {artist} ({count} appearances)")
         
         return "/n".join(insights)
     
     def create_visualizations(self):
-        """Crée les visualisations principales"""
-        df = pd.read_sql_query("SELECT * FROM city_music_trends", self.conn)
+        """Crée les visualisations principales (à partir de résultats déjà agrégés)"""
+        weather_mood = self.queries.weather_mood_counts()
         
-        if df.empty:
+        if weather_mood.empty:
             return
         
+        # matplotlib n'est chargé que pour tracer : les insights rapides n'en ont pas besoin
+        import matplotlib.pyplot as plt
+        
         # Configuration des plots
         plt.style.use('seaborn-v0_8')
         fig, axes = plt.subplots(2, 2, figsize=(15, 12))
         
         # 1. Distribution des humeurs
-        df['mood_category'].value_counts().plot.pie(ax=axes[0,0], autopct='%1.1f%%')
+        self.queries.mood_distribution().plot.pie(ax=axes[0,0], autopct='%1.1f%%')
         axes[0,0].set_title('Distribution des Humeurs Musicales')
         
         # 2. Humeur par météo
-        weather_mood = df.groupby(['weather_main', 'mood_category']).size().unstack()
-        weather_mood.plot(kind='bar', ax=axes[0,1], stacked=True)
+        weather_mood.pivot_table(
+            index='weather_main', columns='mood_category', values='count'
+        ).plot(kind='bar', ax=axes[0,1], stacked=True)
         axes[0,1].set_title('Humeur Musicale par Type de Météo')
         axes[0,1].tick_params(axis='x', rotation=45)
         
-        # 3. Température vs Humeur
-        sns.boxplot(data=df, x='mood_category', y='temperature', ax=axes[1,0])
+        # 3. Température vs Humeur (boîtes calculées sur les comptes par température)
+        temperatures = self.queries.temperature_by_mood()
+        if not temperatures.empty:
+            stats = [
+                self._weighted_box_stats(mood, group['temperature'], group['count'])
+                for mood, group in temperatures.groupby('mood_category')
+            ]
+            axes[1,0].bxp(stats, showfliers=False)
         axes[1,0].set_title('Distribution des Températures par Humeur')
         
         # 4. Top villes par activité
-        df['city'].value_counts().head(10).plot(kind='bar', ax=axes[1,1])
+        self.queries.city_activity(limit=10).plot(kind='bar', ax=axes[1,1])
         axes[1,1].set_title('Top 10 Villes par Nombre de Tracks')
         axes[1,1].tick_params(axis='x', rotation=45)
         
@@ -73,6 +151,25 @@ class DataAnalyzer:
         plt.close()
         
         print("✅ Visualisations sauvegardées dans data/weather_music_insights.png")
+    
+    @staticmethod
+    def _weighted_box_stats(label, values, counts):
+        """Statistiques de boîte à moustaches (format Axes.bxp) depuis des valeurs pondérées"""
+        order = np.argsort(values.to_numpy())
+        values = values.to_numpy()[order]
+        cumulative = np.cumsum(counts.to_numpy()[order])
+        total = cumulative[-1]
+        
+        def quantile(q):
+            return float(values[np.searchsorted(cumulative, q * total)])
+        
+        q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+        iqr = q3 - q1
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        return {
+            'label': label, 'med': median, 'q1': q1, 'q3': q3,
+            'whislo': float(inside.min()), 'whishi': float(inside.max()), 'fliers': []
+        }
 
 if __name__ == "__main__":
     analyzer = DataAnalyzer()
@@ -1,5 +1,6 @@
 import os
-import sqlite3
+
+from storage import ensure_trends_schema, get_database, TrendWriter
 
 class DatabaseManager:
     def __init__(self, db_filename="lastfm_weather.db"):
@@ -8,23 +9,17 @@ class DatabaseManager:
         os.makedirs(self.data_dir, exist_ok=True)
 
         self.db_path = os.path.join(self.data_dir, db_filename)
-        self.conn = sqlite3.connect(self.db_path)
+        # Connexion d'écriture partagée (WAL) avec le collecteur du même processus
+        self.db = get_database(self.db_path)
+        self.conn = self.db.writer
         self.cursor = self.conn.cursor()
+        self.trend_writer = TrendWriter()
 
         self._create_tables()
 
     def _create_tables(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS city_music_trends (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                city TEXT,
-                country TEXT,
-                artist TEXT,
-                track TEXT,
-                listeners INTEGER,
-                timestamp TEXT
-            )
-        """)
+        # city_music_trends est une vue sur les tables de dimension + trend_facts
+        ensure_trends_schema(self.conn)
 
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS daily_stats (
@@ -35,30 +30,29 @@ class DatabaseManager:
                 total_listeners INTEGER
             )
         """)
-
-        self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_city_timestamp 
-                ON city_music_trends(city, timestamp)
-            ''')
-        
-        self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_weather_mood 
-                ON city_music_trends(weather_main, mood_category)
-            ''')
         
         self.conn.commit()
 
     def insert_city_music(self, data):
-        query = """INSERT INTO city_music_trends 
-                   (city, country, artist, track, listeners, timestamp) 
-                   VALUES (?, ?, ?, ?, ?, ?)"""
-        self.cursor.execute(query, data)
-        self.conn.commit()
+        city, country, artist, track, listeners, timestamp = data
+        try:
+            with self.db.write() as conn:
+                self.trend_writer.write(conn.cursor(), {
+                    'city': city,
+                    'country': country,
+                    'artist_name': artist,
+                    'track_name': track,
+                    'listeners': listeners,
+                    'timestamp': timestamp
+                })
+        except Exception:
+            self.trend_writer.clear_caches()
+            raise
 
     def close(self):
-        self.conn.close()
+        self.db.close()
 
 if __name__ == "__main__":
     db_manager = DatabaseManager()
     print(f"Database initialized at {db_manager.db_path}")
-    db_manager.close()
\ No newline at end of file
+    db_manager.close()
@@ -1,4 +1,5 @@
 from .etl_pipeline import ETLPipeline
 from .etl_orchestrator import ETLOrchestrator
+from .parquet_exporter import ParquetExporter, read_parquet_export
 
-__all__ = ['ETLPipeline', 'ETLOrchestrator']
\ No newline at end of file
+__all__ = ['ETLPipeline', 'ETLOrchestrator', 'ParquetExporter', 'read_parquet_export']
\ No newline at end of file
@@ -6,21 +6,29 @@ from typing import List, Dict
 import glob
 import json
 from .etl_pipeline import ETLPipeline
+from .parquet_exporter import ParquetExporter
+from storage import RetentionManager
+from utils.profiling import get_profiler
+from utils.logger import RateLimitedLogger
 
 class ETLOrchestrator:
     """
     Orchestrateur pour exécuter l'ETL + enrichissement Soundcharts
     """
     
-    def __init__(self):
+    def __init__(self, processed_db_path: str = '/data/processed_music_weather.db',
+                 raw_data_dir: str = 'data/raw'):
         self.logger = logging.getLogger(__name__)
-        self.etl_pipeline = ETLPipeline()
-        self.raw_data_dir = 'data/raw'
+        self.hot_log = RateLimitedLogger(self.logger)
+        self.etl_pipeline = ETLPipeline(processed_db_path)
+        self.raw_data_dir = raw_data_dir
     
-    def run_etl_batch(self, process_all: bool = False, do_soundcharts: bool = True) -> Dict:
+    def run_etl_batch(self, process_all: bool = False, do_soundcharts: bool = True,
+                      do_export: bool = None) -> Dict:
         """
         Exécute l'ETL sur les fichiers bruts et lance l'enrichissement Soundcharts
-        si activé (par défaut activé).
+        si activé (par défaut activé), puis l'export Parquet incrémental si
+        activé (par défaut via AUTO_EXPORT_PARQUET).
         """
         
         self.logger.info("🏭 Début batch ETL")
@@ -30,16 +38,21 @@ class ETLOrchestrator:
             self.logger.warning("⚠️  Aucun fichier brut trouvé")
             return {'status': 'no_files_found'}
         
+        profiler = get_profiler()
         results = []
-        for raw_file in raw_files:
-            self.logger.info(f"🔄 Traitement ETL: {os.path.basename(raw_file)}")
-            
-            result = self.etl_pipeline.run_etl_for_raw_file(raw_file)
-            results.append(result)
-            
-            if not process_all and result.get('status') == 'success':
-                self.logger.info("✅ Premier fichier traité avec succès - arrêt du batch")
-                break
+        with profiler.phase('etl_files'):
+            for raw_file in raw_files:
+                self.hot_log.info("🔄 Traitement ETL: %s", os.path.basename(raw_file))
+                
+                result = self.etl_pipeline.run_etl_for_raw_file(raw_file)
+                results.append(result)
+                
+                if not process_all and result.get('status') == 'success':
+                    self.logger.info("✅ Premier fichier traité avec succès - arrêt du batch")
+                    break
+            # Travail différé des moteurs d'analyse (listes de recommandations limitées
+            # en fréquence pendant les chargements) : rien ne reste périmé après le batch
+            self.etl_pipeline.analytics.flush()
         
         # Calcul stats batch
         batch_stats = self._calculate_batch_stats(results)
@@ -49,16 +62,46 @@ class ETLOrchestrator:
         if do_soundcharts:
             self.logger.info("🎵 Enrichissement Soundcharts...")
             try:
-                soundcharts_results = self.etl_pipeline.enrich_with_soundcharts()
+                with profiler.phase('soundcharts'):
+                    soundcharts_results = self.etl_pipeline.enrich_with_soundcharts()
                 self.logger.info(f"🎉 Enrichissement Soundcharts terminé ({len(soundcharts_results)} tracks)")
             except Exception as e:
                 self.logger.error(f"❌ Échec enrichissement Soundcharts : {e}")
 
+        # 📦 Export Parquet des nouvelles lignes (après enrichissement)
+        if do_export is None:
+            do_export = os.getenv('AUTO_EXPORT_PARQUET', 'false').lower() == 'true'
+        export_results = None
+        if do_export:
+            with profiler.phase('parquet_export'):
+                export_results = self.run_parquet_export()
+
+        # 🧹 Rétention du détail (après l'export, pour ne rien purger avant qu'il soit exporté)
+        retention_results = None
+        try:
+            with profiler.phase('retention'):
+                retention_results = self.run_retention()
+        except Exception as e:
+            self.logger.error(f"❌ Échec rétention : {e}")
+
         return {
             'batch_stats': batch_stats,
             'detailed_results': results,
-            'soundcharts_enrichment': soundcharts_results
+            'soundcharts_enrichment': soundcharts_results,
+            'parquet_export': export_results,
+            'retention': retention_results
         }
+
+    def run_retention(self, allow_full_vacuum: bool = False) -> Dict:
+        """Applique la politique de rétention à la base traitée"""
+        retention = RetentionManager(self.etl_pipeline.db, 'processed_track_facts')
+        return retention.run(allow_full_vacuum)
+
+    def run_parquet_export(self) -> Dict:
+        """Exporte en Parquet les lignes ajoutées depuis le dernier export"""
+        self.logger.info("📦 Export Parquet incrémental...")
+        exporter = ParquetExporter(processed_db_path=self.etl_pipeline.db_path)
+        return exporter.export_all()
         
     def _get_raw_files(self) -> List[str]:
         """Retourne la liste des fichiers bruts valides"""
@@ -100,30 +143,35 @@ class ETLOrchestrator:
     def get_etl_health(self) -> Dict:
         """Retourne l'état de santé du système ETL"""
         try:
-            conn = self.etl_pipeline._get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_etl_runs,
-                    AVG(success_rate) as avg_success_rate,
-                    SUM(records_loaded) as total_records_loaded,
-                    MIN(processed_at) as first_run,
-                    MAX(processed_at) as last_run
-                FROM etl_stats
-            """)
-            
-            stats = cursor.fetchone()
-            conn.close()
-            
-            return {
-                'total_etl_runs': stats[0],
-                'average_success_rate': round(stats[1] * 100, 2) if stats[1] else 0,
-                'total_records_loaded': stats[2],
-                'first_etl_run': stats[3],
-                'last_etl_run': stats[4]
-            }
+            return etl_health(self.etl_pipeline.db)
         
         except Exception as e:
             self.logger.error(f"❌ Erreur santé ETL: {e}")
             return {'error': str(e)}
+
+
+def etl_health(db) -> Dict:
+    """
+    Santé de l'ETL lue dans etl_stats (résultat en cache tant qu'aucun run
+    n'a écrit dans la base)
+
+    Args:
+        db: Instance `storage.Database` de la base traitée
+    """
+    stats = db.cache.query("""
+        SELECT 
+            COUNT(*) as total_etl_runs,
+            AVG(success_rate) as avg_success_rate,
+            SUM(records_loaded) as total_records_loaded,
+            MIN(processed_at) as first_run,
+            MAX(processed_at) as last_run
+        FROM etl_stats
+    """)[0]
+    
+    return {
+        'total_etl_runs': stats[0],
+        'average_success_rate': round(stats[1] * 100, 2) if stats[1] else 0,
+        'total_records_loaded': stats[2],
+        'first_etl_run': stats[3],
+        'last_etl_run': stats[4]
+    }
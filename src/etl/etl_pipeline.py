@@ -1,14 +1,26 @@
 # src/etl/etl_pipeline.py 
 import json
-import sqlite3
 import os
 from datetime import datetime
 from typing import Dict, List, Optional
 import logging
-import pandas as pd
+import time
 import requests
 from dotenv import load_dotenv
 
+from analytics import AudioFeatureIndex, processed_analytics, snapshot_from_records
+from metrics import REGISTRY
+from storage import ensure_processed_schema, get_database, ProcessedTrackWriter, utc_timestamp
+from utils.logger import RateLimitedLogger
+
+STAGE_SECONDS = REGISTRY.histogram('etl_stage_seconds', "Durée des étapes ETL par fichier brut", ['stage'])
+FILES_TOTAL = REGISTRY.counter('etl_files_total', "Fichiers bruts traités par statut", ['status'])
+RECORDS_LOADED = REGISTRY.counter('etl_records_loaded_total', "Enregistrements chargés dans processed_track_facts")
+SOUNDCHARTS_SECONDS = REGISTRY.histogram('soundcharts_request_seconds', "Latence des appels Soundcharts", ['endpoint'])
+SOUNDCHARTS_REQUESTS = REGISTRY.counter('soundcharts_requests_total', "Appels Soundcharts par statut HTTP",
+                                        ['endpoint', 'status'])
+SOUNDCHARTS_ENRICHED = REGISTRY.counter('soundcharts_tracks_enriched_total', "Tracks enrichis par Soundcharts")
+
 class ETLPipeline:
     """
     Pipeline ETL qui transforme les données brutes en données structurées
@@ -16,40 +28,26 @@ class ETLPipeline:
     
     def __init__(self, db_path: str = '/data/processed_music_weather.db'):
         self.db_path = db_path
+        # Écrivain unique (WAL) + pool de lecture, au lieu d'une connexion par appel
+        self.db = get_database(db_path)
         self.logger = logging.getLogger(__name__)
+        # Messages par fichier / par track : limités pour ne pas sérialiser les gros batchs
+        self.hot_log = RateLimitedLogger(self.logger)
+        self.track_writer = ProcessedTrackWriter()
         self._init_processed_db()
+        # Moteurs d'analyse en flux, mis à jour dans la transaction de chaque chargement
+        self.analytics = processed_analytics(self.db)
+        # Matrice des caractéristiques audio Soundcharts (plus proches voisins)
+        self.audio_index = AudioFeatureIndex.for_database(db_path)
 
     def _init_processed_db(self):
         os.makedirs('data', exist_ok=True)
 
-        conn = sqlite3.connect(self.db_path)
+        conn = self.db.writer
         cursor = conn.cursor()
 
-        # processed_tracks
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS processed_tracks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                processed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                city TEXT NOT NULL,
-                country TEXT NOT NULL,
-                track_name TEXT NOT NULL,
-                artist_name TEXT NOT NULL,
-                listeners INTEGER,
-                playcount INTEGER,
-                rank_position INTEGER,
-                weather_condition TEXT,
-                weather_description TEXT,
-                temperature REAL,
-                humidity INTEGER,
-                wind_speed REAL,
-                mood_category TEXT,
-                popularity_score REAL,
-                raw_data_path TEXT,
-                UNIQUE(city, track_name, artist_name, processed_at),
-                CHECK (listeners >= 0),
-                CHECK (playcount >= 0)
-            )
-        ''')
+        # processed_tracks (dimensions + table de faits + vue de compatibilité)
+        ensure_processed_schema(conn)
 
         # etl_stats
         cursor.execute('''
@@ -64,17 +62,6 @@ class ETLPipeline:
             )
         ''')
 
-        # indexes
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_city_weather 
-            ON processed_tracks(city, weather_condition)
-        ''')
-
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_mood_weather 
-            ON processed_tracks(mood_category, weather_condition)
-        ''')
-
         
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS soundcharts_tracks (
@@ -110,9 +97,12 @@ class ETLPipeline:
                 enriched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        # Filigrane (enriched_at, id) de l'export Parquet : un réenrichissement garde l'id
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_soundcharts_tracks_enriched ON soundcharts_tracks(enriched_at)"
+        )
 
         conn.commit()
-        conn.close()
         self.logger.info("✅ Base de données ETL initialisée")
     
     def extract_from_raw(self, raw_file_path: str) -> Optional[Dict]:
@@ -121,15 +111,44 @@ class ETLPipeline:
             with open(raw_file_path, 'r', encoding='utf-8') as f:
                 raw_data = json.load(f)
             
-            self.logger.info(f"📂 Données extraites de: {raw_file_path}")
+            self.hot_log.info("📂 Données extraites de: %s", raw_file_path)
             return raw_data
             
         except Exception as e:
             self.logger.error(f"❌ Erreur extraction {raw_file_path}: {e}")
             return None
     
-    def transform_track_data(self, track: Dict, weather_data: Dict, metadata: Dict) -> Optional[Dict]:
-        """Transforme une piste brute en données structurées"""
+    def transform_weather_observation(self, weather_data: Dict, metadata: Dict) -> Optional[Dict]:
+        """
+        Transforme le relevé météo brut d'un fichier en une observation unique,
+        partagée ensuite par toutes les pistes du snapshot
+        """
+        try:
+            # Instant du relevé OpenWeather (dt, epoch UTC) ou, à défaut, instant du traitement
+            if weather_data.get('dt'):
+                observed_at = datetime.utcfromtimestamp(int(weather_data['dt'])).strftime('%Y-%m-%d %H:%M:%S')
+            else:
+                observed_at = utc_timestamp()
+
+            return {
+                'city': metadata['city'],
+                'country': metadata['country'],
+                'observed_at': observed_at,
+                'main': weather_data['weather'][0]['main'] if weather_data.get('weather') else 'Unknown',
+                'description': weather_data['weather'][0]['description'] if weather_data.get('weather') else 'Unknown',
+                'temperature': weather_data['main'].get('temp', 0),
+                'humidity': weather_data['main'].get('humidity', 0),
+                'pressure': weather_data['main'].get('pressure'),
+                'wind_speed': weather_data['wind'].get('speed', 0),
+                'clouds': weather_data.get('clouds', {}).get('all')
+            }
+
+        except Exception as e:
+            self.logger.error(f"❌ Erreur transformation météo: {e}")
+            return None
+
+    def transform_track_data(self, track: Dict, metadata: Dict) -> Optional[Dict]:
+        """Transforme une piste brute en données structurées (la météo est portée par l'observation)"""
         try:
             # Extraction des données Last.fm
             track_name = track.get('name', '').strip()
@@ -140,22 +159,12 @@ class ETLPipeline:
             
             # Validation des données essentielles
             if not track_name or not artist_name:
-                self.logger.warning(f"Track ignorée - nom ou artiste manquant: {track_name} - {artist_name}")
+                self.hot_log.warning("Track ignorée - nom ou artiste manquant: %s - %s", track_name, artist_name)
                 return None
             
-            # Extraction des données météo
-            weather_main = weather_data['weather'][0]['main'] if weather_data.get('weather') else 'Unknown'
-            weather_desc = weather_data['weather'][0]['description'] if weather_data.get('weather') else 'Unknown'
-            temperature = weather_data['main'].get('temp', 0)
-            humidity = weather_data['main'].get('humidity', 0)
-            wind_speed = weather_data['wind'].get('speed', 0)
-            
             # Analyse d'humeur
             mood = self._analyze_mood(track_name, artist_name)
             
-            # Calcul du score de popularité
-            popularity_score = self._calculate_popularity_score(listeners, playcount)
-            
             transformed_data = {
                 'city': metadata['city'],
                 'country': metadata['country'],
@@ -164,15 +173,11 @@ class ETLPipeline:
                 'listeners': listeners,
                 'playcount': playcount,
                 'rank_position': rank,
-                'weather_condition': weather_main,
-                'weather_description': weather_desc,
-                'temperature': temperature,
-                'humidity': humidity,
-                'wind_speed': wind_speed,
                 'mood_category': mood,
-                'popularity_score': popularity_score,
+                # Calculé par lot, une fois toutes les pistes du fichier transformées
+                'popularity_score': None,
                 'raw_data_path': metadata.get('raw_file_path', ''),
-                'processed_at': datetime.now().isoformat()
+                'processed_at': utc_timestamp()
             }
             
             return transformed_data
@@ -201,71 +206,75 @@ class ETLPipeline:
         
         return max(mood_scores.items(), key=lambda x: x[1])[0] if mood_scores else 'neutral'
     
-    def _calculate_popularity_score(self, listeners: int, playcount: int) -> float:
-        """Calcule un score de popularité normalisé"""
-        if listeners == 0:
-            return 0.0
-        
-        # Score basé sur les listeners (normalisé à 10k max)
-        base_score = min(listeners / 10000, 1.0)
-        
-        # Bonus d'engagement (playcount par listener)
-        engagement_ratio = playcount / max(listeners, 1)
-        engagement_bonus = min(engagement_ratio * 0.1, 0.2)  # Max 0.2 bonus
-        
-        return round(base_score + engagement_bonus, 3)
-    
-
-    
-        
-
-    def load_transformed_data(self, transformed_data: List[Dict], raw_file_path: str) -> Dict:
-        """Charge les données transformées dans la base"""
+    def _score_popularity(self, records: List[Dict]):
+        """
+        Scores de popularité d'un lot de pistes, vectorisés par pays : percentiles des
+        listeners et de l'engagement dans la distribution du pays (moteur `popularity`,
+        mis à jour au chargement), sans relire la table
+        """
+        engine = self.analytics.get('popularity')
+        by_country: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_country.setdefault(record['country'], []).append(record)
+        for country, group in by_country.items():
+            scores = engine.score(country, [record['listeners'] for record in group],
+                                  [record['playcount'] for record in group])
+            for record, score in zip(group, scores.tolist()):
+                record['popularity_score'] = score
+
+    def load_transformed_data(self, transformed_data: List[Dict], raw_file_path: str,
+                              observation: Optional[Dict] = None) -> Dict:
+        """Charge les données transformées dans la base (le relevé météo est écrit une seule fois)"""
         start_time = datetime.now()
         records_processed = len(transformed_data)
         records_loaded = 0
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            for record in transformed_data:
-                try:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO processed_tracks 
-                        (city, country, track_name, artist_name, listeners, playcount, 
-                         rank_position, weather_condition, weather_description, temperature,
-                         humidity, wind_speed, mood_category, popularity_score, raw_data_path)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        record['city'], record['country'], record['track_name'],
-                        record['artist_name'], record['listeners'], record['playcount'],
-                        record['rank_position'], record['weather_condition'], record['weather_description'],
-                        record['temperature'], record['humidity'], record['wind_speed'],
-                        record['mood_category'], record['popularity_score'], record['raw_data_path']
-                    ))
-                    records_loaded += 1
-                    
-                except Exception as e:
-                    self.logger.warning(f"Erreur chargement {record['track_name']}: {e}")
-                    continue
-            
-            conn.commit()
-            
-            # Log des statistiques ETL
-            processing_time = (datetime.now() - start_time).total_seconds()
-            success_rate = records_loaded / records_processed if records_processed > 0 else 0
-            
-            cursor.execute('''
-                INSERT INTO etl_stats 
-                (raw_file_path, records_processed, records_loaded, success_rate, processing_time_seconds)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (raw_file_path, records_processed, records_loaded, success_rate, processing_time))
-            
-            conn.commit()
-            conn.close()
+            # Une seule transaction pour le relevé, les tracks et la ligne etl_stats
+            with self.db.write() as conn:
+                cursor = conn.cursor()
+                
+                observation_id = None
+                if observation:
+                    observation_id = self.track_writer.write_observation(
+                        cursor, observation['city'], observation['country'],
+                        observation['observed_at'], observation
+                    )
+                
+                # Un savepoint par record : un record en erreur est annulé en entier
+                # (fait, dimensions et agrégats), le reste du fichier est chargé
+                inserted = []
+                for record in transformed_data:
+                    cursor.execute("SAVEPOINT load_record")
+                    try:
+                        if self.track_writer.write(cursor, record, observation_id):
+                            inserted.append(record)
+                        cursor.execute("RELEASE load_record")
+                        records_loaded += 1
+                        
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO load_record")
+                        cursor.execute("RELEASE load_record")
+                        # Les identifiants mis en cache pendant le record ont pu être annulés
+                        self.track_writer.clear_caches()
+                        self.hot_log.warning("Erreur chargement %s: %s", record['track_name'], e)
+                        continue
+                
+                # Moteurs d'analyse : mêmes lignes que les faits (doublons exclus)
+                self.analytics.observe(cursor, [snapshot_from_records(inserted, observation)])
+                
+                # Log des statistiques ETL
+                processing_time = (datetime.now() - start_time).total_seconds()
+                success_rate = records_loaded / records_processed if records_processed > 0 else 0
+                
+                cursor.execute('''
+                    INSERT INTO etl_stats 
+                    (raw_file_path, records_processed, records_loaded, success_rate, processing_time_seconds)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (raw_file_path, records_processed, records_loaded, success_rate, processing_time))
             
-            self.logger.info(f"✅ ETL réussi: {records_loaded}/{records_processed} records chargés")
+            RECORDS_LOADED.inc(records_loaded)
+            self.hot_log.info("✅ ETL réussi: %d/%d records chargés", records_loaded, records_processed)
             
             return {
                 'status': 'success',
@@ -276,6 +285,8 @@ class ETLPipeline:
             }
             
         except Exception as e:
+            self.track_writer.clear_caches()
+            self.analytics.discard()
             self.logger.error(f"❌ Erreur chargement ETL: {e}")
             return {
                 'status': 'failure',
@@ -302,15 +313,14 @@ class ETLPipeline:
             "x-api-key": api_key
         }
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Récupérer TOUS les tracks distincts
-        cursor.execute("""
-            SELECT DISTINCT track_name, artist_name
-            FROM processed_tracks
-        """)
-        tracks = cursor.fetchall()
+        # Récupérer TOUS les tracks distincts (directement depuis les dimensions)
+        with self.db.read() as conn:
+            tracks = conn.execute("""
+                SELECT t.name, a.name
+                FROM dim_track t
+                JOIN dim_artist a ON a.id = t.artist_id
+                WHERE t.id IN (SELECT track_id FROM processed_track_facts)
+            """).fetchall()
 
         print(f"🔍 {len(tracks)} tracks à enrichir")
 
@@ -329,7 +339,7 @@ class ETLPipeline:
                     "artist": artist_name
                 }
 
-                r = requests.get(search_url, headers=HEADERS, params=params)
+                r = self._soundcharts_get('search', search_url, HEADERS, params)
                 r.raise_for_status()
                 search_json = r.json()
 
@@ -346,7 +356,7 @@ class ETLPipeline:
                 # --------------------------------------------------------------
                 detail_url = f"https://customer.api.soundcharts.com/api/v2.25/song/{uuid}"
 
-                r2 = requests.get(detail_url, headers=HEADERS)
+                r2 = self._soundcharts_get('song', detail_url, HEADERS)
                 r2.raise_for_status()
                 obj = r2.json()
 
@@ -354,59 +364,95 @@ class ETLPipeline:
 
                 audio = song_obj.get("audio", {})
 
-                cursor.execute("""
-                    INSERT OR REPLACE INTO soundcharts_tracks (
-                        track_name, artist_name, uuid,
-                        release_date, image_url, credit_name,
-                        isrc, isrc_country_code, isrc_country_name,
-                        genres, labels,
-                        acousticness, danceability, energy, instrumentalness, key, liveness,
-                        loudness, mode, speechiness, tempo, time_signature, valence
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    track_name,
-                    artist_name,
-                    song_obj.get("uuid"),
-                    song_obj.get("releaseDate"),
-                    song_obj.get("imageUrl"),
-                    song_obj.get("creditName"),
-                    song_obj.get("isrc", {}).get("value"),
-                    song_obj.get("isrc", {}).get("countryCode"),
-                    song_obj.get("isrc", {}).get("countryName"),
-                    json.dumps(song_obj.get("genres", [])),
-                    json.dumps(song_obj.get("labels", [])),
-                    audio.get("acousticness"),
-                    audio.get("danceability"),
-                    audio.get("energy"),
-                    audio.get("instrumentalness"),
-                    audio.get("key"),
-                    audio.get("liveness"),
-                    audio.get("loudness"),
-                    audio.get("mode"),
-                    audio.get("speechiness"),
-                    audio.get("tempo"),
-                    audio.get("timeSignature"),
-                    audio.get("valence")
-                ))
+                # Transaction courte par track : aucun verrou tenu pendant les appels HTTP.
+                # Mise à jour sur place d'un uuid déjà enrichi : son id (position dans
+                # l'index audio) ne change pas
+                with self.db.write() as conn:
+                    conn.execute("""
+                        INSERT INTO soundcharts_tracks (
+                            track_name, artist_name, uuid,
+                            release_date, image_url, credit_name,
+                            isrc, isrc_country_code, isrc_country_name,
+                            genres, labels,
+                            acousticness, danceability, energy, instrumentalness, key, liveness,
+                            loudness, mode, speechiness, tempo, time_signature, valence
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (uuid) DO UPDATE SET
+                            track_name = excluded.track_name, artist_name = excluded.artist_name,
+                            release_date = excluded.release_date, image_url = excluded.image_url,
+                            credit_name = excluded.credit_name, isrc = excluded.isrc,
+                            isrc_country_code = excluded.isrc_country_code,
+                            isrc_country_name = excluded.isrc_country_name,
+                            genres = excluded.genres, labels = excluded.labels,
+                            acousticness = excluded.acousticness, danceability = excluded.danceability,
+                            energy = excluded.energy, instrumentalness = excluded.instrumentalness,
+                            key = excluded.key, liveness = excluded.liveness, loudness = excluded.loudness,
+                            mode = excluded.mode, speechiness = excluded.speechiness, tempo = excluded.tempo,
+                            time_signature = excluded.time_signature, valence = excluded.valence,
+                            enriched_at = CURRENT_TIMESTAMP
+                    """, (
+                        track_name,
+                        artist_name,
+                        song_obj.get("uuid"),
+                        song_obj.get("releaseDate"),
+                        song_obj.get("imageUrl"),
+                        song_obj.get("creditName"),
+                        song_obj.get("isrc", {}).get("value"),
+                        song_obj.get("isrc", {}).get("countryCode"),
+                        song_obj.get("isrc", {}).get("countryName"),
+                        json.dumps(song_obj.get("genres", [])),
+                        json.dumps(song_obj.get("labels", [])),
+                        audio.get("acousticness"),
+                        audio.get("danceability"),
+                        audio.get("energy"),
+                        audio.get("instrumentalness"),
+                        audio.get("key"),
+                        audio.get("liveness"),
+                        audio.get("loudness"),
+                        audio.get("mode"),
+                        audio.get("speechiness"),
+                        audio.get("tempo"),
+                        audio.get("timeSignature"),
+                        audio.get("valence")
+                    ))
+                SOUNDCHARTS_ENRICHED.inc()
             except requests.exceptions.HTTPError as e:
                 print(f"❌ HTTP Error {track_name} - {artist_name}: {e}")
             except Exception as e:
                 print(f"❌ Erreur pour {track_name} - {artist_name}: {e}")
 
-        conn.commit()
-        conn.close()
-
         print(f"🎉 Enrichissement terminé → {len(enriched_tracks)} tracks enrichis")
+        # Nouveaux morceaux ajoutés à l'index audio, morceaux réenrichis réécrits sur place
+        self.audio_index.refresh(self.db)
         return enriched_tracks
 
+    def _soundcharts_get(self, endpoint: str, url: str, headers: Dict, params: Optional[Dict] = None):
+        """GET Soundcharts instrumenté : latence et statut (code HTTP ou erreur réseau) par endpoint"""
+        started = time.perf_counter()
+        try:
+            response = requests.get(url, headers=headers, params=params)
+        except requests.exceptions.RequestException:
+            SOUNDCHARTS_REQUESTS.labels(endpoint, 'network_error').inc()
+            raise
+        finally:
+            SOUNDCHARTS_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        SOUNDCHARTS_REQUESTS.labels(endpoint, response.status_code).inc()
+        return response
+
         
     def run_etl_for_raw_file(self, raw_file_path: str) -> Dict:
         """Exécute le pipeline ETL complet pour un fichier brut"""
-        self.logger.info(f"🚀 Début ETL pour: {raw_file_path}")
+        result = self._run_etl_stages(raw_file_path)
+        FILES_TOTAL.labels(result.get('status', 'unknown')).inc()
+        return result
+    
+    def _run_etl_stages(self, raw_file_path: str) -> Dict:
+        self.hot_log.info("🚀 Début ETL pour: %s", raw_file_path)
         
         # E - EXTRACTION
-        raw_data = self.extract_from_raw(raw_file_path)
+        with STAGE_SECONDS.labels('extract').time():
+            raw_data = self.extract_from_raw(raw_file_path)
         if not raw_data:
             self.logger.error(f"❌ Échec extraction pour {raw_file_path}")
             return {'status': 'extraction_failed', 'file': raw_file_path}
@@ -417,6 +463,7 @@ class ETLPipeline:
             return {'status': 'invalid_data', 'file': raw_file_path}
         
         # T - TRANSFORMATION
+        transform_started = time.perf_counter()
         transformed_data = []
         
         # Accès sécurisé aux données Last.fm
@@ -428,22 +475,28 @@ class ETLPipeline:
         metadata = raw_data.get('metadata', {})
         metadata['raw_file_path'] = raw_file_path
         
-        self.logger.info(f"📊 {len(tracks)} tracks à transformer")
+        self.hot_log.info("📊 %d tracks à transformer", len(tracks))
+        
+        observation = self.transform_weather_observation(weather_data, metadata)
+        if not observation:
+            self.logger.warning(f"⚠️  Relevé météo inexploitable pour {raw_file_path}")
+            return {'status': 'transformation_failed', 'file': raw_file_path}
         
         for track in tracks:
-            transformed_track = self.transform_track_data(track, weather_data, metadata)
+            transformed_track = self.transform_track_data(track, metadata)
             if transformed_track:
                 transformed_data.append(transformed_track)
         
+        self._score_popularity(transformed_data)
+        STAGE_SECONDS.labels('transform').observe(time.perf_counter() - transform_started)
+        
         if not transformed_data:
             self.logger.warning(f"⚠️  Aucune donnée transformée pour {raw_file_path}")
             return {'status': 'transformation_failed', 'file': raw_file_path}
     
-                
-        conn = sqlite3.connect('data/processed_music_weather.db')
-        pd.read_sql("SELECT * FROM soundcharts_tracks", conn)
-
-        load_result = self.load_transformed_data(transformed_data, raw_file_path)
+        # L - CHARGEMENT
+        with STAGE_SECONDS.labels('load').time():
+            load_result = self.load_transformed_data(transformed_data, raw_file_path, observation)
     
         return {
             'file': raw_file_path,
@@ -452,8 +505,3 @@ class ETLPipeline:
             'records_loaded': len(load_result),
             **load_result
         }
-
-
-    def _get_connection(self):
-        """Retourne une connexion à la base de données"""
-        return sqlite3.connect(self.db_path)
\ No newline at end of file
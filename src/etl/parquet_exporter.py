@@ -0,0 +1,226 @@
+# src/etl/parquet_exporter.py
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from storage import get_database
+
+
+# Tables exportées : base source, requête (colonne date + colonne pays incluses)
+# et colonnes du filigrane incrémental, dans l'ordre de la requête. Par défaut l'id
+# (AUTOINCREMENT, croissant) ; soundcharts_tracks est mis à jour sur place par un
+# réenrichissement (même id) : son filigrane est (enriched_at, id)
+EXPORT_TABLES = {
+    'processed_tracks': {
+        'database': 'processed',
+        'query': '''
+            SELECT *, substr(processed_at, 1, 10) AS date
+            FROM processed_tracks
+            WHERE id > ?
+            ORDER BY id
+        '''
+    },
+    'city_music_trends': {
+        'database': 'trends',
+        'query': '''
+            SELECT *, substr(timestamp, 1, 10) AS date
+            FROM city_music_trends
+            WHERE id > ?
+            ORDER BY id
+        '''
+    },
+    'soundcharts_tracks': {
+        'database': 'processed',
+        'query': '''
+            SELECT *, substr(enriched_at, 1, 10) AS date,
+                   COALESCE(isrc_country_code, 'unknown') AS country
+            FROM soundcharts_tracks
+            WHERE (enriched_at, id) > (?, ?)
+            ORDER BY enriched_at, id
+        ''',
+        'watermark': ['enriched_at', 'id']
+    }
+}
+
+PARTITION_COLUMNS = ['date', 'country']
+
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]), flavor='hive')
+
+
+class ParquetExporter:
+    """
+    Export incrémental des tables traitées vers Parquet, partitionné par date et pays
+    (layout Hive : <table>/date=YYYY-MM-DD/country=XX/part-*.parquet).
+
+    Seules les lignes au-delà du filigrane (dernier id exporté, ou dernier
+    (enriched_at, id) pour soundcharts_tracks) sont lues ; les nouveaux fichiers
+    s'ajoutent aux partitions existantes sans les réécrire. Un morceau réenrichi est
+    donc exporté de nouveau : garder sa ligne au enriched_at le plus récent par id.
+    """
+
+    def __init__(self, processed_db_path: str = 'data/processed_music_weather.db',
+                 trends_db_path: str = 'data/lastfm_weather.db',
+                 export_dir: str = 'data/exports',
+                 chunk_size: int = 50000):
+        self.logger = logging.getLogger(__name__)
+        self.db_paths = {
+            'processed': processed_db_path,
+            'trends': trends_db_path
+        }
+        self.export_dir = export_dir
+        self.chunk_size = chunk_size
+        self.state_path = os.path.join(export_dir, '_export_state.json')
+
+    def export_all(self, tables: Optional[List[str]] = None) -> Dict:
+        """Exporte les nouvelles lignes de chaque table ; retourne le nombre de lignes par table"""
+        results = {}
+
+        for table in tables or list(EXPORT_TABLES):
+            try:
+                results[table] = self.export_table(table)
+            except Exception as e:
+                self.logger.error(f"❌ Erreur export Parquet {table}: {e}")
+                results[table] = {'error': str(e)}
+
+        self.logger.info(f"📦 Export Parquet terminé: {results}")
+        return results
+
+    def export_table(self, table: str) -> int:
+        """
+        Exporte les lignes de `table` ajoutées (ou réenrichies) depuis le dernier export.
+        Le filigrane est enregistré après chaque fichier écrit : un export
+        interrompu reprend là où il s'était arrêté, sans doublons.
+
+        Returns:
+            Nombre de lignes exportées
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        spec = EXPORT_TABLES[table]
+        db_path = self.db_paths[spec['database']]
+        if not os.path.exists(db_path):
+            self.logger.warning(f"⚠️  Base introuvable pour {table}: {db_path}")
+            return 0
+
+        state = self._load_state()
+        watermark = spec.get('watermark', ['id'])
+        since = self._watermark(db_path, table, watermark, state.get(table))
+
+        run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        target_dir = os.path.join(self.export_dir, table)
+        partitioning = _partitioning()
+
+        exported = 0
+        # Connexion du pool en lecture seule : l'export ne bloque pas les écritures (WAL)
+        with get_database(db_path).read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(spec['query'], since)
+            columns = [d[0] for d in cursor.description]
+            schema = self._arrow_schema(conn, table, columns)
+            watermark_indexes = [columns.index(name) for name in watermark]
+
+            chunk_number = 0
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+
+                # Construction colonne par colonne, sans passer par pandas
+                arrays = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+                for name in PARTITION_COLUMNS:
+                    arrays[name] = [value if value else 'unknown' for value in arrays[name]]
+                chunk = pa.table(arrays, schema=schema)
+
+                ds.write_dataset(
+                    chunk, target_dir,
+                    format='parquet',
+                    partitioning=partitioning,
+                    basename_template=f"part-{run_id}-{chunk_number}-{{i}}.parquet",
+                    existing_data_behavior='overwrite_or_ignore'
+                )
+
+                exported += len(rows)
+                chunk_number += 1
+                last = [rows[-1][i] for i in watermark_indexes]
+                state[table] = last[0] if len(last) == 1 else last
+                self._save_state(state)
+
+        if exported:
+            self.logger.info(f"📦 {table}: {exported} nouvelles lignes exportées "
+                             f"({', '.join(watermark)} ≤ {state[table]})")
+        return exported
+
+    def _watermark(self, db_path: str, table: str, columns: List[str], value) -> tuple:
+        """Paramètres de la requête d'export depuis le filigrane enregistré (aucun : tout)"""
+        if len(columns) == 1:
+            return (value or 0,)
+        if isinstance(value, list):
+            return tuple(value)
+        if value is None:
+            return ('', 0)
+        # Ancien filigrane (id seul) : les lignes jusqu'à cet id ont été exportées
+        # avec leur enriched_at d'alors, on reprend à celui de la dernière
+        with get_database(db_path).read() as conn:
+            row = conn.execute(
+                f"SELECT {columns[0]}, id FROM {table} WHERE id <= ? ORDER BY id DESC LIMIT 1", (value,)
+            ).fetchone()
+        return tuple(row) if row else ('', 0)
+
+    def _arrow_schema(self, conn, table: str, columns: List[str]):
+        """Schéma Arrow dérivé des types SQLite déclarés (stable d'un export à l'autre)"""
+        import pyarrow as pa
+
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        declared = {row[1]: (row[2] or '').upper() for row in cursor.fetchall()}
+
+        fields = []
+        for name in columns:
+            sql_type = declared.get(name, 'TEXT')
+            if 'INT' in sql_type:
+                arrow_type = pa.int64()
+            elif 'REAL' in sql_type or 'FLOA' in sql_type or 'DOUB' in sql_type:
+                arrow_type = pa.float64()
+            else:
+                arrow_type = pa.string()
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema(fields)
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self, state: Dict):
+        os.makedirs(self.export_dir, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+
+def read_parquet_export(table: str, columns: Optional[List[str]] = None, filter=None,
+                        export_dir: str = 'data/exports'):
+    """
+    Lit un export Parquet en ne chargeant que les colonnes et partitions demandées.
+    Retourne une pyarrow.Table (lecture zero-copy) ; `.to_pandas()` si besoin.
+
+    Exemple :
+        import pyarrow.dataset as ds
+        read_parquet_export('processed_tracks', ['city', 'mood_category'],
+                            (ds.field('country') == 'France') & (ds.field('date') >= '2024-01-01'))
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(os.path.join(export_dir, table), format='parquet', partitioning=_partitioning())
+    return dataset.to_table(columns=columns, filter=filter)
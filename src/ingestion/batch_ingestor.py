@@ -7,8 +7,20 @@ import os
 import json
 from dotenv import load_dotenv
 
+from metrics import REGISTRY
+from storage import get_database
+from utils.profiling import get_profiler
+
 from .raw_data_ingestor import RawDataIngestor, IngestionResult
 
+INGESTION_METADATA_DB = 'data/ingestion_metadata.db'
+
+BATCH_SECONDS = REGISTRY.histogram('ingestion_batch_seconds', "Durée des lots d'ingestion",
+                                   buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+BATCH_CITIES = REGISTRY.counter('ingestion_cities_total', "Villes ingérées par résultat", ['result'])
+BATCH_RECORDS = REGISTRY.counter('ingestion_records_total', "Records bruts ingérés")
+LAST_BATCH = REGISTRY.gauge('ingestion_last_batch_timestamp_seconds', "Fin du dernier lot (secondes Unix)")
+
 
 class BatchIngestor:
     """
@@ -72,25 +84,32 @@ class BatchIngestor:
         if batch_size:
             cities_to_process = cities_to_process[:batch_size]
 
-        for city, country in cities_to_process:
-            self.logger.info(f"🍽️  Ingestion de {city}, {country}")
-            result = self.ingestor.ingest_city_data(city, country)
+        profiler = get_profiler()
+        with profiler.phase('ingest'):
+            for city, country in cities_to_process:
+                self.logger.info(f"🍽️  Ingestion de {city}, {country}")
+                result = self.ingestor.ingest_city_data(city, country)
+                BATCH_CITIES.labels('success' if result.success else 'failure').inc()
+                BATCH_RECORDS.inc(result.records_ingested)
 
-            results.append({
-                'city': city,
-                'country': country,
-                'result': result
-            })
+                results.append({
+                    'city': city,
+                    'country': country,
+                    'result': result
+                })
 
-            time.sleep(float(os.getenv('INGESTION_DELAY', 2.0)))
+                time.sleep(float(os.getenv('INGESTION_DELAY', 2.0)))
 
         batch_stats = self._calculate_batch_stats(results)
         batch_stats['total_processing_time'] = (datetime.now() - start_time).total_seconds()
+        BATCH_SECONDS.observe(batch_stats['total_processing_time'])
+        LAST_BATCH.set(time.time())
         batch_stats['batch_completed_at'] = datetime.now().isoformat()
 
         self.logger.info(f"📊 Batch terminé: {batch_stats}")
 
-        self._save_batch_report(batch_stats, results)
+        with profiler.phase('report'):
+            self._save_batch_report(batch_stats, results)
 
         return {
             'batch_stats': batch_stats,
@@ -158,32 +177,36 @@ class BatchIngestor:
     # ---------------------------------------------------------
     def get_ingestion_health(self) -> Dict:
         try:
-            import sqlite3
-            conn = sqlite3.connect('data/ingestion_metadata.db')
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as ok,
-                    AVG(processing_time_seconds),
-                    SUM(source_anomalies_count),
-                    MIN(timestamp),
-                    MAX(timestamp)
-                FROM ingestion_log
-            ''')
-
-            stats = cursor.fetchone()
-            conn.close()
-
-            return {
-                'total_ingestions': stats[0],
-                'success_rate': (stats[1] / stats[0] * 100) if stats[0] else 0,
-                'avg_processing_time_seconds': round(stats[2], 2) if stats[2] else 0,
-                'total_anomalies_detected': stats[3],
-                'system_uptime': f"{stats[4]} to {stats[5]}" if stats[4] else "N/A"
-            }
+            return ingestion_health(get_database(INGESTION_METADATA_DB))
 
         except Exception as e:
             self.logger.error(f"❌ Erreur santé ingestion: {e}")
             return {'error': str(e)}
+
+
+def ingestion_health(db) -> Dict:
+    """
+    Santé de l'ingestion lue dans ingestion_log (résultat en cache tant
+    qu'aucune ingestion n'a écrit dans le journal)
+
+    Args:
+        db: Instance `storage.Database` de la base de métadonnées d'ingestion
+    """
+    stats = db.cache.query('''
+        SELECT 
+            COUNT(*) as total,
+            SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as ok,
+            AVG(processing_time_seconds),
+            SUM(source_anomalies_count),
+            MIN(timestamp),
+            MAX(timestamp)
+        FROM ingestion_log
+    ''')[0]
+
+    return {
+        'total_ingestions': stats[0],
+        'success_rate': (stats[1] / stats[0] * 100) if stats[0] else 0,
+        'avg_processing_time_seconds': round(stats[2], 2) if stats[2] else 0,
+        'total_anomalies_detected': stats[3],
+        'system_uptime': f"{stats[4]} to {stats[5]}" if stats[4] else "N/A"
+    }
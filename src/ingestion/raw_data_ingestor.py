@@ -10,6 +10,12 @@ import time
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
+from metrics import REGISTRY
+from utils.logger import RateLimitedLogger
+
+FETCH_SECONDS = REGISTRY.histogram('ingestion_fetch_seconds', "Latence des appels aux API sources", ['provider'])
+FETCH_TOTAL = REGISTRY.counter('ingestion_fetch_total', "Appels aux API sources par statut HTTP", ['provider', 'status'])
+
 @dataclass
 class IngestionResult:
     """Résultat d'une opération d'ingestion"""
@@ -29,6 +35,8 @@ class RawDataIngestor:
         self.lastfm_api_key = LASTFM_API_KEY
         self.weather_api_key = OPENWEATHER_API_KEY
         self.logger = logging.getLogger(__name__)
+        # Messages par appel API / par fichier, limités en débit
+        self.hot_log = RateLimitedLogger(self.logger)
         
         # Vérification des clés
         if not self.lastfm_api_key :
@@ -70,6 +78,19 @@ class RawDataIngestor:
         conn.close()
         self.logger.info("✅ Base de métadonnées d'ingestion initialisée")
     
+    def _timed_get(self, provider: str, url: str, params: Dict) -> requests.Response:
+        """GET instrumenté : latence et statut (code HTTP ou erreur réseau) par fournisseur"""
+        started = time.perf_counter()
+        try:
+            response = requests.get(url, params=params, timeout=10)
+        except requests.exceptions.RequestException:
+            FETCH_TOTAL.labels(provider, 'network_error').inc()
+            raise
+        finally:
+            FETCH_SECONDS.labels(provider).observe(time.perf_counter() - started)
+        FETCH_TOTAL.labels(provider, response.status_code).inc()
+        return response
+    
     def _fetch_lastfm_data(self, country: str) -> Optional[Dict]:
         """Récupère les données Last.fm avec gestion d'erreurs améliorée"""
         if not self.lastfm_api_key or self.lastfm_api_key == "votre_cle_lastfm_ici":
@@ -88,13 +109,13 @@ class RawDataIngestor:
                     'limit': 10  # Réduit pour tests
                 }
                 
-                self.logger.debug(f"🔗 Tentative {attempt + 1} Last.fm pour {country}")
-                response = requests.get(url, params=params, timeout=10)
+                self.hot_log.debug("🔗 Tentative %d Last.fm pour %s", attempt + 1, country)
+                response = self._timed_get('lastfm', url, params)
                 
                 if response.status_code == 200:
                     data = response.json()
                     if 'tracks' in data and 'track' in data['tracks']:
-                        self.logger.info(f"✅ Last.fm réussi pour {country}: {len(data['tracks']['track'])} tracks")
+                        self.hot_log.info("✅ Last.fm réussi pour %s: %d tracks", country, len(data['tracks']['track']))
                         return data
                     else:
                         self.logger.warning(f"⚠️  Structure Last.fm invalide pour {country}")
@@ -130,12 +151,12 @@ class RawDataIngestor:
                     'lang': 'fr'
                 }
                 
-                self.logger.debug(f"🌤️  Tentative {attempt + 1} météo pour {city}")
-                response = requests.get(url, params=params, timeout=10)
+                self.hot_log.debug("🌤️  Tentative %d météo pour %s", attempt + 1, city)
+                response = self._timed_get('openweather', url, params)
                 
                 if response.status_code == 200:
                     data = response.json()
-                    self.logger.info(f"✅ Météo récupérée pour {city}: {data['weather'][0]['main']}")
+                    self.hot_log.info("✅ Météo récupérée pour %s: %s", city, data['weather'][0]['main'])
                     return data
                 else:
                     self.logger.warning(f"⚠️  Météo status {response.status_code} pour {city}")
@@ -251,7 +272,7 @@ class RawDataIngestor:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(raw_data, f, indent=2, ensure_ascii=False)
             
-            self.logger.info(f"💾 Données brutes sauvegardées: {filepath}")
+            self.hot_log.info("💾 Données brutes sauvegardées: %s", filepath)
             return filepath
             
         except Exception as e:
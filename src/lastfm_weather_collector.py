@@ -1,15 +1,22 @@
 # src/lastfm_weather_collector.py
 import requests
-import sqlite3
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import json
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from utils.logger import setup_logging
+from analytics import biggest_movers, trend_analytics, snapshots_from_points
+from metrics import REGISTRY
+from utils.logger import setup_logging, RateLimitedLogger
 from utils.helpers import load_config, backup_database, validate_environment
+from utils.profiling import get_profiler
+from storage import (ensure_trends_schema, get_database, TrendWriter, RetentionManager,
+                     utc_timestamp, epoch_seconds, hour_bucket, day_bucket)
+
+FLUSH_SECONDS = REGISTRY.histogram('collector_flush_seconds', "Durée d'un vidage du tampon d'écriture du collecteur")
+ROWS_WRITTEN = REGISTRY.counter('collector_rows_total', "Points du collecteur par résultat d'écriture", ['result'])
 
 class LastFmWeatherCollector:
     """
@@ -30,6 +37,8 @@ class LastFmWeatherCollector:
         
         # Setup logging
         self.logger = setup_logging()
+        # Messages par track : formatés seulement s'ils sont émis, et limités en débit
+        self.hot_log = RateLimitedLogger(self.logger)
         
         # Setup database
         self.setup_database()
@@ -42,30 +51,24 @@ class LastFmWeatherCollector:
             # Créer le dossier data si nécessaire
             os.makedirs('data', exist_ok=True)
             
-            self.conn = sqlite3.connect('data/lastfm_weather.db')
+            # Écrivain unique (WAL) partagé par le processus ; les lectures passent par le pool
+            self.db = get_database('data/lastfm_weather.db')
+            self.conn = self.db.writer
             cursor = self.conn.cursor()
             
-            # Table principale des tendances
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS city_music_trends (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    city TEXT NOT NULL,
-                    country TEXT NOT NULL,
-                    track_name TEXT NOT NULL,
-                    artist_name TEXT NOT NULL,
-                    listeners INTEGER DEFAULT 0,
-                    playcount INTEGER DEFAULT 0,
-                    rank INTEGER DEFAULT 0,
-                    weather_main TEXT,
-                    weather_description TEXT,
-                    temperature REAL,
-                    humidity INTEGER,
-                    pressure INTEGER,
-                    mood_category TEXT,
-                    UNIQUE(city, track_name, artist_name, timestamp)
-                )
-            ''')
+            # Tables de dimension + table de faits + vue city_music_trends
+            ensure_trends_schema(self.conn)
+            self.trend_writer = TrendWriter()
+            # Moteurs d'analyse en flux (corrélation météo-humeur...) : état persisté
+            # dans la base, mis à jour dans la transaction de chaque flush
+            self.analytics = trend_analytics(self.db)
+            self.retention = RetentionManager(self.db, 'trend_facts')
+            
+            # Tampon d'écriture différée : vidé en une transaction par ville
+            # (COLLECTOR_FLUSH_MODE=city) ou une seule par cycle (cycle)
+            self.flush_mode = os.getenv('COLLECTOR_FLUSH_MODE', 'city')
+            self.write_buffer: List[Dict] = []
+            self.write_stats = self._empty_write_stats()
             
             # Table des statistiques quotidiennes
             cursor.execute('''
@@ -81,16 +84,6 @@ class LastFmWeatherCollector:
                 )
             ''')
             
-            # Index pour les performances
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_city_timestamp 
-                ON city_music_trends(city, timestamp)
-            ''')
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_weather_mood 
-                ON city_music_trends(weather_main, mood_category)
-            ''')
-            
             self.conn.commit()
             self.logger.info("Base de données initialisée avec succès")
             
@@ -148,7 +141,7 @@ class LastFmWeatherCollector:
                         tracks.append(track_info)
                         
                 except (KeyError, ValueError) as e:
-                    self.logger.warning(f"Erreur parsing track {rank}: {e}")
+                    self.hot_log.warning("Erreur parsing track %s: %s", rank, e)
                     continue
             
             self.logger.info(f"Récupéré {len(tracks)} tracks pour {country}")
@@ -243,14 +236,15 @@ class LastFmWeatherCollector:
         # Retourner l'humeur dominante
         if mood_scores:
             dominant_mood = max(mood_scores.items(), key=lambda x: x[1])[0]
-            self.logger.debug(f"Mood analysis: '{track_name}' → {dominant_mood}")
+            self.hot_log.debug("Mood analysis: '%s' → %s", track_name, dominant_mood)
             return dominant_mood
         else:
             return 'neutral'
     
     def save_data_point(self, data: Dict) -> bool:
         """
-        Sauvegarde un point de données en base avec gestion des doublons
+        Sauvegarde immédiatement un point de données en base avec gestion des doublons
+        (une transaction par point ; la collecte passe par `buffer_data_point`)
         
         Args:
             data: Dictionnaire contenant les données à sauvegarder
@@ -259,27 +253,78 @@ class LastFmWeatherCollector:
             True si sauvegardé avec succès, False sinon
         """
         try:
-            cursor = self.conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO city_music_trends 
-                (city, country, track_name, artist_name, listeners, playcount, rank,
-                 weather_main, weather_description, temperature, humidity, pressure, mood_category)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data['city'], data['country'], data['track_name'],
-                data['artist_name'], data['listeners'], data['playcount'], data['rank'],
-                data['weather_main'], data['weather_description'], data['temperature'],
-                data['humidity'], data.get('pressure', 0), data['mood_category']
-            ))
-            
-            self.conn.commit()
+            with self.db.write() as conn:
+                cursor = conn.cursor()
+                if self.trend_writer.write(cursor, data):
+                    self.analytics.observe(cursor, snapshots_from_points([data]))
             return True
             
         except Exception as e:
+            self.trend_writer.clear_caches()
+            self.analytics.discard()
             self.logger.error(f"Erreur sauvegarde données: {e}")
             return False
     
+    def buffer_data_point(self, data: Dict):
+        """Met un point de données en attente d'écriture (voir `flush_write_buffer`)"""
+        self.write_buffer.append(data)
+    
+    def flush_write_buffer(self) -> List[Tuple[Dict, bool]]:
+        """
+        Écrit les points en attente dans une seule transaction (executemany sur les faits,
+        agrégats sommés). Si le lot échoue, il est rejoué point par point pour que chaque
+        ligne garde son propre statut.
+        
+        Returns:
+            Couples (point, sauvegardé) dans l'ordre du tampon
+        """
+        if not self.write_buffer:
+            return []
+        
+        batch, self.write_buffer = self.write_buffer, []
+        started = time.perf_counter()
+        try:
+            with self.db.write() as conn:
+                cursor = conn.cursor()
+                inserted = self.trend_writer.write_many(cursor, batch)
+                # Moteurs d'analyse : même transaction que les faits, doublons exclus
+                self.analytics.observe(cursor, snapshots_from_points(
+                    data for data, new in zip(batch, inserted) if new
+                ))
+            results = [(data, True) for data in batch]
+            self.write_stats['transactions'] += 1
+        except Exception as e:
+            self.trend_writer.clear_caches()
+            self.analytics.discard()
+            self.logger.warning(f"⚠️  Écriture groupée impossible ({e}) - reprise point par point")
+            results = [(data, self.save_data_point(data)) for data in batch]
+            self.write_stats['transactions'] += len(batch)
+        
+        elapsed = time.perf_counter() - started
+        saved_count = sum(1 for _, saved in results if saved)
+        self.write_stats['flushes'] += 1
+        self.write_stats['rows'] += saved_count
+        self.write_stats['failed'] += len(results) - saved_count
+        self.write_stats['seconds'] += elapsed
+        FLUSH_SECONDS.observe(elapsed)
+        ROWS_WRITTEN.labels('saved').inc(saved_count)
+        ROWS_WRITTEN.labels('failed').inc(len(results) - saved_count)
+        return results
+    
+    @staticmethod
+    def _empty_write_stats() -> Dict:
+        return {'rows': 0, 'failed': 0, 'flushes': 0, 'transactions': 0, 'seconds': 0.0}
+    
+    def _log_write_stats(self):
+        """Coût d'écriture du cycle (temps passé dans les flushs, par ligne)"""
+        stats = self.write_stats
+        per_row_ms = stats['seconds'] * 1000 / stats['rows'] if stats['rows'] else 0.0
+        self.logger.info(
+            f"💾 Écritures du cycle: {stats['rows']} lignes ({stats['failed']} en échec), "
+            f"{stats['flushes']} flushs, {stats['transactions']} transactions, "
+            f"{stats['seconds'] * 1000:.1f} ms ({per_row_ms:.2f} ms/ligne)"
+        )
+    
     def collect_city_data(self, city: str, country: str) -> Optional[List[Dict]]:
         """
         Collecte les données complètes pour une ville spécifique
@@ -306,15 +351,18 @@ class LastFmWeatherCollector:
                 self.logger.warning(f"Aucune donnée météo pour {city}")
                 return None
             
-            # 3. Traiter et sauvegarder chaque track
+            # 3. Traiter chaque track et le mettre en attente d'écriture
+            # Un seul horodatage par snapshot : le relevé météo est stocké une fois
+            # dans weather_observations et partagé par tous les tracks de la ville
+            observed_at = utc_timestamp()
             city_data = []
-            successful_saves = 0
             
             for track in tracks:
                 try:
                     mood = self.analyze_track_mood(track['track_name'], track['artist_name'])
                     
                     data_point = {
+                        'timestamp': observed_at,
                         'city': city,
                         'country': country,
                         'track_name': track['track_name'],
@@ -327,121 +375,236 @@ class LastFmWeatherCollector:
                         'temperature': weather['temperature'],
                         'humidity': weather['humidity'],
                         'pressure': weather.get('pressure', 0),
+                        'wind_speed': weather.get('wind_speed'),
+                        'clouds': weather.get('clouds'),
                         'mood_category': mood
                     }
                     
-                    # Sauvegarder en base
-                    if self.save_data_point(data_point):
-                        city_data.append(data_point)
-                        successful_saves += 1
+                    self.buffer_data_point(data_point)
+                    city_data.append(data_point)
                     
                 except Exception as e:
-                    self.logger.error(f"Erreur traitement track {track['track_name']}: {e}")
+                    self.hot_log.error("Erreur traitement track %s: %s", track['track_name'], e)
                     continue
             
-            self.logger.info(f"Collecte {city} terminée: {successful_saves}/{len(tracks)} tracks sauvegardées")
+            if self.flush_mode == 'cycle':
+                # Écriture différée jusqu'à la fin du cycle (statuts rapportés au flush)
+                self.logger.info(f"Collecte {city} terminée: {len(city_data)}/{len(tracks)} tracks en attente d'écriture")
+                return city_data if city_data else None
+            
+            # 4. Sauvegarder le snapshot de la ville en une transaction
+            city_data = [data for data, saved in self.flush_write_buffer() if saved]
+            self.logger.info(f"Collecte {city} terminée: {len(city_data)}/{len(tracks)} tracks sauvegardées")
             return city_data if city_data else None
             
         except Exception as e:
             self.logger.error(f"Erreur collecte {city}: {e}")
             return None
     
-    def generate_daily_stats(self):
-        """Génère les statistiques quotidiennes agrégées"""
+    def generate_daily_stats(self, touched: Optional[Iterable[Tuple[str, str, str]]] = None):
+        """
+        Génère les statistiques quotidiennes agrégées, uniquement pour les couples
+        (ville, jour) touchés par le cycle courant
+        
+        Args:
+            touched: Triplets (ville, pays, 'YYYY-MM-DD') à recalculer ;
+                None recalcule toutes les villes du jour courant
+        """
         try:
-            cursor = self.conn.cursor()
-            
-            # Statistiques par ville
-            cursor.execute('''
-                INSERT OR REPLACE INTO daily_stats 
-                (date, city, total_tracks, avg_temperature, dominant_mood, most_popular_artist)
-                SELECT 
-                    DATE(timestamp) as date,
-                    city,
-                    COUNT(*) as total_tracks,
-                    AVG(temperature) as avg_temperature,
-                    (SELECT mood_category 
-                     FROM city_music_trends t2 
-                     WHERE t2.city = t1.city AND DATE(t2.timestamp) = DATE(t1.timestamp)
-                     GROUP BY mood_category 
-                     ORDER BY COUNT(*) DESC 
-                     LIMIT 1) as dominant_mood,
-                    (SELECT artist_name 
-                     FROM city_music_trends t3 
-                     WHERE t3.city = t1.city AND DATE(t3.timestamp) = DATE(t1.timestamp)
-                     GROUP BY artist_name 
-                     ORDER BY COUNT(*) DESC 
-                     LIMIT 1) as most_popular_artist
-                FROM city_music_trends t1
-                WHERE DATE(timestamp) = DATE('now')
-                GROUP BY city, DATE(timestamp)
-            ''')
+            with self.db.write() as conn:
+                cursor = conn.cursor()
+                
+                if touched is None:
+                    days = {datetime.utcnow().strftime('%Y-%m-%d'): None}
+                else:
+                    days = {}
+                    for city, country, day in touched:
+                        city_id = self.trend_writer.dimensions.city_id(cursor, city, country)
+                        days.setdefault(day, set()).add(city_id)
+                
+                for day, city_ids in days.items():
+                    self._compute_daily_stats(cursor, day, city_ids)
             
-            self.conn.commit()
-            self.logger.info("Statistiques quotidiennes générées")
+            self.logger.info(f"Statistiques quotidiennes générées ({len(days)} jour(s))")
             
         except Exception as e:
             self.logger.error(f"Erreur génération stats quotidiennes: {e}")
     
+    def backfill_daily_stats(self, start_date: str, end_date: Optional[str] = None):
+        """
+        Recalcule les statistiques quotidiennes de toutes les villes sur une plage de jours
+        
+        Args:
+            start_date: Premier jour ('YYYY-MM-DD')
+            end_date: Dernier jour inclus ('YYYY-MM-DD'), par défaut aujourd'hui
+        """
+        try:
+            day = datetime.strptime(start_date, '%Y-%m-%d')
+            last_day = datetime.strptime(end_date, '%Y-%m-%d') if end_date else datetime.utcnow()
+            
+            # Une transaction par jour : le collecteur écrit entre deux jours
+            count = 0
+            empty_days = []
+            while day.date() <= last_day.date():
+                with self.db.write() as conn:
+                    written = self._compute_daily_stats(conn.cursor(), day.strftime('%Y-%m-%d'))
+                if written:
+                    count += 1
+                else:
+                    empty_days.append(day.strftime('%Y-%m-%d'))
+                day += timedelta(days=1)
+            
+            self.logger.info(f"Backfill statistiques quotidiennes: {count} jour(s) recalculé(s)")
+            if empty_days:
+                self.logger.warning(
+                    f"⚠️ Backfill: aucun agrégat pour {len(empty_days)} jour(s) "
+                    f"({', '.join(empty_days[:5])}{'…' if len(empty_days) > 5 else ''}), "
+                    f"statistiques non recalculées"
+                )
+            
+        except Exception as e:
+            self.logger.error(f"Erreur backfill stats quotidiennes: {e}")
+    
+    def _compute_daily_stats(self, cursor, day: str, city_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Calcule en une passe (fonctions de fenêtrage) les stats d'un jour à partir des
+        agrégats : le coût dépend du nombre de tranches du jour, pas du nombre de lignes
+        de city_music_trends. Les tranches horaires et les agrégats journaliers du jour
+        sont additionnés : un jour ancien a été replié par la rétention (rollup_*_daily)
+        
+        Returns:
+            Nombre de villes dont les stats ont été écrites (0 si aucun agrégat)
+        """
+        start = epoch_seconds(day)
+        end = start + 86400
+        day_number = day_bucket(start)
+        
+        city_filter = ''
+        city_params: List[int] = []
+        if city_ids is not None:
+            city_params = sorted(city_ids)
+            city_filter = f"AND city_id IN ({', '.join('?' * len(city_params))})"
+        
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO daily_stats 
+            (date, city, total_tracks, avg_temperature, dominant_mood, most_popular_artist)
+            WITH moods AS (
+                SELECT city_id, mood_category,
+                       SUM(track_count) AS n,
+                       SUM(temperature_sum) AS t_sum,
+                       SUM(temperature_count) AS t_count
+                FROM (
+                    SELECT city_id, mood_category, track_count, temperature_sum, temperature_count
+                    FROM rollup_weather_mood_hourly
+                    WHERE hour_epoch >= ? AND hour_epoch < ? {city_filter}
+                    UNION ALL
+                    SELECT city_id, mood_category, track_count, temperature_sum, temperature_count
+                    FROM rollup_weather_mood_daily
+                    WHERE day_bucket = ? {city_filter}
+                )
+                GROUP BY city_id, mood_category
+            ),
+            mood_stats AS (
+                SELECT city_id, mood_category,
+                       SUM(n) OVER w AS total_tracks,
+                       SUM(t_sum) OVER w / NULLIF(SUM(t_count) OVER w, 0) AS avg_temperature,
+                       ROW_NUMBER() OVER (PARTITION BY city_id ORDER BY n DESC, mood_category) AS rk
+                FROM moods
+                WINDOW w AS (PARTITION BY city_id)
+            ),
+            artists AS (
+                SELECT city_id, artist_id,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY city_id ORDER BY SUM(appearances) DESC, artist_id
+                       ) AS rk
+                FROM (
+                    SELECT city_id, artist_id, appearances FROM rollup_artist_hourly
+                    WHERE hour_epoch >= ? AND hour_epoch < ? {city_filter}
+                    UNION ALL
+                    SELECT city_id, artist_id, appearances FROM rollup_artist_daily
+                    WHERE day_bucket = ? {city_filter}
+                )
+                GROUP BY city_id, artist_id
+            )
+            SELECT ?, c.city, m.total_tracks, m.avg_temperature,
+                   NULLIF(m.mood_category, ''), a.name
+            FROM mood_stats m
+            JOIN dim_city c ON c.id = m.city_id
+            LEFT JOIN artists ar ON ar.city_id = m.city_id AND ar.rk = 1
+            LEFT JOIN dim_artist a ON a.id = ar.artist_id
+            WHERE m.rk = 1
+        ''', [start, end, *city_params, day_number, *city_params,
+              start, end, *city_params, day_number, *city_params, day])
+        return cursor.rowcount
+    
     def display_current_insights(self):
         """Affiche les insights actuels basés sur les données récentes"""
         try:
-            cursor = self.conn.cursor()
-            
             print("\n" + "="*70)
             print("📊 LAST.FM + MÉTÉO - INSIGHTS TEMPS RÉEL")
             print("="*70)
             
-            # Humeur dominante par type de météo (dernière heure)
-            cursor.execute('''
-                SELECT weather_main, mood_category, COUNT(*) as count
-                FROM city_music_trends 
-                WHERE timestamp >= datetime('now', '-1 hour')
-                GROUP BY weather_main, mood_category
-                ORDER BY weather_main, count DESC
-            ''')
+            # Les insights lisent les agrégats horaires (rollup_*) maintenus à chaque
+            # écriture : coût constant quel que soit l'historique. Les fenêtres sont
+            # alignées sur l'heure (tranches horaires commencées dans la fenêtre) et
+            # exprimées en secondes Unix : parcours d'intervalle sur la clé primaire.
+            # Les bornes ne changent qu'à chaque heure : entre deux écritures, les
+            # résultats viennent du cache de requêtes (invalidé par data_version).
+            current_hour = hour_bucket(int(time.time()))
             
-            weather_mood_data = cursor.fetchall()
+            # Humeur dominante par type de météo (dernière heure), lue dans le moteur
+            # de corrélation en ligne : aucune requête
+            correlation = self.analytics.get('weather_mood').correlation('1h')
             
-            if weather_mood_data:
+            if correlation['tracks']:
                 print("\n🌤️  HUMEUR DOMINANTE PAR MÉTÉO (dernière heure):")
-                current_weather = None
-                for weather, mood, count in weather_mood_data:
-                    if weather != current_weather:
-                        print(f"\n   {weather.upper():<15} → {mood.upper()} ({count} tracks)")
-                        current_weather = weather
-                    else:
-                        print(f"                   → {mood.upper()} ({count} tracks)")
-            
-            # Top artistes global (24h)
-            cursor.execute('''
-                SELECT artist_name, COUNT(*) as count
-                FROM city_music_trends 
-                WHERE timestamp >= datetime('now', '-24 hours')
-                GROUP BY artist_name
-                ORDER BY count DESC
-                LIMIT 5
-            ''')
-            
-            top_artists = cursor.fetchall()
-            if top_artists:
+                for weather, moods in correlation['table'].items():
+                    ordered = sorted(moods.items(), key=lambda item: item[1], reverse=True)
+                    for i, (mood, count) in enumerate(ordered):
+                        if i == 0:
+                            print(f"\n   {weather.upper():<15} → {mood.upper()} ({count} tracks)")
+                        else:
+                            print(f"                   → {mood.upper()} ({count} tracks)")
+                if correlation['dof']:
+                    print(f"\n   χ² = {correlation['chi2']:.1f} (ddl {correlation['dof']}, "
+                          f"p = {correlation['p_value']:.3g}), V de Cramér = {correlation['cramers_v']:.2f}")
+            
+            # Top artistes global (24h), lu dans le résumé Space-Saving : aucune requête
+            top_artists = self.analytics.get('heavy_hitters').top('artist', 5, window='24h')
+
+            if top_artists['items']:
                 print(f"\n👑 TOP 5 ARTISTES (24h):")
-                for artist, count in top_artists:
-                    print(f"   🎵 {artist} ({count} apparitions)")
+                for artist in top_artists['items']:
+                    print(f"   🎵 {artist['name']} ({artist['count']} apparitions)")
+            
+            # Plus fortes progressions du dernier relevé de chaque ville (table rank_deltas)
+            rising = biggest_movers(self.db, 'up', limit=3)
+            
+            if rising:
+                print(f"\n📈 PLUS FORTES PROGRESSIONS (dernier relevé):")
+                for move in rising:
+                    print(f"   ⬆️  {move['artist']} - {move['track']} ({move['city']}): "
+                          f"{move['prev_rank']} → {move['rank']} (+{move['delta']})")
+            
+            # Ville la plus active : heure précédente et heure en cours (tranches horaires
+            # entières, soit les 60 à 120 dernières minutes) ; l'heure en cours seule est
+            # presque vide en début d'heure
+            top_city = self.db.cache.query('''
+                SELECT c.city, x.track_count
+                FROM (
+                    SELECT city_id, SUM(track_count) as track_count
+                    FROM rollup_weather_mood_hourly 
+                    WHERE hour_epoch >= ?
+                    GROUP BY city_id
+                    ORDER BY track_count DESC
+                    LIMIT 1
+                ) x
+                JOIN dim_city c ON c.id = x.city_id
+            ''', (current_hour - 3600,))
             
-            # Ville la plus active
-            cursor.execute('''
-                SELECT city, COUNT(*) as track_count
-                FROM city_music_trends 
-                WHERE timestamp >= datetime('now', '-1 hour')
-                GROUP BY city
-                ORDER BY track_count DESC
-                LIMIT 1
-            ''')
-            
-            top_city = cursor.fetchone()
             if top_city:
-                print(f"\n🏙️  VILLE LA PLUS ACTIVE: {top_city[0]} ({top_city[1]} tracks)")
+                print(f"\n🏙️  VILLE LA PLUS ACTIVE (heure précédente et heure en cours): "
+                      f"{top_city[0][0]} ({top_city[0][1]} tracks)")
                 
         except Exception as e:
             self.logger.error(f"Erreur affichage insights: {e}")
@@ -457,28 +620,50 @@ class LastFmWeatherCollector:
         
         total_collected = 0
         all_data = []
+        self.write_stats = self._empty_write_stats()
+        profiler = get_profiler()
         
-        for city, country in self.cities_config['cities'].items():
-            self.logger.info(f"Traitement de {city}, {country}")
-            
-            city_data = self.collect_city_data(city, country)
-            if city_data:
-                all_data.extend(city_data)
-                total_collected += len(city_data)
-            
-            # Respecter le rate limiting
-            time.sleep(float(os.getenv('RATE_LIMIT_DELAY', 1.0)))
+        with profiler.phase('collect'):
+            for city, country in self.cities_config['cities'].items():
+                self.logger.info(f"Traitement de {city}, {country}")
+                
+                city_data = self.collect_city_data(city, country)
+                if city_data:
+                    all_data.extend(city_data)
+                
+                # Respecter le rate limiting
+                time.sleep(float(os.getenv('RATE_LIMIT_DELAY', 1.0)))
+        
+        if self.flush_mode == 'cycle':
+            # Tout le cycle en une transaction : seuls les points écrits sont comptés
+            with profiler.phase('flush'):
+                all_data = [data for data, saved in self.flush_write_buffer() if saved]
+        total_collected = len(all_data)
+        self._log_write_stats()
         
-        # Générer les insights et statistiques
+        # Générer les insights et statistiques (seulement les couples ville/jour touchés)
         if all_data:
-            self.generate_daily_stats()
-            self.display_current_insights()
+            touched = {(d['city'], d['country'], d['timestamp'][:10]) for d in all_data}
+            with profiler.phase('daily_stats'):
+                self.generate_daily_stats(touched)
+            with profiler.phase('insights'):
+                self.display_current_insights()
+            
+            # Rétention : purge du détail ancien par petits lots avant la sauvegarde
+            with profiler.phase('retention'):
+                try:
+                    self.retention.run()
+                except Exception as e:
+                    self.logger.error(f"Erreur rétention: {e}")
             
             # Sauvegarde de precaution
-            backup_file = backup_database()
+            with profiler.phase('backup'):
+                backup_file = backup_database()
             self.logger.info(f"Sauvegarde créée: {backup_file}")
         
         self.logger.info(f"Cycle terminé: {total_collected} données collectées")
+        self.db.log_stats()
+        profiler.end_cycle('monitor')
         return total_collected
     
     def run_continuous_monitoring(self, interval_minutes: int = 60):
@@ -530,8 +715,13 @@ class LastFmWeatherCollector:
             self.logger.error(f"Erreur critique: {e}")
             raise
         finally:
-            if hasattr(self, 'conn'):
-                self.conn.close()
+            if hasattr(self, 'db'):
+                # Points encore en attente (arrêt en cours de cycle) : écrits avant fermeture
+                if self.write_buffer:
+                    flushed = self.flush_write_buffer()
+                    self.logger.info(f"💾 Tampon vidé à l'arrêt: {sum(1 for _, saved in flushed if saved)} points écrits")
+                self.db.log_stats()
+                self.db.close()
                 self.logger.info("Connexion base de données fermée")
 
 
@@ -8,12 +8,10 @@ import logging
 # Charger les variables d'environnement
 load_dotenv()
 
-# Imports internes
+# Imports internes légers uniquement : chaque mode importe (pandas, matplotlib,
+# requests, pyarrow...) et initialise ce qu'il utilise, au moment de s'exécuter
 from utils.logger import setup_logging
-from lastfm_weather_collector import LastFmWeatherCollector
-from data_analyzer import DataAnalyzer
-from ingestion.batch_ingestor import BatchIngestor
-from etl.etl_orchestrator import ETLOrchestrator
+from utils.profiling import get_profiler
 
 # Logging global
 setup_logging()
@@ -27,12 +25,39 @@ def main():
     parser.add_argument('--monitor', action='store_true', help='Lancer le monitoring continu')
     parser.add_argument('--test', action='store_true', help='Lancer un test rapide')
     parser.add_argument('--analyze', action='store_true', help='Analyser les données existantes')
+    parser.add_argument('--backfill-stats', type=str, metavar='DEBUT[:FIN]',
+                        help='Recalculer daily_stats sur une plage de jours (YYYY-MM-DD[:YYYY-MM-DD])')
 
     # Ingestion / ETL
     parser.add_argument('--ingest-batch', action='store_true', help='Lancer l’ingestion batch (tout le batch)')
     parser.add_argument('--batch-size', type=int, default=None, help='Nombre de villes à ingérer (pour test)')
     parser.add_argument('--run-etl', action='store_true', help='Lancer la pipeline ETL complète')
     parser.add_argument('--etl-process-all', action='store_true', help='Pour ETL: traiter tous les fichiers bruts')
+    parser.add_argument('--export-parquet', action='store_true', help='Exporter en Parquet les nouvelles lignes traitées')
+    parser.add_argument('--backup', action='store_true', help='Sauvegarder la base du collecteur (en ligne, avec rotation)')
+    parser.add_argument('--restore-backup', type=str, metavar='CIBLE',
+                        help='Restaurer une sauvegarde vers le fichier CIBLE (la plus récente par défaut)')
+    parser.add_argument('--backup-name', type=str, default=None, help='Pour --restore-backup: nom de la sauvegarde')
+    parser.add_argument('--retention', action='store_true',
+                        help='Purger le détail ancien, replier les agrégats et compacter les bases')
+    parser.add_argument('--serve-api', action='store_true', help="Servir l'API HTTP des insights (vues matérialisées)")
+    parser.add_argument('--api-port', type=int, default=None, help='Pour --serve-api: port HTTP (API_PORT, 8000)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Exposer les métriques Prometheus sur ce port local (METRICS_PORT)')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Benchmarks de bout en bout sur données synthétiques (résultats JSON)')
+    parser.add_argument('--bench-scales', type=str, default=None,
+                        help='Pour --benchmark: échelles séparées par des virgules (small,medium,large)')
+    parser.add_argument('--bench-baseline', type=str, default=None, metavar='FICHIER',
+                        help='Pour --benchmark: résultats JSON de référence à comparer')
+    parser.add_argument('--bench-startup', action='store_true',
+                        help='Mesurer le temps de démarrage de chaque sous-commande (résultats JSON)')
+    parser.add_argument('--startup-only', action='store_true',
+                        help='Importer et initialiser le mode choisi puis quitter (mesure du démarrage)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profiler par phase --monitor, --test, --ingest-batch et --run-etl (PROFILE_DIR)')
+    parser.add_argument('--profile-mode', choices=['deterministic', 'sampling'], default=None,
+                        help='Pour --profile: cProfile (.prof) ou échantillonnage de pile (.folded) (PROFILE_MODE)')
     parser.add_argument('--interval', type=int, default=3600, help='Intervalle de collecte en secondes (pour --monitor)')
     parser.add_argument('--cities', type=str, help='Liste de villes séparées par des virgules pour override temporaire')
 
@@ -43,57 +68,157 @@ def main():
         os.environ['CITIES'] = args.cities
         logger.info(f"Override CITIES via CLI: {args.cities}")
 
-    # Instanciation du collector
-    try:
-        collector = LastFmWeatherCollector()
-    except Exception as e:
-        logger.error(f"Erreur initialisation LastFmWeatherCollector: {e}")
-        collector = None
+    # Métriques Prometheus (GET /metrics) pour les modes de longue durée
+    metrics_port = args.metrics_port or int(os.getenv('METRICS_PORT', 0))
+    if metrics_port:
+        from metrics import start_metrics_server
+        start_metrics_server(metrics_port)
+
+    # Profilage par phase ; en --monitor, SIGUSR1 l'active ou le coupe à chaud
+    profiler = get_profiler()
+    if args.profile_mode:
+        profiler.mode = args.profile_mode
+    profiler.enabled = args.profile
+    if args.monitor and profiler.install_toggle_signal():
+        logger.info(f"⏱️  Profilage basculable par signal : kill -USR1 {os.getpid()}")
 
     # Décider si on lance l'ETL automatiquement
     auto_etl = os.getenv("AUTO_RUN_ETL", "false").lower() == "true"
     should_run_etl = args.run_etl or auto_etl
+    mode = _selected_mode(args, should_run_etl)
+
+    if args.startup_only:
+        prepare_mode(mode)
+        return
 
     # Routing principal
-    if args.test:
-        if not collector:
-            logger.error("Collector non initialisé — test impossible")
-            sys.exit(1)
-        run_test(collector)
+    try:
+        if args.test:
+            collector = _build_collector()
+            if not collector:
+                logger.error("Collector non initialisé — test impossible")
+                sys.exit(1)
+            run_test(collector)
+
+        # elif args.analyze:
+        #     run_analysis()
 
-    # elif args.analyze:
-    #     run_analysis()
+        elif args.backfill_stats:
+            collector = _build_collector()
+            if not collector:
+                logger.error("Collector non initialisé — backfill impossible")
+                sys.exit(1)
+            start_date, _, end_date = args.backfill_stats.partition(':')
+            collector.backfill_daily_stats(start_date, end_date or None)
 
-    elif args.ingest_batch:
-        run_batch_ingestion(batch_size=args.batch_size)
+        elif args.ingest_batch:
+            run_batch_ingestion(batch_size=args.batch_size)
 
-    elif args.monitor:
-        if not collector:
-            logger.error("Collector non initialisé — monitoring impossible")
-            sys.exit(1)
-        collector.run_continuous_monitoring(interval_minutes=max(1, args.interval // 60))
+        elif args.monitor:
+            collector = _build_collector()
+            if not collector:
+                logger.error("Collector non initialisé — monitoring impossible")
+                sys.exit(1)
+            collector.run_continuous_monitoring(interval_minutes=max(1, args.interval // 60))
+
+        elif should_run_etl:
+            run_etl(process_all=True)
+
+        elif args.export_parquet:
+            run_parquet_export()
 
-    elif should_run_etl:
-        run_etl(process_all=True)
+        elif args.retention:
+            run_retention(_build_collector())
 
-    else:
-        parser.print_help()
+        elif args.backup:
+            run_backup()
+
+        elif args.restore_backup:
+            run_restore_backup(args.restore_backup, args.backup_name)
+
+        elif args.serve_api:
+            run_api(args.api_port)
+
+        elif args.benchmark:
+            run_benchmark(args.bench_scales, args.bench_baseline)
+
+        elif args.bench_startup:
+            run_startup_benchmark()
+
+        else:
+            parser.print_help()
+    finally:
+        # Modes ponctuels : un seul « cycle » de profil, écrit même en cas de sortie anticipée
+        profiler.end_cycle(mode)
+
+
+def _selected_mode(args, should_run_etl: bool) -> str:
+    """Nom du mode retenu, dans l'ordre de priorité du routing"""
+    for name, active in (('test', args.test), ('backfill_stats', args.backfill_stats),
+                         ('ingest_batch', args.ingest_batch), ('monitor', args.monitor),
+                         ('etl', should_run_etl), ('export_parquet', args.export_parquet),
+                         ('retention', args.retention), ('backup', args.backup),
+                         ('restore_backup', args.restore_backup), ('serve_api', args.serve_api),
+                         ('benchmark', args.benchmark), ('bench_startup', args.bench_startup)):
+        if active:
+            return name
+    return 'help'
+
+
+def _build_collector():
+    """Collecteur (valide l'environnement, ouvre la base, crée le schéma) ou None en cas d'échec"""
+    try:
+        from lastfm_weather_collector import LastFmWeatherCollector
+        return LastFmWeatherCollector()
+    except Exception as e:
+        logger.error(f"Erreur initialisation LastFmWeatherCollector: {e}")
+        return None
+
+
+def prepare_mode(mode: str):
+    """
+    Importe et initialise ce dont `mode` a besoin, sans l'exécuter : c'est le coût
+    de démarrage mesuré par --bench-startup (à garder aligné sur les run_*)
+    """
+    if mode in ('test', 'backfill_stats', 'monitor', 'retention'):
+        _build_collector()
+    if mode == 'test':
+        from data_analyzer import DataAnalyzer  # noqa: F401
+    if mode in ('etl', 'export_parquet', 'retention'):
+        from etl.etl_orchestrator import ETLOrchestrator
+        ETLOrchestrator()
+    if mode == 'ingest_batch':
+        from ingestion.batch_ingestor import BatchIngestor
+        BatchIngestor()
+    if mode in ('backup', 'restore_backup'):
+        from storage import BackupManager
+        BackupManager()
+    if mode == 'serve_api':
+        import uvicorn  # noqa: F401
+        from api import create_app
+        create_app()
+    if mode in ('benchmark', 'bench_startup'):
+        import bench  # noqa: F401
 
 
 # -----------------------
 # Fonctions utilitaires
 # -----------------------
-def run_test(collector: LastFmWeatherCollector):
+def run_test(collector):
     print("🧪 Test rapide du système...")
     try:
         test_city = 'Paris'
         test_country = 'France'
-        data = collector.collect_city_data(test_city, test_country)
+        profiler = get_profiler()
+        with profiler.phase('collect'):
+            data = collector.collect_city_data(test_city, test_country)
         if data:
             print("✅ Test réussi!")
+            from data_analyzer import DataAnalyzer
             analyzer = DataAnalyzer()
             try:
-                insights = analyzer.get_quick_insights()
+                with profiler.phase('insights'):
+                    insights = analyzer.get_quick_insights()
                 print(insights)
                 print("📊 Analyse des données...")
                 sys.exit(1)
@@ -122,6 +247,7 @@ def run_test(collector: LastFmWeatherCollector):
 def run_batch_ingestion(batch_size: int = None):
     print("📥 Lancement ingestion batch...")
     try:
+        from ingestion.batch_ingestor import BatchIngestor
         batch = BatchIngestor()
         result = batch.run_batch_ingestion(batch_size=batch_size)
         stats = result.get('batch_stats', {})
@@ -137,6 +263,7 @@ def run_batch_ingestion(batch_size: int = None):
 def run_etl(process_all: bool = False):
     print("🛠️  Lancement pipeline ETL...")
     try:
+        from etl.etl_orchestrator import ETLOrchestrator
         orchestrator = ETLOrchestrator()
         result = orchestrator.run_etl_batch(process_all=process_all)
         stats = result.get('batch_stats', {})
@@ -153,5 +280,112 @@ def run_etl(process_all: bool = False):
         sys.exit(1)
 
 
+def run_parquet_export():
+    print("📦 Export Parquet incrémental...")
+    try:
+        from etl.etl_orchestrator import ETLOrchestrator
+        results = ETLOrchestrator().run_parquet_export()
+        for table, exported in results.items():
+            print(f"   {table}: {exported}")
+    except Exception as e:
+        logger.error(f"Erreur lors de l'export Parquet: {e}")
+        sys.exit(1)
+
+
+def run_retention(collector=None):
+    print("🧹 Rétention et compactage des bases...")
+    try:
+        from etl.etl_orchestrator import ETLOrchestrator
+
+        # VACUUM complet autorisé ici (une seule fois) pour passer en auto_vacuum incrémental
+        if collector:
+            print(f"   trend_facts: {collector.retention.run(allow_full_vacuum=True)}")
+        print(f"   processed_track_facts: {ETLOrchestrator().run_retention(allow_full_vacuum=True)}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la rétention: {e}")
+        sys.exit(1)
+
+
+def run_backup():
+    print("💾 Sauvegarde de la base...")
+    try:
+        from storage import BackupManager
+        entry = BackupManager().snapshot()
+        print(f"   {entry['type']}: {entry['file']} ({entry['page_count']} pages)")
+        failed = [name for name, ok in BackupManager().verify().items() if not ok]
+        if failed:
+            print(f"⚠️  Sauvegardes corrompues: {', '.join(failed)}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la sauvegarde: {e}")
+        sys.exit(1)
+
+
+def run_restore_backup(target_path: str, name: str = None):
+    print("♻️  Restauration d'une sauvegarde...")
+    try:
+        from storage import BackupManager
+        print(f"   Base restaurée: {BackupManager().restore(name, target_path)}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la restauration: {e}")
+        sys.exit(1)
+
+
+def run_api(port: int = None):
+    print("🌐 API des insights...")
+    try:
+        import uvicorn
+        from api import create_app
+
+        host = os.getenv('API_HOST', '0.0.0.0')
+        port = port or int(os.getenv('API_PORT', 8000))
+        print(f"   http://{host}:{port}/insights/weather-mood")
+        uvicorn.run(create_app(), host=host, port=port, log_config=None)
+    except Exception as e:
+        logger.error(f"Erreur API: {e}")
+        sys.exit(1)
+
+
+def run_benchmark(scales: str = None, baseline_path: str = None):
+    print("🏁 Benchmarks sur données synthétiques...")
+    try:
+        import json
+        from bench import BenchmarkSuite, compare
+
+        results = BenchmarkSuite(scales.split(',') if scales else None).run()
+        for scale, scale_results in results['scales'].items():
+            print(f"   [{scale}] {scale_results['params']}")
+            for name, timing in scale_results['benchmarks'].items():
+                print(f"      {name:<32} {timing['median_ms']:>10.2f} ms (médiane de {timing['runs']})")
+        print(f"📄 {results['output']}")
+
+        if baseline_path:
+            with open(baseline_path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            print(f"⚖️  Comparaison avec {baseline_path} (commit {baseline.get('commit')}):")
+            for row in compare(baseline, results):
+                print(f"      [{row['scale']}] {row['benchmark']:<32} {row['baseline_ms']:>10.2f} → "
+                      f"{row['current_ms']:>10.2f} ms (x{row['ratio']})")
+    except Exception as e:
+        logger.error(f"Erreur benchmarks: {e}")
+        sys.exit(1)
+
+
+def run_startup_benchmark():
+    print("⏱️  Temps de démarrage par sous-commande...")
+    try:
+        from bench import measure_startup
+
+        results = measure_startup()
+        print(f"   Interpréteur seul: {results['interpreter']['median_ms']:.0f} ms")
+        for mode, timing in results['modes'].items():
+            status = 'ok' if timing['returncode'] == 0 else f"code {timing['returncode']}"
+            print(f"   {mode:<16} {timing['median_ms']:>8.0f} ms  {timing['modules']:>5} modules  "
+                  f"({status}) plus lourds: {', '.join(timing['heaviest_imports'][:3])}")
+        print(f"📄 {results['output']}")
+    except Exception as e:
+        logger.error(f"Erreur mesure du démarrage: {e}")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,14 @@
+# src/metrics/__init__.py
+from .registry import MetricsRegistry, Counter, Gauge, Histogram, REGISTRY, DEFAULT_BUCKETS
+from .server import start_metrics_server, CONTENT_TYPE
+
+__all__ = [
+    'MetricsRegistry',
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'REGISTRY',
+    'DEFAULT_BUCKETS',
+    'start_metrics_server',
+    'CONTENT_TYPE'
+]
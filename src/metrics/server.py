@@ -0,0 +1,56 @@
+# src/metrics/server.py
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from .registry import MetricsRegistry, REGISTRY
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None,
+                         registry: MetricsRegistry = REGISTRY) -> 'ThreadingHTTPServer':
+    """
+    Sert `GET /metrics` (format texte Prometheus) dans un thread d'arrière-plan
+
+    Args:
+        port: Port d'écoute (METRICS_PORT, 9108)
+        host: Adresse d'écoute (METRICS_HOST, 127.0.0.1 : local par défaut)
+        registry: Registre exposé
+
+    Returns:
+        Le serveur (`shutdown()` pour l'arrêter)
+    """
+    # http.server n'est importé que si le serveur démarre : les modules instrumentés restent légers
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    port = port or int(os.getenv('METRICS_PORT', 9108))
+    host = host or os.getenv('METRICS_HOST', '127.0.0.1')
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.exposition().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Les scrapes réguliers n'ont pas leur place dans les logs applicatifs
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"📈 Métriques exposées sur http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,29 @@
+# src/storage/__init__.py
+from .connection import Database, get_database, open_readonly
+from .query_cache import QueryCache
+from .dimensions import DimensionCache
+from .schema import ensure_trends_schema, ensure_processed_schema
+from .rollups import rebuild_rollups, hour_bucket, day_bucket
+from .retention import RetentionManager
+from .backup import BackupManager
+from .writers import TrendWriter, ProcessedTrackWriter, WeatherObservationWriter, utc_timestamp, epoch_seconds
+
+__all__ = [
+    'Database',
+    'get_database',
+    'open_readonly',
+    'QueryCache',
+    'DimensionCache',
+    'ensure_trends_schema',
+    'ensure_processed_schema',
+    'rebuild_rollups',
+    'RetentionManager',
+    'BackupManager',
+    'hour_bucket',
+    'day_bucket',
+    'TrendWriter',
+    'ProcessedTrackWriter',
+    'WeatherObservationWriter',
+    'utc_timestamp',
+    'epoch_seconds'
+]
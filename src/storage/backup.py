@@ -0,0 +1,370 @@
+# src/storage/backup.py
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Format d'un fichier incrémental (flux gzip) :
+#   en-tête  : MAGIC, puis page_size, page_count, nombre de pages modifiées (>III)
+#   pages    : numéro de page (>I, base 0) suivi des page_size octets de la page
+INCREMENTAL_MAGIC = b'SQLINCR1'
+_HEADER = struct.Struct('>III')
+_PAGE_NUMBER = struct.Struct('>I')
+
+# Empreinte courte par page, suffisante pour détecter une modification
+_PAGE_DIGEST_SIZE = 8
+
+
+class BackupManager:
+    """
+    Sauvegardes en ligne d'une base SQLite :
+
+    - copie cohérente via l'API de backup SQLite, par étapes de quelques pages
+      (les écritures concurrentes ne sont bloquées que le temps d'une étape) ;
+    - instantanés compressés (gzip) et vérifiés par SHA-256 ;
+    - mode incrémental : seules les pages modifiées depuis l'instantané précédent
+      sont conservées, une sauvegarde complète étant refaite toutes les
+      `full_every` sauvegardes ;
+    - rotation grand-père / père / fils (hebdomadaire / quotidienne / horaire).
+
+    Les instantanés sont décrits dans `manifest.json` (type, parent, sommes de contrôle).
+    """
+
+    def __init__(self, db_path: str = 'data/lastfm_weather.db',
+                 backup_dir: Optional[str] = None,
+                 pages_per_step: int = 256,
+                 full_every: Optional[int] = None,
+                 keep_hourly: Optional[int] = None,
+                 keep_daily: Optional[int] = None,
+                 keep_weekly: Optional[int] = None):
+        """
+        Args:
+            db_path: Base à sauvegarder
+            backup_dir: Dossier des sauvegardes (DB_BACKUP_DIR, data/backup par défaut)
+            pages_per_step: Pages copiées par étape de l'API de backup
+            full_every: Sauvegarde complète toutes les N sauvegardes (BACKUP_FULL_EVERY, 24)
+            keep_hourly: Fils conservés, les plus récents (BACKUP_KEEP_HOURLY, 24)
+            keep_daily: Pères conservés, un par jour (BACKUP_KEEP_DAILY, 7)
+            keep_weekly: Grands-pères conservés, un par semaine (BACKUP_KEEP_WEEKLY, 4)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.getenv('DB_BACKUP_DIR', 'data/backup')
+        self.pages_per_step = pages_per_step
+        self.full_every = full_every or int(os.getenv('BACKUP_FULL_EVERY', 24))
+        self.keep_hourly = keep_hourly or int(os.getenv('BACKUP_KEEP_HOURLY', 24))
+        self.keep_daily = keep_daily or int(os.getenv('BACKUP_KEEP_DAILY', 7))
+        self.keep_weekly = keep_weekly or int(os.getenv('BACKUP_KEEP_WEEKLY', 4))
+
+        self.manifest_path = os.path.join(self.backup_dir, 'manifest.json')
+        # Empreintes des pages du dernier instantané (base de l'incrémental suivant)
+        self.page_digests_path = os.path.join(self.backup_dir, '_last_pages.bin')
+
+    # ---------------------------------------------------------
+    # CRÉATION
+    # ---------------------------------------------------------
+    def snapshot(self, incremental: bool = True) -> Dict:
+        """
+        Crée un instantané puis applique la rotation.
+
+        Args:
+            incremental: Autorise un instantané incrémental si une base de
+                comparaison existe (sinon, ou si la chaîne est trop longue : complet)
+
+        Returns:
+            Entrée du manifeste décrivant l'instantané
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        created_at = datetime.now()
+        name = f"backup_{created_at.strftime('%Y%m%d_%H%M%S_%f')}"
+        image_path = os.path.join(self.backup_dir, f".{name}.tmp.db")
+
+        try:
+            self._online_copy(image_path)
+            page_size, digests = self._page_digests(image_path)
+
+            manifest = self._load_manifest()
+            parent = manifest[-1] if manifest else None
+            previous_digests = self._load_page_digests(parent['name']) if parent else None
+
+            use_incremental = (
+                incremental and parent is not None and previous_digests is not None
+                and parent['page_size'] == page_size
+                and self._chain_length(manifest, parent) < self.full_every
+            )
+
+            if use_incremental:
+                entry = self._write_incremental(name, image_path, page_size, digests,
+                                                previous_digests, parent)
+            else:
+                entry = self._write_full(name, image_path, page_size, len(digests))
+
+            entry.update({
+                'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'db_sha256': _file_sha256(image_path)
+            })
+            manifest.append(entry)
+            self._save_manifest(manifest)
+            self._save_page_digests(name, digests)
+
+        finally:
+            if os.path.exists(image_path):
+                os.remove(image_path)
+
+        self.logger.info(
+            f"💾 Sauvegarde {entry['type']} {entry['file']} "
+            f"({entry.get('changed_pages', entry['page_count'])}/{entry['page_count']} pages)"
+        )
+        self.rotate()
+        return entry
+
+    def _online_copy(self, image_path: str):
+        """Copie cohérente de la base par l'API de backup, quelques pages à la fois"""
+        source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        target = sqlite3.connect(image_path)
+        try:
+            source.backup(target, pages=self.pages_per_step)
+        finally:
+            target.close()
+            source.close()
+
+    def _write_full(self, name: str, image_path: str, page_size: int, page_count: int) -> Dict:
+        file_name = f"{name}.full.db.gz"
+        with open(image_path, 'rb') as src, gzip.open(os.path.join(self.backup_dir, file_name), 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+
+        return {
+            'name': name,
+            'file': file_name,
+            'type': 'full',
+            'parent': None,
+            'page_size': page_size,
+            'page_count': page_count,
+            'sha256': _file_sha256(os.path.join(self.backup_dir, file_name))
+        }
+
+    def _write_incremental(self, name: str, image_path: str, page_size: int, digests: List[bytes],
+                           previous_digests: List[bytes], parent: Dict) -> Dict:
+        changed = [
+            page for page, digest in enumerate(digests)
+            if page >= len(previous_digests) or previous_digests[page] != digest
+        ]
+
+        file_name = f"{name}.incr.gz"
+        with open(image_path, 'rb') as src, gzip.open(os.path.join(self.backup_dir, file_name), 'wb') as dst:
+            dst.write(INCREMENTAL_MAGIC)
+            dst.write(_HEADER.pack(page_size, len(digests), len(changed)))
+            for page in changed:
+                src.seek(page * page_size)
+                dst.write(_PAGE_NUMBER.pack(page))
+                dst.write(src.read(page_size))
+
+        return {
+            'name': name,
+            'file': file_name,
+            'type': 'incremental',
+            'parent': parent['name'],
+            'page_size': page_size,
+            'page_count': len(digests),
+            'changed_pages': len(changed),
+            'sha256': _file_sha256(os.path.join(self.backup_dir, file_name))
+        }
+
+    # ---------------------------------------------------------
+    # RESTAURATION ET VÉRIFICATION
+    # ---------------------------------------------------------
+    def restore(self, name: Optional[str], target_path: str) -> str:
+        """
+        Reconstruit une base depuis un instantané (le plus récent si name est None) :
+        sauvegarde complète de base puis application des incrémentaux de la chaîne.
+        L'image obtenue est vérifiée par sa somme SHA-256.
+
+        Returns:
+            Chemin de la base restaurée
+        """
+        manifest = self._load_manifest()
+        if not manifest:
+            raise FileNotFoundError(f"Aucune sauvegarde dans {self.backup_dir}")
+
+        by_name = {entry['name']: entry for entry in manifest}
+        if name and name not in by_name:
+            raise FileNotFoundError(f"Sauvegarde inconnue: {name} (voir {self.backup_dir}/manifest.json)")
+        entry = by_name[name] if name else manifest[-1]
+        chain = self._chain(by_name, entry)
+
+        # Image reconstruite à côté de la cible, supprimée si la chaîne échoue en cours
+        tmp_path = f"{target_path}.restoring"
+        try:
+            for link in chain:
+                self._verify_file(link)
+                file_path = os.path.join(self.backup_dir, link['file'])
+                if link['type'] == 'full':
+                    with gzip.open(file_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, length=1024 * 1024)
+                else:
+                    self._apply_incremental(file_path, tmp_path)
+
+            if _file_sha256(tmp_path) != entry['db_sha256']:
+                raise ValueError(f"Somme de contrôle invalide après restauration de {entry['name']}")
+
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.logger.info(f"♻️  {entry['name']} restaurée vers {target_path} ({len(chain)} fichier(s))")
+        return target_path
+
+    def verify(self) -> Dict[str, bool]:
+        """Vérifie la somme de contrôle de chaque fichier de sauvegarde"""
+        results = {}
+        for entry in self._load_manifest():
+            try:
+                self._verify_file(entry)
+                results[entry['name']] = True
+            except (OSError, ValueError) as e:
+                self.logger.error(f"❌ Sauvegarde corrompue {entry['name']}: {e}")
+                results[entry['name']] = False
+        return results
+
+    def _verify_file(self, entry: Dict):
+        if _file_sha256(os.path.join(self.backup_dir, entry['file'])) != entry['sha256']:
+            raise ValueError(f"Somme de contrôle invalide: {entry['file']}")
+
+    def _apply_incremental(self, file_path: str, image_path: str):
+        with gzip.open(file_path, 'rb') as src, open(image_path, 'r+b') as dst:
+            if src.read(len(INCREMENTAL_MAGIC)) != INCREMENTAL_MAGIC:
+                raise ValueError(f"Fichier incrémental invalide: {file_path}")
+            page_size, page_count, changed = _HEADER.unpack(src.read(_HEADER.size))
+            for _ in range(changed):
+                (page,) = _PAGE_NUMBER.unpack(src.read(_PAGE_NUMBER.size))
+                dst.seek(page * page_size)
+                dst.write(src.read(page_size))
+            dst.truncate(page_count * page_size)
+
+    # ---------------------------------------------------------
+    # ROTATION GRAND-PÈRE / PÈRE / FILS
+    # ---------------------------------------------------------
+    def rotate(self) -> List[str]:
+        """
+        Conserve les `keep_hourly` derniers instantanés, le premier de chacun des
+        `keep_daily` derniers jours et de chacune des `keep_weekly` dernières semaines,
+        ainsi que tous les instantanés dont ils dépendent ; supprime les autres.
+
+        Returns:
+            Noms des instantanés supprimés
+        """
+        manifest = self._load_manifest()
+        if not manifest:
+            return []
+
+        keep = {entry['name'] for entry in manifest[-self.keep_hourly:]}
+        keep.update(self._first_per_period(manifest, '%Y-%m-%d', self.keep_daily))
+        keep.update(self._first_per_period(manifest, '%G-W%V', self.keep_weekly))
+        # Le dernier instantané sert de base au prochain incrémental
+        keep.add(manifest[-1]['name'])
+
+        by_name = {entry['name']: entry for entry in manifest}
+        for name in list(keep):
+            keep.update(link['name'] for link in self._chain(by_name, by_name[name]))
+
+        removed = []
+        for entry in manifest:
+            if entry['name'] not in keep:
+                file_path = os.path.join(self.backup_dir, entry['file'])
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                removed.append(entry['name'])
+
+        if removed:
+            self._save_manifest([entry for entry in manifest if entry['name'] in keep])
+            self.logger.info(f"🗑️  Rotation des sauvegardes: {len(removed)} supprimée(s)")
+        return removed
+
+    @staticmethod
+    def _first_per_period(manifest: List[Dict], period_format: str, count: int) -> List[str]:
+        firsts = {}
+        for entry in manifest:
+            period = datetime.strptime(entry['created_at'], '%Y-%m-%d %H:%M:%S').strftime(period_format)
+            firsts.setdefault(period, entry['name'])
+        return [firsts[period] for period in sorted(firsts)[-count:]]
+
+    @staticmethod
+    def _chain(by_name: Dict[str, Dict], entry: Dict) -> List[Dict]:
+        """Instantané complet de base suivi des incrémentaux jusqu'à `entry`"""
+        chain = [entry]
+        while chain[-1]['parent'] is not None:
+            parent = by_name.get(chain[-1]['parent'])
+            if parent is None:
+                raise FileNotFoundError(
+                    f"Sauvegarde {chain[-1]['parent']} absente du manifeste (parent de {chain[-1]['name']})"
+                )
+            chain.append(parent)
+        return list(reversed(chain))
+
+    def _chain_length(self, manifest: List[Dict], entry: Dict) -> int:
+        return len(self._chain({e['name']: e for e in manifest}, entry))
+
+    # ---------------------------------------------------------
+    # ÉTAT (manifeste + empreintes des pages)
+    # ---------------------------------------------------------
+    @staticmethod
+    def _page_digests(image_path: str):
+        conn = sqlite3.connect(image_path)
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            conn.close()
+
+        digests = []
+        with open(image_path, 'rb') as f:
+            while True:
+                page = f.read(page_size)
+                if not page:
+                    break
+                digests.append(hashlib.blake2b(page, digest_size=_PAGE_DIGEST_SIZE).digest())
+        return page_size, digests
+
+    def _load_page_digests(self, name: str) -> Optional[List[bytes]]:
+        """Empreintes de l'instantané `name` (None si le fichier décrit un autre instantané)"""
+        try:
+            with open(self.page_digests_path, 'rb') as f:
+                owner, _, data = f.read().partition(b'\n')
+        except FileNotFoundError:
+            return None
+        if owner.decode('utf-8') != name:
+            return None
+        return [data[i:i + _PAGE_DIGEST_SIZE] for i in range(0, len(data), _PAGE_DIGEST_SIZE)]
+
+    def _save_page_digests(self, name: str, digests: List[bytes]):
+        tmp_path = f"{self.page_digests_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(name.encode('utf-8') + b'\n')
+            f.write(b''.join(digests))
+        os.replace(tmp_path, self.page_digests_path)
+
+    def _load_manifest(self) -> List[Dict]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def _save_manifest(self, manifest: List[Dict]):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,334 @@
+# src/storage/connection.py
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from metrics import REGISTRY
+
+from .query_cache import QueryCache
+
+WRITE_TRANSACTIONS = REGISTRY.counter(
+    'db_write_transactions_total', "Transactions ouvertes par Database.write()", ['db', 'result'])
+WRITE_SECONDS = REGISTRY.histogram(
+    'db_write_seconds', "Durée des transactions d'écriture, attente du verrou comprise", ['db'])
+BUSY_RETRIES = REGISTRY.counter(
+    'db_busy_retries_total', "Relances de BEGIN IMMEDIATE sur SQLITE_BUSY", ['db'])
+READ_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    'db_read_pool_wait_seconds', "Attente d'une connexion du pool de lecture", ['db'])
+
+
+class Database:
+    """
+    Point d'accès unique à un fichier SQLite :
+
+    - une seule connexion d'écriture par fichier et par processus, en mode WAL
+      (les lecteurs ne bloquent plus l'écrivain, et réciproquement) ;
+    - un pool de connexions en lecture seule (mode=ro, query_only) réglées
+      avec mmap_size / cache_size ;
+    - instrumentation : attente du verrou d'écriture, relances sur SQLITE_BUSY,
+      attente d'une connexion du pool ;
+    - un cache de résultats (`cache`) invalidé par `PRAGMA data_version`.
+
+    Obtenir l'instance partagée d'un fichier avec `get_database(path)`.
+    """
+
+    def __init__(self, path: str, readers: Optional[int] = None,
+                 mmap_size: Optional[int] = None, cache_size_kib: Optional[int] = None,
+                 busy_timeout_ms: int = 5000, begin_timeout_ms: int = 50,
+                 max_busy_retries: int = 100):
+        """
+        Args:
+            path: Fichier de la base
+            readers: Taille du pool de lecture (DB_READ_POOL_SIZE, 4)
+            mmap_size: Octets projetés en mémoire par connexion (DB_MMAP_SIZE, 256 Mio)
+            cache_size_kib: Cache de pages par connexion en Kio (DB_CACHE_SIZE_KIB, 64 Mio)
+            busy_timeout_ms: Attente SQLite avant de rendre SQLITE_BUSY sur la connexion d'écriture
+            begin_timeout_ms: Attente courte utilisée pour BEGIN IMMEDIATE dans `write()` ;
+                SQLITE_BUSY y est ensuite relancé ici, pour que chaque relance soit comptée
+            max_busy_retries: Relances avant d'abandonner l'ouverture d'une transaction
+        """
+        self.logger = logging.getLogger(__name__)
+        # Chemin absolu : le pool de lecture ouvre ses connexions à la demande, y compris
+        # après un changement de répertoire courant
+        self.path = os.path.abspath(path)
+        self.readers = readers or int(os.getenv('DB_READ_POOL_SIZE', 4))
+        self.mmap_size = mmap_size if mmap_size is not None else int(os.getenv('DB_MMAP_SIZE', 256 * 1024 * 1024))
+        self.cache_size_kib = cache_size_kib or int(os.getenv('DB_CACHE_SIZE_KIB', 64 * 1024))
+        self.busy_timeout_ms = busy_timeout_ms
+        self.begin_timeout_ms = begin_timeout_ms
+        self.max_busy_retries = max_busy_retries
+
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._pool_created = 0
+        self._pool_lock = threading.Lock()
+        self._probe: Optional[sqlite3.Connection] = None
+        self._probe_lock = threading.Lock()
+        self._cache: Optional[QueryCache] = None
+
+        name = os.path.basename(path)
+        self._metric_commits = WRITE_TRANSACTIONS.labels(name, 'commit')
+        self._metric_rollbacks = WRITE_TRANSACTIONS.labels(name, 'rollback')
+        self._metric_write_seconds = WRITE_SECONDS.labels(name)
+        self._metric_busy_retries = BUSY_RETRIES.labels(name)
+        self._metric_read_wait = READ_POOL_WAIT_SECONDS.labels(name)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'write_transactions': 0,
+            'write_lock_wait_seconds': 0.0,
+            'write_lock_wait_max_seconds': 0.0,
+            'busy_retries': 0,
+            'read_sessions': 0,
+            'read_pool_wait_seconds': 0.0,
+            'read_pool_wait_max_seconds': 0.0
+        }
+
+    # ---------------------------------------------------------
+    # ÉCRITURE
+    # ---------------------------------------------------------
+    @property
+    def writer(self) -> sqlite3.Connection:
+        """
+        Connexion d'écriture partagée (créée à la première utilisation). Les appelants
+        qui gèrent eux-mêmes leurs commits l'utilisent directement ; les autres passent
+        par `write()`.
+        """
+        if self._writer is None:
+            with self._write_lock:
+                if self._writer is None:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    conn = sqlite3.connect(self.path, check_same_thread=False)
+                    conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+                    conn.execute("PRAGMA journal_mode = WAL")
+                    # En WAL, NORMAL ne perd au pire que les dernières transactions sur coupure
+                    conn.execute("PRAGMA synchronous = NORMAL")
+                    self._tune(conn)
+                    self._writer = conn
+        return self._writer
+
+    @contextmanager
+    def write(self):
+        """
+        Transaction d'écriture : verrou du processus puis BEGIN IMMEDIATE (relancé et
+        compté tant qu'un autre processus tient le verrou SQLite) ; commit à la sortie,
+        rollback en cas d'exception.
+        """
+        conn = self.writer
+        started = time.perf_counter()
+        with self._write_lock:
+            if self._write_depth:
+                # Bloc imbriqué : il rejoint la transaction englobante
+                self._write_depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._write_depth -= 1
+                return
+
+            self._begin_immediate(conn)
+            self._record_wait('write_lock_wait', time.perf_counter() - started, 'write_transactions')
+            self._write_depth = 1
+            try:
+                yield conn
+                conn.commit()
+                self._metric_commits.inc()
+            except BaseException:
+                conn.rollback()
+                self._metric_rollbacks.inc()
+                raise
+            finally:
+                self._write_depth = 0
+                self._metric_write_seconds.observe(time.perf_counter() - started)
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Connexion d'écriture hors transaction, sous le verrou du processus : pour les
+        commandes interdites dans une transaction (VACUUM, PRAGMA auto_vacuum).
+        Aucune autre écriture du processus ne passe pendant le bloc.
+        """
+        conn = self.writer
+        with self._write_lock:
+            if self._write_depth:
+                raise RuntimeError("exclusive() appelé dans une transaction write()")
+            if conn.in_transaction:
+                conn.commit()
+            yield conn
+
+    def _begin_immediate(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            # Transaction implicite laissée ouverte par un appelant : on la termine
+            conn.commit()
+
+        delay = 0.01
+        conn.execute(f"PRAGMA busy_timeout = {self.begin_timeout_ms}")
+        try:
+            for attempt in range(self.max_busy_retries + 1):
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    return
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e) and 'busy' not in str(e):
+                        raise
+                    if attempt == self.max_busy_retries:
+                        raise
+                    with self._stats_lock:
+                        self._stats['busy_retries'] += 1
+                    self._metric_busy_retries.inc()
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.5)
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+
+    # ---------------------------------------------------------
+    # LECTURE
+    # ---------------------------------------------------------
+    @contextmanager
+    def read(self):
+        """Emprunte une connexion en lecture seule au pool (rendue à la sortie)"""
+        started = time.perf_counter()
+        conn = self._acquire_reader()
+        waited = time.perf_counter() - started
+        self._record_wait('read_pool_wait', waited, 'read_sessions')
+        self._metric_read_wait.observe(waited)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._pool_created < self.readers:
+                self._pool_created += 1
+                try:
+                    return open_readonly(self.path, self.mmap_size, self.cache_size_kib)
+                except Exception:
+                    self._pool_created -= 1
+                    raise
+
+        return self._pool.get()
+
+    def data_version(self) -> int:
+        """
+        `PRAGMA data_version` d'une connexion sonde qui n'écrit jamais : la valeur change
+        à chaque commit d'une autre connexion, y compris l'écrivain de ce processus
+        """
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = open_readonly(self.path, 0, 64)
+            return self._probe.execute("PRAGMA data_version").fetchone()[0]
+
+    @property
+    def cache(self) -> QueryCache:
+        """Cache de résultats de requêtes de la base (créé à la première utilisation)"""
+        if self._cache is None:
+            with self._pool_lock:
+                if self._cache is None:
+                    self._cache = QueryCache(self)
+        return self._cache
+
+    # ---------------------------------------------------------
+    # INSTRUMENTATION
+    # ---------------------------------------------------------
+    def _record_wait(self, prefix: str, waited: float, counter: str):
+        with self._stats_lock:
+            self._stats[counter] += 1
+            self._stats[f'{prefix}_seconds'] += waited
+            if waited > self._stats[f'{prefix}_max_seconds']:
+                self._stats[f'{prefix}_max_seconds'] = waited
+
+    def stats(self) -> Dict:
+        """Compteurs cumulés depuis la création de l'instance"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['read_pool_size'] = self._pool_created
+        if self._cache is not None:
+            stats['cache'] = self._cache.stats()
+        return stats
+
+    def log_stats(self):
+        stats = self.stats()
+        self.logger.info(
+            f"🔒 {os.path.basename(self.path)}: {stats['write_transactions']} écritures "
+            f"(attente verrou {stats['write_lock_wait_seconds']:.3f}s, "
+            f"max {stats['write_lock_wait_max_seconds']:.3f}s, {stats['busy_retries']} relances busy), "
+            f"{stats['read_sessions']} lectures (attente pool {stats['read_pool_wait_seconds']:.3f}s)"
+        )
+        if 'cache' in stats:
+            cache = stats['cache']
+            self.logger.info(
+                f"🗃️  Cache requêtes {os.path.basename(self.path)}: {cache['hit_rate']}% de succès "
+                f"({cache['hits']}/{cache['hits'] + cache['misses']}), "
+                f"{cache['entries']} entrées, {cache['evictions']} évictions"
+            )
+
+    # ---------------------------------------------------------
+    # CYCLE DE VIE
+    # ---------------------------------------------------------
+    def close(self):
+        """Ferme le pool et la connexion d'écriture (checkpoint du WAL à la fermeture)"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._pool_created = 0
+
+        with self._probe_lock:
+            if self._probe is not None:
+                self._probe.close()
+                self._probe = None
+        if self._cache is not None:
+            self._cache.clear()
+
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def _tune(self, conn: sqlite3.Connection):
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        conn.execute(f"PRAGMA cache_size = -{self.cache_size_kib}")
+
+
+def open_readonly(path: str, mmap_size: int = 256 * 1024 * 1024,
+                  cache_size_kib: int = 64 * 1024) -> sqlite3.Connection:
+    """
+    Connexion en lecture seule, réglée pour les analyses (notebooks, rapports) :
+    en WAL, elle ne bloque jamais l'écrivain.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    conn.execute("PRAGMA query_only = 1")
+    conn.execute(f"PRAGMA mmap_size = {mmap_size}")
+    conn.execute(f"PRAGMA cache_size = -{cache_size_kib}")
+    return conn
+
+
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str) -> Database:
+    """Instance partagée (une par fichier et par processus) : garantit l'écrivain unique"""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        if key not in _databases:
+            _databases[key] = Database(key)
+        return _databases[key]
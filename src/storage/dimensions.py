@@ -0,0 +1,114 @@
+# src/storage/dimensions.py
+import logging
+from typing import Dict, Optional, Tuple
+
+
+DIMENSION_TABLES_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS dim_city (
+        id INTEGER PRIMARY KEY,
+        city TEXT NOT NULL,
+        country TEXT NOT NULL,
+        UNIQUE(city, country)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS dim_artist (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS dim_track (
+        id INTEGER PRIMARY KEY,
+        artist_id INTEGER NOT NULL REFERENCES dim_artist(id),
+        name TEXT NOT NULL,
+        UNIQUE(artist_id, name)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS dim_weather (
+        id INTEGER PRIMARY KEY,
+        main TEXT NOT NULL,
+        description TEXT NOT NULL DEFAULT '',
+        UNIQUE(main, description)
+    )
+    '''
+]
+
+
+class DimensionCache:
+    """
+    Cache de résolution des identifiants des tables de dimension
+    (ville, artiste, morceau, météo) utilisé sur le chemin d'écriture.
+
+    Les identifiants sont stables dans un fichier de base donné : une fois
+    résolu, un libellé n'est plus jamais relu en base.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self._ids: Dict[Tuple, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def city_id(self, cursor, city: str, country: str) -> int:
+        return self._resolve(
+            cursor, ('city', city, country),
+            "SELECT id FROM dim_city WHERE city = ? AND country = ?",
+            "INSERT INTO dim_city (city, country) VALUES (?, ?)",
+            (city, country)
+        )
+
+    def artist_id(self, cursor, artist_name: str) -> int:
+        return self._resolve(
+            cursor, ('artist', artist_name),
+            "SELECT id FROM dim_artist WHERE name = ?",
+            "INSERT INTO dim_artist (name) VALUES (?)",
+            (artist_name,)
+        )
+
+    def track_id(self, cursor, track_name: str, artist_id: int) -> int:
+        return self._resolve(
+            cursor, ('track', artist_id, track_name),
+            "SELECT id FROM dim_track WHERE artist_id = ? AND name = ?",
+            "INSERT INTO dim_track (artist_id, name) VALUES (?, ?)",
+            (artist_id, track_name)
+        )
+
+    def weather_id(self, cursor, main: Optional[str], description: Optional[str]) -> Optional[int]:
+        if main is None:
+            return None
+        description = description or ''
+        return self._resolve(
+            cursor, ('weather', main, description),
+            "SELECT id FROM dim_weather WHERE main = ? AND description = ?",
+            "INSERT INTO dim_weather (main, description) VALUES (?, ?)",
+            (main, description)
+        )
+
+    def clear(self):
+        """Vide le cache (à appeler après un rollback : des ids non commités ont pu y entrer)"""
+        self._ids.clear()
+
+    def _resolve(self, cursor, key: Tuple, select_sql: str, insert_sql: str, params: Tuple) -> int:
+        cached = self._ids.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        cursor.execute(select_sql, params)
+        row = cursor.fetchone()
+        if row:
+            dim_id = row[0]
+        else:
+            cursor.execute(insert_sql, params)
+            dim_id = cursor.lastrowid
+
+        if len(self._ids) >= self.max_entries:
+            self.logger.debug("Cache de dimensions plein - réinitialisation")
+            self._ids.clear()
+        self._ids[key] = dim_id
+        return dim_id
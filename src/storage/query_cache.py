@@ -0,0 +1,91 @@
+# src/storage/query_cache.py
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+from metrics import REGISTRY
+
+LOOKUPS = REGISTRY.counter('query_cache_lookups_total', "Consultations du cache de requêtes", ['db', 'result'])
+EVICTIONS = REGISTRY.counter('query_cache_evictions_total', "Résultats évincés du cache de requêtes", ['db'])
+
+
+class QueryCache:
+    """
+    Cache de résultats de requêtes d'une base, invalidé par `PRAGMA data_version` :
+    un résultat n'est resservi que si aucune connexion (de ce processus ou d'un autre)
+    n'a commité depuis son calcul. Les appels répétés entre deux écritures sont donc
+    gratuits et l'invalidation est exacte.
+
+    Les résultats sont partagés entre appelants : ils ne doivent pas être modifiés.
+    """
+
+    def __init__(self, db, max_entries: Optional[int] = None):
+        """
+        Args:
+            db: Instance `Database` (fournit `read()` et `data_version()`)
+            max_entries: Résultats conservés, les moins récemment utilisés sont
+                évincés au-delà (QUERY_CACHE_SIZE, 256)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db = db
+        self.max_entries = max_entries or int(os.getenv('QUERY_CACHE_SIZE', 256))
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        name = os.path.basename(db.path)
+        self._metric_hits = LOOKUPS.labels(name, 'hit')
+        self._metric_misses = LOOKUPS.labels(name, 'miss')
+        self._metric_evictions = EVICTIONS.labels(name)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Résultat en cache pour `key` s'il date de la version courante de la base,
+        sinon `compute()` (appelé hors verrou) dont le résultat est mémorisé
+        """
+        # Version lue avant le calcul : une écriture concurrente rend l'entrée
+        # périmée dès l'appel suivant, jamais l'inverse
+        version = self.db.data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                self._metric_hits.inc()
+                return entry[1]
+            self._stats['misses'] += 1
+        self._metric_misses.inc()
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+                self._metric_evictions.inc()
+        return value
+
+    def query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        """Lignes d'une requête (fetchall sur une connexion du pool de lecture), en cache"""
+        def compute():
+            with self.db.read() as conn:
+                return conn.execute(sql, params).fetchall()
+        return self.get_or_compute(('rows', sql, tuple(params)), compute)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Succès, échecs, évictions, taux de succès (%) et entrées conservées"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        return stats
@@ -0,0 +1,255 @@
+# src/storage/retention.py
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from .connection import Database
+from .rollups import SECONDS_PER_DAY
+
+
+class RetentionManager:
+    """
+    Rétention de l'historique d'une base (collecteur ou ETL) :
+
+    - les lignes de faits plus anciennes que la fenêtre de détail sont supprimées
+      (elles sont déjà comptées dans les agrégats horaires, mis à jour à l'écriture) ;
+    - les agrégats horaires plus anciens que la fenêtre horaire sont repliés dans
+      les agrégats journaliers (rollup_*_daily) ;
+    - les relevés météo qui ne sont plus référencés sont supprimés, ainsi que les
+      mouvements de classement (rank_deltas) sortis de la fenêtre de détail ;
+    - l'espace libéré est rendu au système par `PRAGMA incremental_vacuum`.
+
+    Les suppressions se font par petits lots, chacun dans sa propre transaction
+    `Database.write()` (verrou du processus, BEGIN IMMEDIATE relancé sur SQLITE_BUSY),
+    pour ne jamais bloquer longtemps les écritures du collecteur.
+    """
+
+    def __init__(self, db: Database, facts_table: str,
+                 detail_days: Optional[int] = None,
+                 hourly_days: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 vacuum_pages: Optional[int] = None,
+                 batch_pause: float = 0.01):
+        """
+        Args:
+            db: Base à purger (son écrivain partagé)
+            facts_table: 'trend_facts' ou 'processed_track_facts'
+            detail_days: Jours de détail conservés (RETENTION_DETAIL_DAYS, 30 par défaut)
+            hourly_days: Jours d'agrégats horaires conservés avant repli journalier
+                (RETENTION_HOURLY_DAYS, 90 par défaut ; au moins detail_days et 7 jours,
+                fenêtre lue par les insights)
+            batch_size: Lignes supprimées par transaction (RETENTION_BATCH_SIZE, 1000)
+            vacuum_pages: Pages libérées par étape de vacuum (RETENTION_VACUUM_PAGES, 256)
+            batch_pause: Pause (secondes) entre deux lots pour laisser passer les écritures
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db = db
+        self.facts_table = facts_table
+
+        self.detail_days = detail_days or int(os.getenv('RETENTION_DETAIL_DAYS', 30))
+        self.hourly_days = max(
+            hourly_days or int(os.getenv('RETENTION_HOURLY_DAYS', 90)),
+            self.detail_days, 7
+        )
+        self.batch_size = batch_size or int(os.getenv('RETENTION_BATCH_SIZE', 1000))
+        self.vacuum_pages = vacuum_pages or int(os.getenv('RETENTION_VACUUM_PAGES', 256))
+        self.batch_pause = batch_pause
+
+    def run(self, allow_full_vacuum: bool = False) -> Dict:
+        """
+        Applique la politique de rétention.
+
+        Args:
+            allow_full_vacuum: Autorise le VACUUM complet (bloquant, une seule fois)
+                nécessaire pour passer une base existante en auto_vacuum incrémental
+
+        Returns:
+            Compteurs de l'exécution (lignes supprimées, jours repliés, pages libérées)
+        """
+        # Bornes alignées sur le jour UTC : une tranche horaire n'est jamais à cheval
+        # entre le détail conservé et le détail purgé
+        today = int(time.time()) // SECONDS_PER_DAY
+        detail_cutoff = (today - self.detail_days) * SECONDS_PER_DAY
+        hourly_cutoff = (today - self.hourly_days) * SECONDS_PER_DAY
+
+        result = {
+            'facts_deleted': self.purge_facts(detail_cutoff),
+            'observations_deleted': self.purge_observations(detail_cutoff),
+            'rank_deltas_deleted': self.purge_rank_deltas(detail_cutoff),
+            'days_folded': self.fold_hourly_rollups(hourly_cutoff),
+            'pages_freed': self.incremental_vacuum(allow_full_vacuum)
+        }
+
+        if any(result.values()):
+            self.logger.info(f"🧹 Rétention {self.facts_table}: {result}")
+        return result
+
+    def purge_facts(self, cutoff_epoch: int) -> int:
+        """Supprime par lots (les plus anciens d'abord) les faits antérieurs à cutoff_epoch"""
+        return self._delete_in_batches(self.facts_table, f'''
+            DELETE FROM {self.facts_table} WHERE id IN (
+                SELECT id FROM {self.facts_table}
+                WHERE ts_epoch < ?
+                ORDER BY ts_epoch
+                LIMIT ?
+            )
+        ''', cutoff_epoch)
+
+    def purge_rank_deltas(self, cutoff_epoch: int) -> int:
+        """
+        Supprime par lots les mouvements de classement antérieurs à cutoff_epoch (même
+        fenêtre que le détail dont ils sont tirés) ; rien si la base n'en a pas
+        """
+        with self.db.read() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rank_deltas'"
+            ).fetchone()
+        if not exists:
+            return 0
+        return self._delete_in_batches('rank_deltas', '''
+            DELETE FROM rank_deltas WHERE (city_id, ts_epoch, track_id) IN (
+                SELECT city_id, ts_epoch, track_id FROM rank_deltas
+                WHERE ts_epoch < ?
+                ORDER BY ts_epoch
+                LIMIT ?
+            )
+        ''', cutoff_epoch)
+
+    def purge_observations(self, cutoff_epoch: int) -> int:
+        """
+        Supprime par lots les relevés météo antérieurs à cutoff_epoch qui ne sont plus
+        référencés par aucun fait (un fichier brut ancien retraité garde le sien).
+        Parcours d'intervalle sur observed_at, puis une recherche d'index par relevé
+        dans les faits (index sur observation_id)
+        """
+        return self._delete_in_batches('weather_observations', f'''
+            DELETE FROM weather_observations WHERE id IN (
+                SELECT o.id FROM weather_observations o
+                WHERE o.observed_at < datetime(?, 'unixepoch')
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {self.facts_table} f WHERE f.observation_id = o.id
+                  )
+                ORDER BY o.observed_at
+                LIMIT ?
+            )
+        ''', cutoff_epoch)
+
+    def fold_hourly_rollups(self, cutoff_epoch: int) -> int:
+        """
+        Replie dans les agrégats journaliers les tranches horaires antérieures à
+        cutoff_epoch, un jour par transaction (insertion + suppression atomiques)
+
+        Returns:
+            Nombre de jours repliés
+        """
+        folded = 0
+
+        # Saute directement au prochain jour non vide (MIN sur la clé primaire)
+        while True:
+            try:
+                with self.db.write() as conn:
+                    first_hour = conn.execute('''
+                        SELECT MIN(h) FROM (
+                            SELECT MIN(hour_epoch) AS h FROM rollup_weather_mood_hourly WHERE hour_epoch < ?
+                            UNION ALL
+                            SELECT MIN(hour_epoch) FROM rollup_artist_hourly WHERE hour_epoch < ?
+                        )
+                    ''', (cutoff_epoch, cutoff_epoch)).fetchone()[0]
+                    if first_hour is None:
+                        break
+                    day = first_hour // SECONDS_PER_DAY
+                    self._fold_day(conn, day)
+            except Exception as e:
+                self.logger.error(f"❌ Erreur repli des agrégats horaires: {e}")
+                break
+
+            folded += 1
+            time.sleep(self.batch_pause)
+
+        return folded
+
+    def _fold_day(self, conn, day: int):
+        start, end = day * SECONDS_PER_DAY, (day + 1) * SECONDS_PER_DAY
+        conn.execute('''
+            INSERT INTO rollup_weather_mood_daily
+            (day_bucket, city_id, weather_id, mood_category,
+             track_count, temperature_sum, temperature_count)
+            SELECT ?, city_id, weather_id, mood_category,
+                   SUM(track_count), SUM(temperature_sum), SUM(temperature_count)
+            FROM rollup_weather_mood_hourly
+            WHERE hour_epoch >= ? AND hour_epoch < ?
+            GROUP BY city_id, weather_id, mood_category
+            ON CONFLICT (day_bucket, city_id, weather_id, mood_category) DO UPDATE SET
+                track_count = track_count + excluded.track_count,
+                temperature_sum = temperature_sum + excluded.temperature_sum,
+                temperature_count = temperature_count + excluded.temperature_count
+        ''', (day, start, end))
+        conn.execute('''
+            INSERT INTO rollup_artist_daily
+            (day_bucket, city_id, artist_id, appearances, listeners_sum)
+            SELECT ?, city_id, artist_id, SUM(appearances), SUM(listeners_sum)
+            FROM rollup_artist_hourly
+            WHERE hour_epoch >= ? AND hour_epoch < ?
+            GROUP BY city_id, artist_id
+            ON CONFLICT (day_bucket, city_id, artist_id) DO UPDATE SET
+                appearances = appearances + excluded.appearances,
+                listeners_sum = listeners_sum + excluded.listeners_sum
+        ''', (day, start, end))
+        conn.execute("DELETE FROM rollup_weather_mood_hourly WHERE hour_epoch >= ? AND hour_epoch < ?",
+                     (start, end))
+        conn.execute("DELETE FROM rollup_artist_hourly WHERE hour_epoch >= ? AND hour_epoch < ?",
+                     (start, end))
+
+    def incremental_vacuum(self, allow_full_vacuum: bool = False) -> int:
+        """
+        Rend au système les pages libres par étapes de `vacuum_pages` pages
+
+        Returns:
+            Nombre de pages libérées
+        """
+        with self.db.read() as conn:
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != 2:
+            if not allow_full_vacuum:
+                self.logger.debug("auto_vacuum non incrémental - vacuum ignoré (voir --retention)")
+                return 0
+            # Conversion unique : le mode n'est pris en compte qu'après un VACUUM complet,
+            # impossible dans une transaction
+            self.logger.warning("⚠️  Conversion en auto_vacuum incrémental (VACUUM complet, bloquant)")
+            with self.db.exclusive() as conn:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+
+        with self.db.read() as conn:
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        remaining = free_before
+        while remaining > 0:
+            with self.db.write() as conn:
+                conn.execute(f"PRAGMA incremental_vacuum({self.vacuum_pages})").fetchall()
+                left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if left >= remaining:
+                break
+            remaining = left
+            time.sleep(self.batch_pause)
+
+        return free_before - remaining
+
+    def _delete_in_batches(self, table: str, delete_sql: str, cutoff_epoch: int) -> int:
+        deleted = 0
+
+        while True:
+            try:
+                with self.db.write() as conn:
+                    count = conn.execute(delete_sql, (cutoff_epoch, self.batch_size)).rowcount
+            except Exception as e:
+                self.logger.error(f"❌ Erreur purge {table}: {e}")
+                break
+
+            deleted += count
+            if count < self.batch_size:
+                break
+            time.sleep(self.batch_pause)
+
+        return deleted
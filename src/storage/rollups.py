@@ -0,0 +1,246 @@
+# src/storage/rollups.py
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------
+# TABLES D'AGRÉGATS (granularité horaire, clé commençant par le début de l'heure
+# en secondes Unix pour que les fenêtres temporelles soient des parcours d'intervalle)
+# ---------------------------------------------------------
+ROLLUP_TABLES_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_weather_mood_hourly (
+        hour_epoch INTEGER NOT NULL,
+        city_id INTEGER NOT NULL,
+        weather_id INTEGER NOT NULL,
+        mood_category TEXT NOT NULL,
+        track_count INTEGER NOT NULL DEFAULT 0,
+        temperature_sum REAL NOT NULL DEFAULT 0,
+        temperature_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour_epoch, city_id, weather_id, mood_category)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_artist_hourly (
+        hour_epoch INTEGER NOT NULL,
+        city_id INTEGER NOT NULL,
+        artist_id INTEGER NOT NULL,
+        appearances INTEGER NOT NULL DEFAULT 0,
+        listeners_sum INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour_epoch, city_id, artist_id)
+    ) WITHOUT ROWID
+    ''',
+    # Agrégats journaliers : les tranches horaires plus anciennes que la fenêtre
+    # de rétention y sont repliées (voir storage.retention)
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_weather_mood_daily (
+        day_bucket INTEGER NOT NULL,
+        city_id INTEGER NOT NULL,
+        weather_id INTEGER NOT NULL,
+        mood_category TEXT NOT NULL,
+        track_count INTEGER NOT NULL DEFAULT 0,
+        temperature_sum REAL NOT NULL DEFAULT 0,
+        temperature_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day_bucket, city_id, weather_id, mood_category)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_artist_daily (
+        day_bucket INTEGER NOT NULL,
+        city_id INTEGER NOT NULL,
+        artist_id INTEGER NOT NULL,
+        appearances INTEGER NOT NULL DEFAULT 0,
+        listeners_sum INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day_bucket, city_id, artist_id)
+    ) WITHOUT ROWID
+    '''
+]
+
+# weather_id / mood inconnus : 0 et '' (une clé primaire WITHOUT ROWID n'accepte pas NULL)
+UNKNOWN_WEATHER_ID = 0
+UNKNOWN_MOOD = ''
+
+_UPSERT_WEATHER_MOOD = '''
+    INSERT INTO rollup_weather_mood_hourly
+    (hour_epoch, city_id, weather_id, mood_category, track_count, temperature_sum, temperature_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (hour_epoch, city_id, weather_id, mood_category) DO UPDATE SET
+        track_count = track_count + excluded.track_count,
+        temperature_sum = temperature_sum + excluded.temperature_sum,
+        temperature_count = temperature_count + excluded.temperature_count
+'''
+
+_UPSERT_ARTIST = '''
+    INSERT INTO rollup_artist_hourly (hour_epoch, city_id, artist_id, appearances, listeners_sum)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (hour_epoch, city_id, artist_id) DO UPDATE SET
+        appearances = appearances + excluded.appearances,
+        listeners_sum = listeners_sum + excluded.listeners_sum
+'''
+
+_REBUILD_SQL = [
+    '''
+    INSERT INTO rollup_weather_mood_hourly
+    (hour_epoch, city_id, weather_id, mood_category, track_count, temperature_sum, temperature_count)
+    SELECT f.ts_epoch - f.ts_epoch % 3600, f.city_id,
+           COALESCE(f.weather_id, 0), COALESCE(f.mood_category, ''),
+           COUNT(*), COALESCE(SUM(o.temperature), 0), COUNT(o.temperature)
+    FROM {facts_table} f
+    LEFT JOIN weather_observations o ON o.id = f.observation_id
+    WHERE f.ts_epoch IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ''',
+    '''
+    INSERT INTO rollup_artist_hourly (hour_epoch, city_id, artist_id, appearances, listeners_sum)
+    SELECT ts_epoch - ts_epoch % 3600, city_id, artist_id,
+           COUNT(*), COALESCE(SUM(listeners), 0)
+    FROM {facts_table}
+    WHERE ts_epoch IS NOT NULL
+    GROUP BY 1, 2, 3
+    '''
+]
+
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+
+def hour_bucket(ts_epoch: int) -> int:
+    """Début de l'heure contenant ts_epoch (secondes Unix)"""
+    return ts_epoch - ts_epoch % SECONDS_PER_HOUR
+
+
+def day_bucket(ts_epoch: int) -> int:
+    """Numéro du jour UTC contenant ts_epoch (jours depuis 1970-01-01)"""
+    return ts_epoch // SECONDS_PER_DAY
+
+
+def apply_fact(cursor, ts_epoch: int, city_id: int, artist_id: int, weather_id: Optional[int],
+               mood_category: Optional[str], listeners: Optional[int], temperature: Optional[float]):
+    """Répercute une nouvelle ligne de faits sur les agrégats (dans la transaction de l'appelant)"""
+    hour = hour_bucket(ts_epoch)
+    cursor.execute(_UPSERT_WEATHER_MOOD, (
+        hour, city_id,
+        weather_id if weather_id is not None else UNKNOWN_WEATHER_ID,
+        mood_category or UNKNOWN_MOOD,
+        1, temperature or 0, 1 if temperature is not None else 0
+    ))
+    cursor.execute(_UPSERT_ARTIST, (hour, city_id, artist_id, 1, listeners or 0))
+
+
+def apply_facts(cursor, facts: Iterable[Tuple]):
+    """
+    Version groupée de `apply_fact` : les lignes sont d'abord sommées par clé
+    d'agrégat, puis chaque table reçoit un seul executemany
+
+    Args:
+        facts: Tuples (ts_epoch, city_id, artist_id, weather_id, mood_category,
+            listeners, temperature), dans l'ordre des arguments de `apply_fact`
+    """
+    weather_mood: Dict[tuple, List] = {}
+    artists: Dict[tuple, List] = {}
+    for ts_epoch, city_id, artist_id, weather_id, mood_category, listeners, temperature in facts:
+        hour = hour_bucket(ts_epoch)
+        key = (hour, city_id,
+               weather_id if weather_id is not None else UNKNOWN_WEATHER_ID,
+               mood_category or UNKNOWN_MOOD)
+        totals = weather_mood.setdefault(key, [0, 0, 0])
+        totals[0] += 1
+        if temperature is not None:
+            totals[1] += temperature
+            totals[2] += 1
+
+        totals = artists.setdefault((hour, city_id, artist_id), [0, 0])
+        totals[0] += 1
+        totals[1] += listeners or 0
+
+    cursor.executemany(_UPSERT_WEATHER_MOOD, [key + tuple(t) for key, t in weather_mood.items()])
+    cursor.executemany(_UPSERT_ARTIST, [key + tuple(t) for key, t in artists.items()])
+
+
+def retract_fact(cursor, ts_epoch: int, city_id: int, artist_id: int, weather_id: Optional[int],
+                 mood_category: Optional[str], listeners: Optional[int], temperature: Optional[float]):
+    """
+    Retire des agrégats une ligne déjà comptée (inverse de `apply_fact`), avant de
+    compter sa nouvelle version ; les tranches qui retombent à zéro sont supprimées,
+    comme si elles n'avaient jamais été écrites (résultat identique à `rebuild_rollups`)
+    """
+    hour = hour_bucket(ts_epoch)
+    key = (hour, city_id,
+           weather_id if weather_id is not None else UNKNOWN_WEATHER_ID,
+           mood_category or UNKNOWN_MOOD)
+    cursor.execute(_UPSERT_WEATHER_MOOD, key + (
+        -1, -(temperature or 0), -1 if temperature is not None else 0
+    ))
+    cursor.execute('''
+        DELETE FROM rollup_weather_mood_hourly
+        WHERE hour_epoch = ? AND city_id = ? AND weather_id = ? AND mood_category = ? AND track_count <= 0
+    ''', key)
+    cursor.execute(_UPSERT_ARTIST, (hour, city_id, artist_id, -1, -(listeners or 0)))
+    cursor.execute('''
+        DELETE FROM rollup_artist_hourly
+        WHERE hour_epoch = ? AND city_id = ? AND artist_id = ? AND appearances <= 0
+    ''', (hour, city_id, artist_id))
+
+
+def adjust_artist_listeners(cursor, ts_epoch: int, city_id: int, artist_id: int, delta: int):
+    """Corrige la somme des listeners quand une ligne déjà comptée est mise à jour"""
+    if delta:
+        cursor.execute('''
+            UPDATE rollup_artist_hourly SET listeners_sum = listeners_sum + ?
+            WHERE hour_epoch = ? AND city_id = ? AND artist_id = ?
+        ''', (delta, hour_bucket(ts_epoch), city_id, artist_id))
+
+
+def ensure_rollups(conn, facts_table: str):
+    """Crée les tables d'agrégats et les reconstruit depuis les faits si elles sont vides"""
+    cursor = conn.cursor()
+
+    # Version précédente indexée par heure texte : les agrégats sont recalculables
+    cursor.execute("PRAGMA table_info(rollup_weather_mood_hourly)")
+    if 'hour' in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("DROP TABLE rollup_weather_mood_hourly")
+        cursor.execute("DROP TABLE IF EXISTS rollup_artist_hourly")
+        logger.info("🔄 Agrégats horaires convertis en clés epoch (reconstruction)")
+
+    for ddl in ROLLUP_TABLES_DDL:
+        cursor.execute(ddl)
+    conn.commit()
+
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM rollup_weather_mood_hourly)")
+    has_rollups = cursor.fetchone()[0]
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {facts_table})")
+    has_facts = cursor.fetchone()[0]
+
+    if has_facts and not has_rollups:
+        rebuild_rollups(conn, facts_table)
+
+
+def rebuild_rollups(conn, facts_table: str):
+    """
+    Recalcule les agrégats horaires à partir de la table de faits. Seules les heures
+    encore couvertes par le détail sont recalculées : les tranches antérieures (dont
+    le détail a été purgé par la rétention) et les agrégats journaliers sont conservés.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT MIN(ts_epoch) FROM {facts_table}")
+    first_epoch = cursor.fetchone()[0]
+    if first_epoch is None:
+        return
+
+    try:
+        cursor.execute("BEGIN")
+        start = hour_bucket(first_epoch)
+        cursor.execute("DELETE FROM rollup_weather_mood_hourly WHERE hour_epoch >= ?", (start,))
+        cursor.execute("DELETE FROM rollup_artist_hourly WHERE hour_epoch >= ?", (start,))
+        for sql in _REBUILD_SQL:
+            cursor.execute(sql.format(facts_table=facts_table))
+        conn.commit()
+        logger.info(f"✅ Agrégats reconstruits depuis {facts_table}")
+
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Erreur reconstruction des agrégats: {e}")
+        raise
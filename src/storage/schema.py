@@ -0,0 +1,434 @@
+# src/storage/schema.py
+import logging
+from typing import List, Optional, Set
+
+from .dimensions import DIMENSION_TABLES_DDL
+from .rollups import ensure_rollups
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------
+# OBSERVATIONS MÉTÉO (une ligne par ville et par relevé)
+# ---------------------------------------------------------
+WEATHER_OBSERVATIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS weather_observations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        city_id INTEGER NOT NULL REFERENCES dim_city(id),
+        observed_at DATETIME NOT NULL,
+        weather_id INTEGER REFERENCES dim_weather(id),
+        temperature REAL,
+        humidity INTEGER,
+        pressure INTEGER,
+        wind_speed REAL,
+        clouds INTEGER,
+        UNIQUE(city_id, observed_at)
+    )
+'''
+
+OBSERVATION_INDEXES_DDL = [
+    'CREATE INDEX IF NOT EXISTS idx_observation_weather ON weather_observations(weather_id)',
+    # Purge des relevés anciens (RetentionManager.purge_observations)
+    'CREATE INDEX IF NOT EXISTS idx_observation_observed_at ON weather_observations(observed_at)'
+]
+
+
+# ---------------------------------------------------------
+# TABLES DE FAITS
+# ---------------------------------------------------------
+TREND_FACTS_DDL = '''
+    CREATE TABLE IF NOT EXISTS trend_facts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        city_id INTEGER NOT NULL REFERENCES dim_city(id),
+        artist_id INTEGER NOT NULL REFERENCES dim_artist(id),
+        track_id INTEGER NOT NULL REFERENCES dim_track(id),
+        listeners INTEGER DEFAULT 0,
+        playcount INTEGER DEFAULT 0,
+        rank INTEGER DEFAULT 0,
+        observation_id INTEGER REFERENCES weather_observations(id),
+        mood_category TEXT,
+        weather_id INTEGER REFERENCES dim_weather(id),
+        ts_epoch INTEGER,
+        day_bucket INTEGER,
+        UNIQUE(city_id, track_id, timestamp)
+    )
+'''
+
+PROCESSED_FACTS_DDL = '''
+    CREATE TABLE IF NOT EXISTS processed_track_facts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        processed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        city_id INTEGER NOT NULL REFERENCES dim_city(id),
+        artist_id INTEGER NOT NULL REFERENCES dim_artist(id),
+        track_id INTEGER NOT NULL REFERENCES dim_track(id),
+        listeners INTEGER,
+        playcount INTEGER,
+        rank_position INTEGER,
+        observation_id INTEGER REFERENCES weather_observations(id),
+        mood_category TEXT,
+        popularity_score REAL,
+        raw_data_path TEXT,
+        weather_id INTEGER REFERENCES dim_weather(id),
+        ts_epoch INTEGER,
+        day_bucket INTEGER,
+        UNIQUE(city_id, track_id, processed_at),
+        CHECK (listeners >= 0),
+        CHECK (playcount >= 0)
+    )
+'''
+
+# ts_epoch (secondes Unix UTC) et day_bucket (ts_epoch / 86400) : les fenêtres
+# horaires et journalières deviennent des parcours d'intervalle sur des entiers.
+# Les noms d'index sont globaux à la base : ils sont préfixés par leur table
+TREND_INDEXES_DDL = [
+    'CREATE INDEX IF NOT EXISTS idx_trend_facts_city_epoch ON trend_facts(city_id, ts_epoch)',
+    'CREATE INDEX IF NOT EXISTS idx_trend_facts_epoch_weather_mood ON trend_facts(ts_epoch, weather_id, mood_category)',
+    # Un relevé est-il encore référencé ? (purge des relevés, sans parcours des faits)
+    'CREATE INDEX IF NOT EXISTS idx_trend_facts_observation ON trend_facts(observation_id)'
+]
+
+PROCESSED_INDEXES_DDL = [
+    'CREATE INDEX IF NOT EXISTS idx_processed_track_facts_city_epoch ON processed_track_facts(city_id, ts_epoch)',
+    'CREATE INDEX IF NOT EXISTS idx_processed_track_facts_epoch_weather_mood '
+    'ON processed_track_facts(ts_epoch, weather_id, mood_category)',
+    'CREATE INDEX IF NOT EXISTS idx_processed_track_facts_observation ON processed_track_facts(observation_id)'
+]
+
+# Index remplacés par les index sur ts_epoch, puis renommés avec leur table
+OBSOLETE_INDEXES = ['idx_city_timestamp', 'idx_trend_observation', 'idx_city_weather', 'idx_mood_weather',
+                    'idx_city_epoch', 'idx_epoch_weather_mood']
+
+EPOCH_COLUMNS = ['weather_id', 'ts_epoch', 'day_bucket']
+
+# Remplissage des colonnes ajoutées, dans l'ordre (day_bucket dépend de ts_epoch)
+EPOCH_BACKFILL_SQL = {
+    'ts_epoch': '''UPDATE {facts_table} SET ts_epoch = CAST(strftime('%s', {time_column}) AS INTEGER)
+                   WHERE ts_epoch IS NULL AND {time_column} IS NOT NULL''',
+    'day_bucket': '''UPDATE {facts_table} SET day_bucket = ts_epoch / 86400
+                     WHERE day_bucket IS NULL AND ts_epoch IS NOT NULL''',
+    'weather_id': '''UPDATE {facts_table} SET weather_id = (
+                         SELECT o.weather_id FROM weather_observations o
+                         WHERE o.id = {facts_table}.observation_id
+                     )
+                     WHERE weather_id IS NULL AND observation_id IN (
+                         SELECT id FROM weather_observations WHERE weather_id IS NOT NULL
+                     )'''
+}
+
+
+# ---------------------------------------------------------
+# VUES DE COMPATIBILITÉ (mêmes colonnes que les anciennes tables)
+# ---------------------------------------------------------
+CITY_MUSIC_TRENDS_VIEW = '''
+    CREATE VIEW city_music_trends AS
+    SELECT
+        f.id,
+        f.timestamp,
+        c.city,
+        c.country,
+        t.name AS track_name,
+        a.name AS artist_name,
+        f.listeners,
+        f.playcount,
+        f.rank,
+        w.main AS weather_main,
+        w.description AS weather_description,
+        o.temperature,
+        o.humidity,
+        o.pressure,
+        f.mood_category
+    FROM trend_facts f
+    JOIN dim_city c ON c.id = f.city_id
+    JOIN dim_artist a ON a.id = f.artist_id
+    JOIN dim_track t ON t.id = f.track_id
+    LEFT JOIN weather_observations o ON o.id = f.observation_id
+    LEFT JOIN dim_weather w ON w.id = o.weather_id
+'''
+
+PROCESSED_TRACKS_VIEW = '''
+    CREATE VIEW processed_tracks AS
+    SELECT
+        f.id,
+        f.processed_at,
+        c.city,
+        c.country,
+        t.name AS track_name,
+        a.name AS artist_name,
+        f.listeners,
+        f.playcount,
+        f.rank_position,
+        w.main AS weather_condition,
+        w.description AS weather_description,
+        o.temperature,
+        o.humidity,
+        o.wind_speed,
+        f.mood_category,
+        f.popularity_score,
+        f.raw_data_path
+    FROM processed_track_facts f
+    JOIN dim_city c ON c.id = f.city_id
+    JOIN dim_artist a ON a.id = f.artist_id
+    JOIN dim_track t ON t.id = f.track_id
+    LEFT JOIN weather_observations o ON o.id = f.observation_id
+    LEFT JOIN dim_weather w ON w.id = o.weather_id
+'''
+
+
+# ---------------------------------------------------------
+# MIGRATION DES ANCIENNES TABLES DÉNORMALISÉES
+# ---------------------------------------------------------
+_LEGACY_DIMENSIONS_SQL = [
+    "INSERT OR IGNORE INTO dim_city (city, country) SELECT DISTINCT city, country FROM {legacy}",
+    "INSERT OR IGNORE INTO dim_artist (name) SELECT DISTINCT artist_name FROM {legacy}",
+    '''INSERT OR IGNORE INTO dim_track (artist_id, name)
+       SELECT DISTINCT a.id, l.track_name FROM {legacy} l JOIN dim_artist a ON a.name = l.artist_name'''
+]
+
+TREND_LEGACY_COLUMNS = ['city', 'country', 'track_name', 'artist_name', 'weather_main']
+
+TREND_MIGRATION_SQL = _LEGACY_DIMENSIONS_SQL + [
+    '''INSERT OR IGNORE INTO dim_weather (main, description)
+       SELECT DISTINCT weather_main, COALESCE(weather_description, '') FROM {legacy}
+       WHERE weather_main IS NOT NULL''',
+    '''INSERT OR IGNORE INTO weather_observations
+       (city_id, observed_at, weather_id, temperature, humidity, pressure)
+       SELECT c.id, l.timestamp, w.id, l.temperature, l.humidity, l.pressure
+       FROM {legacy} l
+       JOIN dim_city c ON c.city = l.city AND c.country = l.country
+       LEFT JOIN dim_weather w ON w.main = l.weather_main
+            AND w.description = COALESCE(l.weather_description, '')
+       WHERE l.timestamp IS NOT NULL''',
+    '''INSERT OR IGNORE INTO trend_facts
+       (id, timestamp, city_id, artist_id, track_id, listeners, playcount, rank,
+        observation_id, mood_category)
+       SELECT l.id, l.timestamp, c.id, a.id, t.id, l.listeners, l.playcount, l.rank,
+              o.id, l.mood_category
+       FROM {legacy} l
+       JOIN dim_city c ON c.city = l.city AND c.country = l.country
+       JOIN dim_artist a ON a.name = l.artist_name
+       JOIN dim_track t ON t.artist_id = a.id AND t.name = l.track_name
+       LEFT JOIN weather_observations o ON o.city_id = c.id AND o.observed_at = l.timestamp'''
+]
+
+PROCESSED_LEGACY_COLUMNS = ['city', 'country', 'track_name', 'artist_name', 'weather_condition']
+
+PROCESSED_MIGRATION_SQL = _LEGACY_DIMENSIONS_SQL + [
+    '''INSERT OR IGNORE INTO dim_weather (main, description)
+       SELECT DISTINCT weather_condition, COALESCE(weather_description, '') FROM {legacy}
+       WHERE weather_condition IS NOT NULL''',
+    '''INSERT OR IGNORE INTO weather_observations
+       (city_id, observed_at, weather_id, temperature, humidity, wind_speed)
+       SELECT c.id, l.processed_at, w.id, l.temperature, l.humidity, l.wind_speed
+       FROM {legacy} l
+       JOIN dim_city c ON c.city = l.city AND c.country = l.country
+       LEFT JOIN dim_weather w ON w.main = l.weather_condition
+            AND w.description = COALESCE(l.weather_description, '')
+       WHERE l.processed_at IS NOT NULL''',
+    '''INSERT OR IGNORE INTO processed_track_facts
+       (id, processed_at, city_id, artist_id, track_id, listeners, playcount, rank_position,
+        observation_id, mood_category, popularity_score, raw_data_path)
+       SELECT l.id, l.processed_at, c.id, a.id, t.id, l.listeners, l.playcount, l.rank_position,
+              o.id, l.mood_category, l.popularity_score, l.raw_data_path
+       FROM {legacy} l
+       JOIN dim_city c ON c.city = l.city AND c.country = l.country
+       JOIN dim_artist a ON a.name = l.artist_name
+       JOIN dim_track t ON t.artist_id = a.id AND t.name = l.track_name
+       LEFT JOIN weather_observations o ON o.city_id = c.id AND o.observed_at = l.processed_at'''
+]
+
+
+# ---------------------------------------------------------
+# MIGRATION DES TABLES DE FAITS QUI PORTAIENT LA MÉTÉO PAR LIGNE
+# ---------------------------------------------------------
+TREND_REBUILD_SQL = [
+    '''INSERT OR IGNORE INTO weather_observations
+       (city_id, observed_at, weather_id, temperature, humidity, pressure)
+       SELECT city_id, timestamp, weather_id, temperature, humidity, pressure
+       FROM {previous} WHERE timestamp IS NOT NULL''',
+    '''INSERT INTO trend_facts
+       (id, timestamp, city_id, artist_id, track_id, listeners, playcount, rank,
+        observation_id, mood_category)
+       SELECT f.id, f.timestamp, f.city_id, f.artist_id, f.track_id, f.listeners,
+              f.playcount, f.rank, o.id, f.mood_category
+       FROM {previous} f
+       LEFT JOIN weather_observations o ON o.city_id = f.city_id AND o.observed_at = f.timestamp'''
+]
+
+PROCESSED_REBUILD_SQL = [
+    '''INSERT OR IGNORE INTO weather_observations
+       (city_id, observed_at, weather_id, temperature, humidity, wind_speed)
+       SELECT city_id, processed_at, weather_id, temperature, humidity, wind_speed
+       FROM {previous} WHERE processed_at IS NOT NULL''',
+    '''INSERT INTO processed_track_facts
+       (id, processed_at, city_id, artist_id, track_id, listeners, playcount, rank_position,
+        observation_id, mood_category, popularity_score, raw_data_path)
+       SELECT f.id, f.processed_at, f.city_id, f.artist_id, f.track_id, f.listeners,
+              f.playcount, f.rank_position, o.id, f.mood_category, f.popularity_score,
+              f.raw_data_path
+       FROM {previous} f
+       LEFT JOIN weather_observations o ON o.city_id = f.city_id AND o.observed_at = f.processed_at'''
+]
+
+
+def ensure_trends_schema(conn):
+    """Crée (ou met à jour) le schéma normalisé de la base du collecteur"""
+    _ensure_schema(
+        conn,
+        facts_table='trend_facts',
+        time_column='timestamp',
+        facts_ddl=TREND_FACTS_DDL,
+        indexes_ddl=TREND_INDEXES_DDL,
+        view_name='city_music_trends',
+        view_ddl=CITY_MUSIC_TRENDS_VIEW,
+        legacy_columns=TREND_LEGACY_COLUMNS,
+        migration_sql=TREND_MIGRATION_SQL,
+        rebuild_sql=TREND_REBUILD_SQL
+    )
+
+
+def ensure_processed_schema(conn):
+    """Crée (ou met à jour) le schéma normalisé de la base ETL"""
+    _ensure_schema(
+        conn,
+        facts_table='processed_track_facts',
+        time_column='processed_at',
+        facts_ddl=PROCESSED_FACTS_DDL,
+        indexes_ddl=PROCESSED_INDEXES_DDL,
+        view_name='processed_tracks',
+        view_ddl=PROCESSED_TRACKS_VIEW,
+        legacy_columns=PROCESSED_LEGACY_COLUMNS,
+        migration_sql=PROCESSED_MIGRATION_SQL,
+        rebuild_sql=PROCESSED_REBUILD_SQL
+    )
+
+
+def _ensure_schema(conn, facts_table: str, time_column: str, facts_ddl: str, indexes_ddl: List[str],
+                   view_name: str, view_ddl: str, legacy_columns: List[str],
+                   migration_sql: List[str], rebuild_sql: List[str]):
+    cursor = conn.cursor()
+
+    # Sans effet sur une base existante (il faut un VACUUM, voir RetentionManager) :
+    # les nouvelles bases rendent l'espace libéré via PRAGMA incremental_vacuum
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    # La vue est toujours recréée pour suivre l'évolution des tables de faits
+    if _object_type(cursor, view_name) == 'view':
+        cursor.execute(f"DROP VIEW {view_name}")
+
+    for ddl in DIMENSION_TABLES_DDL:
+        cursor.execute(ddl)
+    cursor.execute(WEATHER_OBSERVATIONS_DDL)
+    conn.commit()
+
+    # Table de faits d'une version précédente (météo recopiée sur chaque ligne)
+    existing_columns = _table_columns(cursor, facts_table)
+    if existing_columns and 'observation_id' not in existing_columns:
+        _rebuild_facts_table(conn, facts_table, facts_ddl, rebuild_sql)
+
+    cursor.execute(facts_ddl)
+    conn.commit()
+
+    # Une ancienne table dénormalisée porte encore le nom de la vue
+    if _object_type(cursor, view_name) == 'table':
+        _migrate_legacy_table(conn, view_name, legacy_columns, migration_sql)
+
+    _ensure_epoch_columns(conn, facts_table, time_column)
+
+    for name in OBSOLETE_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    for ddl in OBSERVATION_INDEXES_DDL + indexes_ddl:
+        cursor.execute(ddl)
+
+    cursor.execute(view_ddl)
+    conn.commit()
+
+    # Agrégats maintenus de façon incrémentale par les writers
+    ensure_rollups(conn, facts_table)
+
+
+def _object_type(cursor, name: str) -> Optional[str]:
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _table_columns(cursor, table: str) -> Set[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _ensure_epoch_columns(conn, facts_table: str, time_column: str):
+    """Ajoute les colonnes d'horodatage entier et les remplit pour les lignes existantes"""
+    cursor = conn.cursor()
+    existing = _table_columns(cursor, facts_table)
+
+    try:
+        cursor.execute("BEGIN")
+        for name in EPOCH_COLUMNS:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {facts_table} ADD COLUMN {name} INTEGER")
+        for column, sql in EPOCH_BACKFILL_SQL.items():
+            cursor.execute(sql.format(facts_table=facts_table, time_column=time_column))
+            if cursor.rowcount > 0:
+                logger.info(f"🕒 {facts_table}.{column}: {cursor.rowcount} lignes complétées")
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Erreur ajout des colonnes epoch sur {facts_table}: {e}")
+        raise
+
+
+def _migrate_legacy_table(conn, table: str, required_columns: List[str], migration_sql: List[str]):
+    """
+    Migre une ancienne table dénormalisée vers les dimensions + table de faits,
+    puis la supprime pour libérer son nom au profit de la vue de compatibilité.
+    """
+    legacy = f"{table}_legacy"
+    cursor = conn.cursor()
+
+    missing = [c for c in required_columns if c not in _table_columns(cursor, table)]
+
+    try:
+        cursor.execute("BEGIN")
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+
+        if missing:
+            # Schéma inconnu : on conserve la table telle quelle sous un autre nom
+            logger.warning(f"⚠️  {table}: colonnes manquantes {missing} - table conservée sous {legacy}")
+        else:
+            for sql in migration_sql:
+                cursor.execute(sql.format(legacy=legacy))
+            cursor.execute(f"SELECT COUNT(*) FROM {legacy}")
+            migrated = cursor.fetchone()[0]
+            cursor.execute(f"DROP TABLE {legacy}")
+            logger.info(f"✅ {table}: {migrated} lignes migrées vers le schéma normalisé")
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Erreur migration {table}: {e}")
+        raise
+
+
+def _rebuild_facts_table(conn, table: str, facts_ddl: str, rebuild_sql: List[str]):
+    """Reconstruit une table de faits en extrayant la météo vers weather_observations"""
+    previous = f"{table}_previous"
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("BEGIN")
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {previous}")
+        cursor.execute(facts_ddl)
+        for sql in rebuild_sql:
+            cursor.execute(sql.format(previous=previous))
+        cursor.execute(f"DROP TABLE {previous}")
+        conn.commit()
+        logger.info(f"✅ {table}: météo extraite vers weather_observations")
+
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Erreur reconstruction {table}: {e}")
+        raise
@@ -0,0 +1,304 @@
+# src/storage/writers.py
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from .dimensions import DimensionCache
+from .rollups import apply_fact, apply_facts, adjust_artist_listeners, day_bucket, retract_fact
+
+
+def utc_timestamp() -> str:
+    """Horodatage UTC au format SQLite (identique à CURRENT_TIMESTAMP)"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def epoch_seconds(timestamp: str) -> int:
+    """Horodatage SQLite ou ISO 8601 (UTC si sans fuseau) → secondes Unix"""
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+class WeatherObservationWriter:
+    """
+    Écrit un relevé météo une seule fois par (ville, instant d'observation).
+    Les derniers relevés résolus sont gardés en cache : les N morceaux d'un même
+    snapshot partagent le même identifiant sans relecture en base.
+    """
+
+    def __init__(self, dimensions: DimensionCache, max_entries: int = 1024):
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self._ids: "OrderedDict[tuple, int]" = OrderedDict()
+        self._details: Dict[int, Tuple[Optional[int], Optional[float]]] = {}
+
+    def write(self, cursor, city_id: int, observed_at: str, weather: Dict) -> int:
+        """
+        Args:
+            weather: Dictionnaire au format de LastFmWeatherCollector.get_city_weather
+                (main, description, temperature, humidity, pressure, wind_speed, clouds)
+        """
+        key = (city_id, observed_at)
+        cached = self._ids.get(key)
+        if cached is not None:
+            return cached
+
+        weather_id = self.dimensions.weather_id(cursor, weather.get('main'), weather.get('description'))
+        cursor.execute('''
+            INSERT OR IGNORE INTO weather_observations
+            (city_id, observed_at, weather_id, temperature, humidity, pressure, wind_speed, clouds)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            city_id, observed_at, weather_id,
+            weather.get('temperature'), weather.get('humidity'), weather.get('pressure'),
+            weather.get('wind_speed'), weather.get('clouds')
+        ))
+        cursor.execute('''
+            SELECT id, weather_id, temperature FROM weather_observations
+            WHERE city_id = ? AND observed_at = ?
+        ''', (city_id, observed_at))
+        observation_id, stored_weather_id, temperature = cursor.fetchone()
+
+        self._remember(key, observation_id, stored_weather_id, temperature)
+        return observation_id
+
+    def details(self, cursor, observation_id: Optional[int]) -> Tuple[Optional[int], Optional[float]]:
+        """(weather_id, temperature) d'un relevé, depuis le cache ou la base"""
+        if observation_id is None:
+            return None, None
+        if observation_id not in self._details:
+            cursor.execute(
+                "SELECT weather_id, temperature FROM weather_observations WHERE id = ?",
+                (observation_id,)
+            )
+            row = cursor.fetchone()
+            return tuple(row) if row else (None, None)
+        return self._details[observation_id]
+
+    def clear(self):
+        self._ids.clear()
+        self._details.clear()
+
+    def _remember(self, key: tuple, observation_id: int, weather_id: Optional[int], temperature: Optional[float]):
+        self._ids[key] = observation_id
+        self._details[observation_id] = (weather_id, temperature)
+        if len(self._ids) > self.max_entries:
+            _, evicted_id = self._ids.popitem(last=False)
+            self._details.pop(evicted_id, None)
+
+
+class _FactWriter:
+    def __init__(self, dimensions: Optional[DimensionCache] = None):
+        self.dimensions = dimensions or DimensionCache()
+        self.observations = WeatherObservationWriter(self.dimensions)
+
+    def write_observation(self, cursor, city: str, country: str, observed_at: str, weather: Dict) -> int:
+        """Enregistre (ou retrouve) le relevé météo d'une ville et retourne son identifiant"""
+        city_id = self.dimensions.city_id(cursor, city, country)
+        return self.observations.write(cursor, city_id, observed_at, weather)
+
+    def clear_caches(self):
+        """À appeler après un rollback : des ids non commités ont pu entrer dans les caches"""
+        self.dimensions.clear()
+        self.observations.clear()
+
+    def _recount_duplicate(self, cursor, facts_table: str, time_column: str, timestamp: str,
+                           track_id: int, rollup: Tuple):
+        """
+        Agrégats d'un doublon sur le point d'être réécrit : la ligne en base est déjà
+        comptée. Seule la différence de listeners est reportée si météo, humeur et
+        température sont inchangées ; sinon l'ancienne ligne est retirée et la nouvelle
+        comptée (appeler avant l'UPDATE)
+
+        Args:
+            rollup: Nouvelle ligne, arguments de `apply_fact` (ts_epoch, city_id, artist_id,
+                weather_id, mood_category, listeners, temperature)
+        """
+        ts_epoch, city_id, artist_id, weather_id, mood_category, listeners, temperature = rollup
+        cursor.execute(f'''
+            SELECT f.listeners, f.weather_id, f.mood_category, o.temperature
+            FROM {facts_table} f
+            LEFT JOIN weather_observations o ON o.id = f.observation_id
+            WHERE f.{time_column} = ? AND f.city_id = ? AND f.track_id = ?
+        ''', (timestamp, city_id, track_id))
+        row = cursor.fetchone()
+        if row is None:
+            return
+        old_listeners, old_weather_id, old_mood, old_temperature = row
+        if (old_weather_id, old_mood or None, old_temperature) == (weather_id, mood_category or None, temperature):
+            adjust_artist_listeners(cursor, ts_epoch, city_id, artist_id, (listeners or 0) - (old_listeners or 0))
+            return
+        retract_fact(cursor, ts_epoch, city_id, artist_id, old_weather_id, old_mood, old_listeners, old_temperature)
+        apply_fact(cursor, *rollup)
+
+
+class TrendWriter(_FactWriter):
+    """Écrit les points de données du collecteur dans la table de faits trend_facts"""
+
+    _INSERT = '''
+        INSERT INTO trend_facts
+        (listeners, playcount, rank, observation_id, mood_category, weather_id,
+         timestamp, ts_epoch, day_bucket, city_id, artist_id, track_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING
+    '''
+
+    _UPDATE = '''
+        UPDATE trend_facts
+        SET listeners = ?, playcount = ?, rank = ?, observation_id = ?, mood_category = ?,
+            weather_id = ?
+        WHERE timestamp = ? AND city_id = ? AND track_id = ?
+    '''
+
+    def write(self, cursor, data: Dict) -> bool:
+        """
+        Insère un point de données (ou met à jour un doublon exact) ; le commit reste
+        à la charge de l'appelant. La météo portée par le point est enregistrée une seule
+        fois par (ville, timestamp) et les agrégats sont mis à jour dans la même transaction.
+
+        Returns:
+            True si une nouvelle ligne a été insérée, False si un doublon a été mis à jour
+        """
+        row = self._prepare(cursor, data)
+        cursor.execute(self._INSERT, row['insert'])
+
+        if cursor.rowcount == 0:
+            # Doublon (même ville, morceau et instant) : déjà compté dans les agrégats
+            self._update_duplicate(cursor, row)
+            return False
+
+        apply_fact(cursor, *row['rollup'])
+        return True
+
+    def write_many(self, cursor, data_points: List[Dict]) -> List[bool]:
+        """
+        Version groupée de `write` pour un lot de points (un snapshot ou un cycle) :
+        les doublons sont repérés par une lecture par (ville, timestamp), les nouvelles
+        lignes partent en un seul executemany et les agrégats sont sommés avant écriture.
+
+        Returns:
+            Pour chaque point, dans l'ordre : True si inséré, False si doublon mis à jour
+        """
+        rows = [self._prepare(cursor, data) for data in data_points]
+
+        # Clés déjà en base, une requête par (ville, timestamp)
+        snapshots: Dict[tuple, set] = {}
+        for row in rows:
+            snapshots.setdefault(row['key'][:2], set()).add(row['key'][2])
+        existing = set()
+        for (city_id, timestamp), track_ids in snapshots.items():
+            track_ids = list(track_ids)
+            cursor.execute(f'''
+                SELECT track_id FROM trend_facts
+                WHERE city_id = ? AND timestamp = ? AND track_id IN ({', '.join('?' * len(track_ids))})
+            ''', [city_id, timestamp] + track_ids)
+            existing.update((city_id, timestamp, track_id) for (track_id,) in cursor.fetchall())
+
+        inserted, duplicates = [], []
+        for row in rows:
+            if row['key'] in existing:
+                duplicates.append(row)
+                row['inserted'] = False
+            else:
+                # Un même morceau deux fois dans le lot : la seconde occurrence met à jour
+                existing.add(row['key'])
+                inserted.append(row)
+                row['inserted'] = True
+
+        if inserted:
+            cursor.executemany(self._INSERT, [row['insert'] for row in inserted])
+            apply_facts(cursor, [row['rollup'] for row in inserted])
+        for row in duplicates:
+            self._update_duplicate(cursor, row)
+
+        return [row['inserted'] for row in rows]
+
+    def _prepare(self, cursor, data: Dict) -> Dict:
+        """Résout dimensions et relevé météo d'un point et prépare les paramètres SQL"""
+        timestamp = data.get('timestamp') or utc_timestamp()
+        ts_epoch = epoch_seconds(timestamp)
+        city_id = self.dimensions.city_id(cursor, data['city'], data['country'])
+        artist_id = self.dimensions.artist_id(cursor, data['artist_name'])
+        track_id = self.dimensions.track_id(cursor, data['track_name'], artist_id)
+
+        observation_id = None
+        if data.get('weather_main') is not None:
+            observation_id = self.observations.write(cursor, city_id, timestamp, {
+                'main': data['weather_main'],
+                'description': data.get('weather_description'),
+                'temperature': data.get('temperature'),
+                'humidity': data.get('humidity'),
+                'pressure': data.get('pressure'),
+                'wind_speed': data.get('wind_speed'),
+                'clouds': data.get('clouds')
+            })
+
+        weather_id, temperature = self.observations.details(cursor, observation_id)
+
+        values = (
+            data.get('listeners', 0), data.get('playcount', 0), data.get('rank', 0),
+            observation_id, data.get('mood_category'), weather_id
+        )
+        return {
+            'key': (city_id, timestamp, track_id),
+            'values': values,
+            'insert': values + (timestamp, ts_epoch, day_bucket(ts_epoch), city_id, artist_id, track_id),
+            'rollup': (ts_epoch, city_id, artist_id, weather_id, data.get('mood_category'),
+                       data.get('listeners', 0), temperature)
+        }
+
+    def _update_duplicate(self, cursor, row: Dict):
+        city_id, timestamp, track_id = row['key']
+        self._recount_duplicate(cursor, 'trend_facts', 'timestamp', timestamp, track_id, row['rollup'])
+        cursor.execute(self._UPDATE, row['values'] + (timestamp, city_id, track_id))
+
+
+class ProcessedTrackWriter(_FactWriter):
+    """Écrit les enregistrements transformés par l'ETL dans processed_track_facts"""
+
+    def write(self, cursor, record: Dict, observation_id: Optional[int] = None) -> bool:
+        """
+        Insère un enregistrement (ou met à jour un doublon exact) et met à jour les
+        agrégats ; le commit reste à la charge de l'appelant.
+
+        Returns:
+            True si une nouvelle ligne a été insérée, False si un doublon a été mis à jour
+        """
+        processed_at = record.get('processed_at') or utc_timestamp()
+        ts_epoch = epoch_seconds(processed_at)
+        city_id = self.dimensions.city_id(cursor, record['city'], record['country'])
+        artist_id = self.dimensions.artist_id(cursor, record['artist_name'])
+        track_id = self.dimensions.track_id(cursor, record['track_name'], artist_id)
+
+        weather_id, temperature = self.observations.details(cursor, observation_id)
+
+        values = (
+            record['listeners'], record['playcount'], record['rank_position'],
+            observation_id, record['mood_category'], record['popularity_score'],
+            record['raw_data_path'], weather_id
+        )
+        cursor.execute('''
+            INSERT INTO processed_track_facts
+            (listeners, playcount, rank_position, observation_id, mood_category,
+             popularity_score, raw_data_path, weather_id, processed_at, ts_epoch, day_bucket,
+             city_id, artist_id, track_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        ''', values + (processed_at, ts_epoch, day_bucket(ts_epoch), city_id, artist_id, track_id))
+
+        rollup = (ts_epoch, city_id, artist_id, weather_id, record['mood_category'],
+                  record['listeners'], temperature)
+        if cursor.rowcount == 0:
+            self._recount_duplicate(cursor, 'processed_track_facts', 'processed_at', processed_at,
+                                    track_id, rollup)
+            cursor.execute('''
+                UPDATE processed_track_facts
+                SET listeners = ?, playcount = ?, rank_position = ?, observation_id = ?,
+                    mood_category = ?, popularity_score = ?, raw_data_path = ?, weather_id = ?
+                WHERE processed_at = ? AND city_id = ? AND track_id = ?
+            ''', values + (processed_at, city_id, track_id))
+            return False
+
+        apply_fact(cursor, *rollup)
+        return True
@@ -35,19 +35,15 @@ def load_config():
         'max_retries': int(os.getenv('MAX_RETRIES', 3))
     }
 
-def backup_database():
-    """Crée une sauvegarde de la base de données"""
-    backup_dir = os.getenv('DB_BACKUP_DIR', 'data/backup')
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_file = f"{backup_dir}/backup_{timestamp}.db"
-    
-    # Copie simple pour SQLite
-    import shutil
-    shutil.copy2('data/lastfm_weather.db', backup_file)
-    
-    return backup_file
+def backup_database(db_path: str = 'data/lastfm_weather.db'):
+    """
+    Crée une sauvegarde en ligne de la base (API de backup SQLite, instantané
+    compressé complet ou incrémental, rotation grand-père / père / fils)
+    """
+    from storage import BackupManager
+
+    entry = BackupManager(db_path).snapshot()
+    return os.path.join(os.getenv('DB_BACKUP_DIR', 'data/backup'), entry['file'])
 
 def validate_environment():
     """Valide que toutes les variables d'environnement nécessaires sont présentes"""
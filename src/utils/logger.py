@@ -1,29 +1,204 @@
 # src/utils/logger.py
+import atexit
+import copy
+import json
 import logging
-import sys
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from metrics import REGISTRY
+
+DROPPED = REGISTRY.counter('log_records_dropped_total', "Enregistrements de log perdus (file d'attente pleine)")
+SUPPRESSED = REGISTRY.counter('log_records_suppressed_total', "Messages de log par enregistrement omis par la limitation",
+                              ['logger'])
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributs standard d'un LogRecord : tout le reste vient de `extra=` et part dans le JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_queue_handler: Optional['QueuedHandler'] = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objet JSON par ligne : ts, level, logger, message, champs `extra=` et exception"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class QueuedHandler(logging.handlers.QueueHandler):
+    """
+    Handler à file d'attente : l'appelant crée l'enregistrement et le dépose dans une
+    file, un thread d'écriture (QueueListener) résout le message, formate la trace et
+    écrit sur les handlers réels. L'appelant ne paie plus le formatage ni l'I/O, mais
+    le thread d'écriture partage le GIL : le gain pour l'appelant reste limité.
+    File pleine (`maxsize`, approximatif) : un enregistrement sous WARNING est perdu
+    et compté (log_records_dropped_total), un WARNING ou plus est écrit de façon
+    synchrone par l'appelant.
+    """
+
+    # Arguments qui peuvent traverser la file tels quels (immuables)
+    _IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+    def __init__(self, handlers: List[logging.Handler], maxsize: int = 10000):
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = maxsize
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() < self.maxsize:
+            self.queue.put(record)
+        elif record.levelno >= logging.WARNING and self.listener is not None:
+            self.listener.handle(record)
+        else:
+            self.dropped += 1
+            DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Le formatage (message, trace) est fait par le thread d'écriture. Seuls des
+        # arguments mutables, qui pourraient changer avant l'écriture, imposent de
+        # résoudre le message ici (sur une copie : les autres handlers voient l'original)
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, self._IMMUTABLE_ARGS) for arg in args)):
+            record = copy.copy(record)
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def close(self):
+        # Vide la file vers les handlers réels avant de les laisser se fermer
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+class RateLimitedLogger:
+    """
+    Journalisation des messages par enregistrement (track, fichier, appel API) sur les
+    chemins chauds : seau à jetons par gabarit de message, `burst` messages d'affilée
+    puis au plus `rate` par seconde. Le nombre de messages omis est ajouté au suivant
+    émis. Les arguments sont formatés paresseusement (style %), seulement si émis.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: Optional[float] = None, burst: Optional[int] = None):
+        """
+        Args:
+            logger: Logger sous-jacent
+            rate: Messages par seconde et par gabarit (LOG_SAMPLE_RATE, 5)
+            burst: Messages émis d'affilée avant limitation (LOG_SAMPLE_BURST, 20)
+        """
+        self.logger = logger
+        self.rate = rate or float(os.getenv('LOG_SAMPLE_RATE', 5))
+        self.burst = burst or int(os.getenv('LOG_SAMPLE_BURST', 20))
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._suppressed = SUPPRESSED.labels(logger.name)
+
+    def debug(self, msg: str, *args, **kwargs):
+        self._log(logging.DEBUG, msg, args, kwargs)
+
+    def info(self, msg: str, *args, **kwargs):
+        self._log(logging.INFO, msg, args, kwargs)
+
+    def warning(self, msg: str, *args, **kwargs):
+        self._log(logging.WARNING, msg, args, kwargs)
+
+    def error(self, msg: str, *args, **kwargs):
+        self._log(logging.ERROR, msg, args, kwargs)
+
+    def log(self, level: int, msg: str, *args, **kwargs):
+        self._log(level, msg, args, kwargs)
+
+    def _log(self, level: int, msg: str, args: tuple, kwargs: Dict):
+        # Chaque point d'entrée appelle _log directement : l'appelant est toujours
+        # deux cadres au-dessus de cette méthode (stacklevel de l'appelant décalé d'autant)
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            # [jetons, dernier instant, messages omis]
+            bucket = self._buckets.get(msg)
+            if bucket is None:
+                bucket = self._buckets[msg] = [float(self.burst), now, 0]
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                self._suppressed.inc()
+                return
+            bucket[0] -= 1.0
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            msg = f"{msg} [+{suppressed} messages similaires omis]"
+            kwargs.setdefault('extra', {})['suppressed'] = suppressed
+        kwargs['stacklevel'] = kwargs.get('stacklevel', 1) + 2
+        self.logger.log(level, msg, *args, **kwargs)
+
+
+def build_handlers(log_dir: str = 'logs') -> List[logging.Handler]:
+    """
+    Handlers réels : fichier du jour (LOG_FILE_FORMAT, json par défaut) et console
+    (LOG_CONSOLE_FORMAT, text par défaut)
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.FileHandler(os.path.join(log_dir, f'collector_{datetime.now().strftime("%Y%m%d")}.log'))
+    console_handler = logging.StreamHandler(sys.stdout)
+    for handler, variable, default in ((file_handler, 'LOG_FILE_FORMAT', 'json'),
+                                       (console_handler, 'LOG_CONSOLE_FORMAT', 'text')):
+        if os.getenv(variable, default) == 'json':
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return [file_handler, console_handler]
+
 
 def setup_logging():
-    """Configure le système de logging"""
-    
-    # Créer le dossier logs si nécessaire
-    os.makedirs('logs', exist_ok=True)
-    
-    # Format des logs
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    
-    # Configuration de base
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=[
-            logging.FileHandler(f'logs/collector_{datetime.now().strftime("%Y%m%d")}.log'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
+    """
+    Configure le système de logging (une seule fois par processus) : les handlers
+    réels sont alimentés par une file et un thread d'écriture (LOG_QUEUE=false pour
+    écrire de façon synchrone), niveau LOG_LEVEL (INFO)
+    """
+    global _queue_handler
+
+    with _setup_lock:
+        root = logging.getLogger()
+        if not root.handlers:
+            handlers = build_handlers()
+            if os.getenv('LOG_QUEUE', 'true').lower() == 'true':
+                _queue_handler = QueuedHandler(handlers, int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+                root.addHandler(_queue_handler)
+                # Au cas où logging.shutdown ne passerait pas (fin de processus abrupte)
+                atexit.register(_queue_handler.close)
+            else:
+                for handler in handlers:
+                    root.addHandler(handler)
+            root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
     # Logger spécifique pour l'application
     logger = logging.getLogger('MusicWeatherAnalyzer')
-    
-    return logger
\ No newline at end of file
+
+    return logger
@@ -0,0 +1,211 @@
+# src/utils/profiling.py
+import cProfile
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+class _StackSampler:
+    """Échantillonne la pile d'un thread à intervalle fixe (piles repliées : racine;...;feuille)"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # Échantillon pris pendant stop() : il ne montrerait que l'attente du join
+            if stack and not self._stop.is_set():
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+class PhaseProfiler:
+    """
+    Profilage par phase des points d'entrée (cycle du collecteur, batch ETL, ingestion) :
+
+    - mode 'deterministic' : cProfile, un fichier .prof (pstats) par phase et par cycle ;
+    - mode 'sampling' : échantillonnage de la pile, un fichier .folded (piles repliées,
+      lisible par flamegraph.pl / speedscope) par phase et par cycle.
+
+    Un résumé des N fonctions les plus coûteuses de chaque phase est écrit dans les logs.
+    Désactivé, `phase()` ne coûte qu'un test de booléen. Activable à chaud par signal
+    (`install_toggle_signal`).
+    """
+
+    def __init__(self, mode: Optional[str] = None, output_dir: Optional[str] = None,
+                 top_n: Optional[int] = None, sample_interval: Optional[float] = None):
+        """
+        Args:
+            mode: 'deterministic' ou 'sampling' (PROFILE_MODE, deterministic)
+            output_dir: Dossier des profils (PROFILE_DIR, logs/profiles)
+            top_n: Fonctions listées par phase dans les logs (PROFILE_TOP_N, 10)
+            sample_interval: Période d'échantillonnage en secondes (PROFILE_SAMPLE_INTERVAL, 0.005)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.mode = mode or os.getenv('PROFILE_MODE', 'deterministic')
+        if self.mode not in ('deterministic', 'sampling'):
+            raise ValueError(f"Mode de profilage inconnu: {self.mode}")
+        self.output_dir = output_dir or os.getenv('PROFILE_DIR', 'logs/profiles')
+        self.top_n = top_n or int(os.getenv('PROFILE_TOP_N', 10))
+        self.sample_interval = sample_interval or float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+        self.enabled = False
+        self._cycle = 0
+        self._active = False
+        self._phases: Dict[str, object] = {}
+        self._durations: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """Profile le bloc sous le nom `name` (cumulé si la phase se répète dans le cycle)"""
+        # Une phase imbriquée est comptée dans la phase englobante (un seul profileur actif)
+        if not self.enabled or self._active:
+            yield
+            return
+
+        self._active = True
+        started = time.perf_counter()
+        if self.mode == 'sampling':
+            sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                stacks = sampler.stop()
+                self._phases.setdefault(name, Counter()).update(stacks)
+                self._finish_phase(name, started)
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                if name in self._phases:
+                    self._phases[name].add(profile)
+                else:
+                    self._phases[name] = pstats.Stats(profile)
+                self._finish_phase(name, started)
+
+    def end_cycle(self, label: str = 'cycle') -> List[str]:
+        """
+        Écrit les profils des phases du cycle écoulé et en journalise le résumé
+
+        Returns:
+            Chemins des fichiers écrits
+        """
+        if not self._phases:
+            return []
+
+        self._cycle += 1
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        written = []
+
+        for name, profile in self._phases.items():
+            base = os.path.join(self.output_dir, f"{stamp}_{label}_{self._cycle:04d}_{name}")
+            if self.mode == 'sampling':
+                path = f"{base}.folded"
+                with open(path, 'w', encoding='utf-8') as f:
+                    for stack, count in profile.most_common():
+                        f.write(f"{stack} {count}\n")
+                summary = self._sampling_summary(profile)
+            else:
+                path = f"{base}.prof"
+                profile.dump_stats(path)
+                summary = self._deterministic_summary(profile)
+
+            written.append(path)
+            self.logger.info(
+                f"⏱️  Profil {label} #{self._cycle} phase '{name}': "
+                f"{self._durations[name] * 1000:.1f} ms → {path}"
+            )
+            for line in summary:
+                self.logger.info(f"      {line}")
+
+        self._phases.clear()
+        self._durations.clear()
+        return written
+
+    def install_toggle_signal(self, signum: Optional[int] = None) -> bool:
+        """
+        Bascule le profilage à chaque réception de `signum` (SIGUSR1 par défaut),
+        par ex. `kill -USR1 <pid>` sur un --monitor en cours
+
+        Returns:
+            False si le signal n'existe pas sur cette plateforme
+        """
+        signum = signum or getattr(signal, 'SIGUSR1', None)
+        if signum is None:
+            return False
+
+        def toggle(received, frame):
+            self.enabled = not self.enabled
+            self.logger.info(f"⏱️  Profilage {'activé' if self.enabled else 'désactivé'} (signal {received})")
+
+        signal.signal(signum, toggle)
+        return True
+
+    def _finish_phase(self, name: str, started: float):
+        self._durations[name] = self._durations.get(name, 0.0) + time.perf_counter() - started
+        self._active = False
+
+    def _deterministic_summary(self, stats: pstats.Stats) -> List[str]:
+        """Fonctions triées par temps cumulé : ncalls, temps propre, temps cumulé"""
+        rows: List[Tuple[float, float, int, str]] = []
+        for (filename, line, function), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append((cumtime, tottime, ncalls, f"{function} ({os.path.basename(filename)}:{line})"))
+        rows.sort(reverse=True)
+        return [
+            f"{cumtime * 1000:9.1f} ms cumulé {tottime * 1000:9.1f} ms propre {ncalls:>7} appels  {where}"
+            for cumtime, tottime, ncalls, where in rows[:self.top_n]
+        ]
+
+    def _sampling_summary(self, stacks: Counter) -> List[str]:
+        """Fonctions triées par échantillons où elles sont en haut de pile (temps propre)"""
+        total = sum(stacks.values())
+        if not total:
+            return ["aucun échantillon (phase plus courte que l'intervalle)"]
+        leaves: Counter = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return [
+            f"{count * 100 / total:5.1f}% ({count} échantillons)  {where}"
+            for where, count in leaves.most_common(self.top_n)
+        ]
+
+
+_profiler: Optional[PhaseProfiler] = None
+
+
+def get_profiler() -> PhaseProfiler:
+    """Profileur partagé du processus (désactivé tant que --profile ou le signal ne l'active pas)"""
+    global _profiler
+    if _profiler is None:
+        _profiler = PhaseProfiler()
+    return _profiler
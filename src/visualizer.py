@@ -1,8 +1,11 @@
 # src/visualizer.py
 import matplotlib.pyplot as plt
-import seaborn as sns
 import pandas as pd
-import sqlite3
+import seaborn as sns
+
+from analytics import WeatherMoodStats, read_engine
+from analyzer_queries import AnalyzerQueries
+from storage import get_database
 
 class DataVisualizer:
     def __init__(self, db_path='/data/lastfm_weather.db'):
@@ -10,17 +13,25 @@ class DataVisualizer:
     
     def create_weather_mood_heatmap(self):
         """Crée une heatmap météo vs humeur"""
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("SELECT * FROM city_music_trends", conn)
+        # Tableau de contingence maintenu en ligne par le collecteur ; à défaut
+        # (base sans état d'analyse), tableau croisé calculé par SQLite dans les agrégats
+        stats = read_engine(get_database(self.db_path), WeatherMoodStats)
+        if stats is not None:
+            weathers, moods, table = stats.contingency('all')
+            pivot_data = pd.DataFrame(table, index=weathers, columns=moods)
+        else:
+            counts = AnalyzerQueries(self.db_path).weather_mood_counts()
+            pivot_data = counts.pivot_table(
+                index='weather_main', columns='mood_category', values='count', fill_value=0
+            ).astype(int) if not counts.empty else pd.DataFrame()
         
-        if df.empty:
+        if pivot_data.empty:
             print("❌ Pas de données pour la visualisation")
             return
         
         plt.figure(figsize=(12, 8))
         
         # Heatmap
-        pivot_data = pd.crosstab(df['weather_main'], df['mood_category'])
         sns.heatmap(pivot_data, annot=True, fmt='d', cmap='YlOrRd')
         plt.title('Corrélation Météo vs Humeur Musicale')
         plt.tight_layout()
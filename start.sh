@@ -93,7 +93,7 @@ show_info() {
     echo "       👤 admin / $(grep GRAFANA_PASSWORD .env | cut -d '=' -f2)"
     echo ""
     echo "   📓 Jupyter Notebook:   http://localhost:8888"
-    # echo "   🔌 API REST:           http://localhost:8000"
+    echo "   🔌 API REST:           http://localhost:8000/insights/weather-mood"
     echo ""
     echo "   📝 Collection données: docker-compose logs -f music-weather-collector"
     echo ""